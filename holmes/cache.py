@@ -2,24 +2,117 @@
 # -*- coding: utf-8 -*-
 
 import time
+from uuid import uuid4
+from collections import defaultdict
 from gzip import GzipFile
 from cStringIO import StringIO
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 
 import msgpack
 from tornado.concurrent import return_future
 from ujson import loads, dumps
 from octopus.model import Response
-from sqlalchemy import or_
 from retools.lock import Lock, LockTimeout
-from redis import WatchError
 
+from holmes.utils import load_classes
+from holmes.request_cache import TieredCache, MemoryTier, DiskTier, RedisTier
 from holmes.models import (
     Domain, Page, Limiter, Violation, DomainsViolationsPrefs
 )
 
 
+# KEYS: job bucket, leases, lease owners / ARGV: count, lease deadline (0 for no lease), owner token
+CLAIM_JOBS_SCRIPT = """
+local items = redis.call('ZRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+local claimed = {}
+
+if #items > 0 then
+    redis.call('ZREM', KEYS[1], unpack(items))
+
+    local deadline = tonumber(ARGV[2])
+    for _, item in ipairs(items) do
+        -- jobs already leased are being reviewed by another worker
+        if not redis.call('ZSCORE', KEYS[2], item) then
+            table.insert(claimed, item)
+
+            if deadline > 0 then
+                redis.call('ZADD', KEYS[2], deadline, item)
+                redis.call('HSET', KEYS[3], item, ARGV[3])
+            end
+        end
+    end
+end
+
+return {redis.call('ZCARD', KEYS[1]), claimed}
+"""
+
+# KEYS: leases, lease owners / ARGV: job, lease deadline, owner token
+EXTEND_JOB_LEASE_SCRIPT = """
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) and redis.call('HGET', KEYS[2], ARGV[1]) == ARGV[3] then
+    redis.call('ZADD', KEYS[1], tonumber(ARGV[2]), ARGV[1])
+    return 1
+end
+
+return 0
+"""
+
+# KEYS: leases, lease owners / ARGV: job, owner token
+RELEASE_JOB_LEASE_SCRIPT = """
+if redis.call('HGET', KEYS[2], ARGV[1]) == ARGV[2] then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    return 1
+end
+
+return 0
+"""
+
+# KEYS: job bucket, leases, lease owners / ARGV: now, max jobs to requeue
+REQUEUE_EXPIRED_JOBS_SCRIPT = """
+local items = redis.call(
+    'ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2])
+)
+
+if #items > 0 then
+    redis.call('ZREM', KEYS[2], unpack(items))
+    redis.call('HDEL', KEYS[3], unpack(items))
+
+    -- requeued jobs go to the front of the bucket
+    for _, item in ipairs(items) do
+        redis.call('ZADD', KEYS[1], 0, item)
+    end
+end
+
+return #items
+"""
+
+
+def get_validators(headers):
+    validators = {}
+
+    if not headers:
+        return validators
+
+    etag = headers.get('ETag', None)
+    if etag:
+        validators['If-None-Match'] = etag
+
+    last_modified = headers.get('Last-Modified', None)
+    if last_modified:
+        validators['If-Modified-Since'] = last_modified
+
+    return validators
+
+
+def get_bloom_offsets(url_hash, size, hashes):
+    # the two halves of a sha512 are independent enough for double hashing
+    first = int(url_hash[:16], 16)
+    second = int(url_hash[16:32], 16) | 1
+
+    return [(first + index * second) % size for index in range(hashes)]
+
+
 class Cache(object):
     def __init__(self, application):
         self.application = application
@@ -230,6 +323,66 @@ class Cache(object):
         data = {dumps({'page': str(uuid), 'url': url}): time.clock()}
         self.redis.zadd('next-job-bucket', data, callback=callback)
 
+    @return_future
+    def get_next_job_shares(self, callback=None):
+        self.redis.get('next-job-shares', callback=self.handle_get_next_job_shares(callback))
+
+    def handle_get_next_job_shares(self, callback):
+        def handle(shares):
+            callback(shares and loads(shares) or [])
+
+        return handle
+
+    @return_future
+    def get_review_dedup_stats(self, callback=None):
+        self.redis.mget(
+            ['review-dedup-hits', 'review-dedup-misses'],
+            callback=self.handle_get_review_dedup_stats(callback)
+        )
+
+    def handle_get_review_dedup_stats(self, callback):
+        def handle(counts):
+            hits, misses = [int(count or 0) for count in counts]
+            total = hits + misses
+
+            callback({
+                'hits': hits,
+                'misses': misses,
+                'hitRate': total and float(hits) / total or 0.0
+            })
+
+        return handle
+
+    @return_future
+    def get_workers_metrics(self, callback=None):
+        self.redis.smembers('workers-metrics', callback=self.handle_get_workers(callback))
+
+    def handle_get_workers(self, callback):
+        def handle(workers):
+            workers = sorted(workers or [])
+
+            if not workers:
+                callback({})
+                return
+
+            self.redis.mget(
+                ['worker-metrics-%s' % worker for worker in workers],
+                callback=self.handle_get_workers_metrics(workers, callback)
+            )
+
+        return handle
+
+    def handle_get_workers_metrics(self, workers, callback):
+        def handle(metrics):
+            # metrics of dead workers expire, their ids are just skipped
+            callback(dict(
+                (worker, loads(data))
+                for worker, data in zip(workers, metrics)
+                if data is not None
+            ))
+
+        return handle
+
     @return_future
     def get_next_job_list(self, current_page=1, page_size=10, callback=None):
         lower_bound = (current_page * page_size) - page_size
@@ -246,6 +399,15 @@ class SyncCache(object):
         self.redis = redis
         self.config = config
 
+        self.claim_jobs_script = self.redis.register_script(CLAIM_JOBS_SCRIPT)
+        self.extend_job_lease_script = self.redis.register_script(EXTEND_JOB_LEASE_SCRIPT)
+        self.release_job_lease_script = self.redis.register_script(RELEASE_JOB_LEASE_SCRIPT)
+        self.requeue_expired_jobs_script = self.redis.register_script(REQUEUE_EXPIRED_JOBS_SCRIPT)
+        self.scheduler = None
+
+        self.metrics = None
+        self._request_cache = None
+
     def has_key(self, key):
         return self.redis.exists(key)
 
@@ -317,10 +479,35 @@ class SyncCache(object):
 
         return int(count)
 
-    def get_request(self, url):
-        cache_key = "urls-%s" % url
+    @property
+    def request_cache(self):
+        if self._request_cache is None:
+            self._request_cache = self.get_request_cache()
+
+        return self._request_cache
+
+    def get_request_cache(self):
+        tiers = []
 
-        contents = self.redis.get(cache_key)
+        memory_size = self.config.REQUEST_CACHE_MEMORY_SIZE_IN_BYTES
+        if memory_size > 0:
+            tiers.append(MemoryTier(memory_size, self.metrics))
+
+        disk_path = self.config.REQUEST_CACHE_DISK_PATH
+        if disk_path:
+            tiers.append(DiskTier(
+                disk_path,
+                self.config.REQUEST_CACHE_DISK_SIZE_IN_BYTES,
+                self.config.REQUEST_CACHE_DISK_SEGMENT_SIZE_IN_BYTES,
+                self.metrics
+            ))
+
+        tiers.append(RedisTier(self.redis, self.metrics))
+
+        return TieredCache(tiers)
+
+    def get_request(self, url):
+        contents = self.request_cache.get(url)
 
         if not contents:
             return url, None
@@ -345,13 +532,11 @@ class SyncCache(object):
         return url, response
 
     def set_request(self, url, status_code, headers, cookies, text, effective_url, error, request_time, expiration):
-        if status_code > 399 or status_code < 100:
+        if status_code > 399 or status_code < 100 or status_code == 304:
             return
 
-        cache_key = "urls-%s" % url
-
         out = StringIO()
-        with GzipFile(fileobj=out, mode="w", mtime=0) as f:
+        with GzipFile(fileobj=out, mode="w", mtime=0, compresslevel=self.config.REQUEST_CACHE_COMPRESSION_LEVEL) as f:
             f.write(text)
         text = out.getvalue()
 
@@ -366,12 +551,143 @@ class SyncCache(object):
             'request_time': request_time
         })
 
-        self.redis.setex(
-            cache_key,
-            expiration,
-            value,
+        self.request_cache.set(url, value, expiration)
+
+    def get_url_validators(self, url):
+        validators = self.redis.get('validators-%s' % url)
+
+        if not validators:
+            return None
+
+        return loads(validators)
+
+    def set_url_validators(self, url, headers, expiration):
+        validators = get_validators(headers)
+
+        if not validators:
+            return
+
+        self.redis.setex('validators-%s' % url, expiration, dumps(validators))
+
+    def get_resource_metadata(self, url):
+        metadata = self.redis.get('resource-%s' % url)
+
+        if not metadata:
+            return None
+
+        return loads(metadata)
+
+    def set_resource_metadata(self, url, status_code, effective_url, sizes, validators, fresh_for, expiration):
+        # kept after it is stale, so its validators can be used to refresh it
+        self.redis.setex('resource-%s' % url, expiration, dumps({
+            'status_code': status_code,
+            'effective_url': effective_url,
+            'size': sizes.size,
+            'gzipped_size': sizes.gzipped_size,
+            'validators': validators,
+            'fresh_until': time.time() + fresh_for
+        }))
+
+    def get_link_statuses(self, urls):
+        if not urls:
+            return {}
+
+        statuses = self.redis.mget(['link-%s' % url for url in urls])
+
+        return dict(
+            (url, loads(status))
+            for url, status in zip(urls, statuses)
+            if status
         )
 
+    def set_link_status(self, url, status_code, effective_url, expiration):
+        self.redis.setex('link-%s' % url, expiration, dumps({
+            'status_code': status_code,
+            'effective_url': effective_url
+        }))
+
+    def get_sitemap(self, domain_name, url):
+        sitemap = self.redis.hget('sitemaps-%s' % domain_name, url)
+
+        if not sitemap:
+            return None
+
+        return loads(sitemap)
+
+    def set_sitemap(self, domain_name, url, sitemap, expiration):
+        key = 'sitemaps-%s' % domain_name
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(key, url, dumps(sitemap))
+        pipe.expire(key, expiration)
+        pipe.execute()
+
+    def increment_review_dedup_count(self, hit):
+        self.redis.incr(hit and 'review-dedup-hits' or 'review-dedup-misses')
+
+    def set_worker_metrics(self, worker_id, metrics, expiration):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.setex('worker-metrics-%s' % worker_id, expiration, dumps(metrics))
+        pipe.sadd('workers-metrics', worker_id)
+        pipe.execute()
+
+    def has_known_pages(self):
+        return self.redis.exists('known-pages')
+
+    def get_known_pages(self, url_hashes):
+        '''Tells which pages may already exist, false positives are possible.'''
+
+        size = self.config.KNOWN_PAGES_FILTER_SIZE_IN_BITS
+        hashes = self.config.KNOWN_PAGES_FILTER_HASHES
+
+        pipe = self.redis.pipeline(transaction=False)
+        for url_hash in url_hashes:
+            for offset in get_bloom_offsets(url_hash, size, hashes):
+                pipe.getbit('known-pages', offset)
+        bits = pipe.execute()
+
+        return [
+            all(bits[index:index + hashes])
+            for index in range(0, len(bits), hashes)
+        ]
+
+    def add_known_pages(self, url_hashes, key='known-pages'):
+        size = self.config.KNOWN_PAGES_FILTER_SIZE_IN_BITS
+        hashes = self.config.KNOWN_PAGES_FILTER_HASHES
+
+        pipe = self.redis.pipeline(transaction=False)
+        for url_hash in url_hashes:
+            for offset in get_bloom_offsets(url_hash, size, hashes):
+                pipe.setbit(key, offset, 1)
+        pipe.execute()
+
+    def build_known_pages(self, url_hashes, expiration, batch_size=10000):
+        lock = self.redis.lock('known-pages-lock', expiration)
+        if not lock.acquire(blocking=False):
+            return False
+
+        try:
+            # built aside, so the filter in use is never partial
+            self.redis.delete('known-pages-building')
+            self.redis.setbit('known-pages-building', 0, 0)
+
+            batch = []
+            for url_hash in url_hashes:
+                batch.append(url_hash)
+
+                if len(batch) >= batch_size:
+                    self.add_known_pages(batch, key='known-pages-building')
+                    batch = []
+
+            if batch:
+                self.add_known_pages(batch, key='known-pages-building')
+
+            self.redis.rename('known-pages-building', 'known-pages')
+        finally:
+            lock.release()
+
+        return True
+
     def lock_next_job(self, url, expiration):
         return self.redis.lock('%s-next-job-lock' % url, expiration)
 
@@ -414,6 +730,12 @@ class SyncCache(object):
     def increment_page_score(self, page_id, increment=1):
         self.redis.zincrby('page-scores', page_id, increment)
 
+    def increment_page_scores(self, page_ids, increment=1):
+        pipe = self.redis.pipeline(transaction=False)
+        for page_id in page_ids:
+            pipe.zincrby('page-scores', page_id, increment)
+        pipe.execute()
+
     def get_limiter_buckets(self, active_domains, avg_links_per_page=10.0):
         available = []
         all_limiters = reversed(sorted(Limiter.get_limiters_for_domains(self.db, active_domains), key=lambda item: item.url))
@@ -424,49 +746,40 @@ class SyncCache(object):
 
         return available
 
-    def fill_job_bucket(self, expiration, look_ahead_pages=1000, avg_links_per_page=10.0):
+    def get_scheduler(self):
+        if self.scheduler is None:
+            scheduler_class = load_classes(default=[self.config.JOB_SCHEDULER])
+            if not scheduler_class:
+                raise Exception('A job scheduler must be defined!')
+            self.scheduler = scheduler_class.pop()(self.config)
+
+        return self.scheduler
+
+    def fill_job_bucket(self, look_ahead_pages=1000, avg_links_per_page=10.0):
         try:
             with Lock('next-job-fill-bucket-lock', redis=self.redis):
                 logging.info('Refilling job bucket. Lock acquired...')
-                expired_time = datetime.utcnow() - timedelta(seconds=expiration)
 
                 active_domains = Domain.get_active_domains(self.db)
 
                 if not active_domains:
                     return
 
-                active_domains_ids = [item.id for item in active_domains]
-
                 limiter_buckets = self.get_limiter_buckets(active_domains, avg_links_per_page)
 
-                all_domains_pages_in_need_of_review = []
-
-                for domain_id in active_domains_ids:
-                    pages = self.db \
-                        .query(
-                            Page.uuid,
-                            Page.url,
-                            Page.score,
-                            Page.last_review_date
-                        ) \
-                        .filter(Page.domain_id == domain_id) \
-                        .filter(or_(
-                            Page.last_review_date == None,
-                            Page.last_review_date <= expired_time
-                        ))[:look_ahead_pages]
-
-                    if pages:
-                        all_domains_pages_in_need_of_review.append(pages)
+                pages_in_need_of_review = Page.get_pages_due_for_review(
+                    self.db, active_domains, datetime.utcnow(), look_ahead_pages
+                )
 
-                logging.debug('Total of %d pages found to add to redis.' % (sum([len(item) for item in all_domains_pages_in_need_of_review])))
+                logging.debug('Total of %d pages found to add to redis.' % len(pages_in_need_of_review))
 
                 item_count = int(self.redis.zcard('next-job-bucket'))
-                current_domain = 0
-                while item_count < look_ahead_pages and len(all_domains_pages_in_need_of_review) > 0:
-                    if current_domain >= len(all_domains_pages_in_need_of_review):
-                        current_domain = 0
+                scheduled = defaultdict(int)
 
-                    item = all_domains_pages_in_need_of_review[current_domain].pop(0)
+                scheduler = self.get_scheduler()
+                for item in scheduler.schedule(pages_in_need_of_review, limiter_buckets):
+                    if item_count >= look_ahead_pages:
+                        break
 
                     has_limit = True
                     logging.debug('Available Limit Buckets: %s' % limiter_buckets)
@@ -479,19 +792,30 @@ class SyncCache(object):
 
                     if has_limit:
                         self.add_next_job_bucket(item.uuid, item.url)
+                        scheduled[item.domain_name] += 1
                         item_count += 1
 
-                    # if there are not any more pages in this domain remove it from dictionary
-                    if not all_domains_pages_in_need_of_review[current_domain]:
-                        del all_domains_pages_in_need_of_review[current_domain]
-
-                    current_domain += 1
+                self.set_next_job_shares(scheduler.weights, scheduled)
 
                 logging.debug('ADDED A TOTAL of %d ITEMS TO REDIS...' % item_count)
 
         except LockTimeout:
             logging.info("Can't acquire lock. Moving on...")
 
+    def set_next_job_shares(self, weights, scheduled):
+        total = float(sum(scheduled.values())) or 1.0
+
+        shares = []
+        for domain_name, weight in sorted(weights.items()):
+            shares.append({
+                'domain': domain_name,
+                'weight': weight,
+                'scheduled': scheduled.get(domain_name, 0),
+                'share': round(scheduled.get(domain_name, 0) / total, 4)
+            })
+
+        self.redis.set('next-job-shares', dumps(shares))
+
     def add_next_job_bucket(self, uuid, url):
         self.redis.zadd(
             'next-job-bucket',
@@ -499,39 +823,88 @@ class SyncCache(object):
             dumps({'page': str(uuid), 'url': url})
         )
 
+    def claim_next_jobs(self, count=1, lease=None, token=None):
+        deadline = 0
+        if lease:
+            deadline = time.time() + lease
+
+        job_bucket_count, items = self.claim_jobs_script(
+            keys=['next-job-bucket', 'next-job-leases', 'next-job-lease-owners'],
+            args=[count, deadline, token or '']
+        )
+
+        return items, int(job_bucket_count)
+
+    def extend_job_lease(self, item, lease, token):
+        # a lease that expired may have been claimed again by another worker
+        extended = self.extend_job_lease_script(
+            keys=['next-job-leases', 'next-job-lease-owners'],
+            args=[item, time.time() + lease, token or '']
+        )
+
+        return bool(extended)
+
+    def release_job_lease(self, item, token):
+        released = self.release_job_lease_script(
+            keys=['next-job-leases', 'next-job-lease-owners'],
+            args=[item, token or '']
+        )
+
+        return bool(released)
+
+    def requeue_expired_jobs(self, limit=1000):
+        requeued = self.requeue_expired_jobs_script(
+            keys=['next-job-bucket', 'next-job-leases', 'next-job-lease-owners'],
+            args=[time.time(), limit]
+        )
+
+        if requeued:
+            logging.info('Requeued %d job(s) with expired leases.' % requeued)
+
+        return requeued
+
     def get_next_job_bucket(self):
-        pipe = self.redis.pipeline(transaction=False)
+        items, job_bucket_count = self.claim_next_jobs()
 
-        try:
-            pipe.watch('next-job-bucket')
-            item = self.redis.zrange('next-job-bucket', 0, 0)
-            item = item[0]
-            pipe.multi()
-            self.redis.zrem('next-job-bucket', item)
-            pipe.execute()
-        except (WatchError, IndexError):
+        if not items:
             return None
-        finally:
-            pipe.reset()
 
-        return item
+        return items[0]
+
+    def get_next_jobs(self, look_ahead_pages=1000, count=1, lease=None):
+        logging.info('Getting next %d job(s) from the bucket...' % count)
 
-    def get_next_job(self, expiration, look_ahead_pages=1000):
-        logging.info('Getting next job from the bucket...')
-        item = self.get_next_job_bucket()
+        token = None
+        if lease:
+            self.requeue_expired_jobs()
+
+            # identifies this claim, so only its owner extends or releases it
+            token = uuid4().hex
+
+        items, job_bucket_count = self.claim_next_jobs(count, lease, token)
 
-        job_bucket_count = self.redis.zcard('next-job-bucket')
         if job_bucket_count < look_ahead_pages * 0.1:
             logging.info('Bucket near empty (%d items). Must refill...' % job_bucket_count)
-            self.fill_job_bucket(expiration, look_ahead_pages)
+            self.fill_job_bucket(look_ahead_pages)
 
-        if item is None:
-            return None
+        jobs = []
+        for item in items:
+            job = loads(item)
+            job['bucket_item'] = item
+            job['lease_token'] = token
+            jobs.append(job)
+
+            logging.debug('Next job found: %s' % job['url'])
 
-        item = loads(item)
-        logging.debug('Next job found: %s' % item['url'])
+        return jobs
 
-        return item
+    def get_next_job(self, look_ahead_pages=1000):
+        jobs = self.get_next_jobs(look_ahead_pages)
+
+        if not jobs:
+            return None
+
+        return jobs[0]
 
     def get_data(self, key, expiration, get_data_method):
         data = self.redis.get(key)
@@ -554,3 +927,17 @@ class SyncCache(object):
 
     def delete_domain_violations_prefs(self, domain_name):
         self.redis.delete('violations-prefs-%s' % domain_name)
+
+    def set_domains_violations_prefs(self, domains_prefs):
+        expiration = int(self.config.DOMAINS_VIOLATIONS_PREFS_EXPIRATION_IN_SECONDS)
+
+        pipe = self.redis.pipeline(transaction=False)
+        for domain_name, prefs in domains_prefs.items():
+            pipe.setex('violations-prefs-%s' % domain_name, expiration, dumps(prefs))
+        pipe.execute()
+
+    def get_definitions_fingerprint(self):
+        return self.redis.get('definitions-fingerprint')
+
+    def set_definitions_fingerprint(self, fingerprint):
+        self.redis.set('definitions-fingerprint', fingerprint)
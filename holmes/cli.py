@@ -11,6 +11,7 @@ from materialgirl import Materializer
 from materialgirl.storage.redis import RedisStorage
 
 from holmes.cache import SyncCache
+from holmes.codec import json_codec
 from holmes.utils import load_classes
 from holmes.config import Config
 
@@ -74,6 +75,8 @@ class BaseCLI(Shepherd):
         self.sqlalchemy_db_maker = sessionmaker(bind=engine, autoflush=autoflush)
         self.db = scoped_session(self.sqlalchemy_db_maker)
 
+        json_codec.configure(self.config)
+
     def connect_to_redis(self):
         host = self.config.get('REDISHOST')
         port = self.config.get('REDISPORT')
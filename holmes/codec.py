@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import zlib
+from gzip import GzipFile
+from cStringIO import StringIO
+
+from ujson import dumps, loads
+
+
+# values written before the codec existed are plain gzip files
+GZIP_MAGIC = '\x1f\x8b'
+
+RAW = '\x00'
+ZLIB = '\x01'
+
+
+def decode_raw(data):
+    return data
+
+
+def decode_zlib(data):
+    return zlib.decompress(data)
+
+
+class JsonCodec(object):
+    '''Stores json values behind a leading byte that names their format.'''
+
+    decoders = {
+        RAW: decode_raw,
+        ZLIB: decode_zlib,
+    }
+
+    def __init__(self, level=6, min_size=64):
+        self.level = level
+        self.min_size = min_size
+
+    def configure(self, config):
+        self.level = config.JSON_COMPRESSION_LEVEL
+        self.min_size = config.JSON_COMPRESSION_MIN_SIZE
+
+    def encode(self, value):
+        data = dumps(value)
+
+        # small values do not pay for the compression overhead
+        if len(data) >= self.min_size:
+            compressed = zlib.compress(data, self.level)
+
+            if len(compressed) < len(data):
+                return ZLIB + compressed
+
+        return RAW + data
+
+    def decode(self, value):
+        if not value:
+            return ''
+
+        if value.startswith(GZIP_MAGIC):
+            return loads(GzipFile(mode='r', fileobj=StringIO(value)).read())
+
+        decoder = self.decoders.get(value[0])
+        if decoder is None:
+            raise ValueError('Unknown json value format %r.' % value[0])
+
+        return loads(decoder(value[1:]))
+
+    def is_legacy(self, value):
+        return bool(value) and value.startswith(GZIP_MAGIC)
+
+    def recode(self, value):
+        '''Returns value in the current format, or None when it already is.'''
+
+        if not self.is_legacy(value):
+            return None
+
+        return self.encode(self.decode(value))
+
+
+json_codec = JsonCodec()
@@ -14,6 +14,13 @@ Config.define('ZOMBIE_WORKER_TIME', 200,
               _('Time to remove a Worker from API List (must be greater than WORKER_SLEEP_TIME + Validation time)'), 'API')
 
 Config.define('WORKERS_LOOK_AHEAD_PAGES', 10000, _('Number of pages that will be retrieved when looking for the next job'), 'Worker')
+Config.define('JOB_SCHEDULER', 'holmes.schedulers.weighted_fair.WeightedFairScheduler',
+              _('Class that orders the pages added to the job bucket'), 'Worker')
+Config.define('DOMAIN_SCHEDULING_WEIGHTS', {}, _('Share of the job bucket given to each domain (defaults to 1.0)'), 'Worker')
+Config.define('WORKER_JOBS_BATCH_SIZE', 5, _('Number of jobs a worker claims from the job bucket at once'), 'Worker')
+Config.define('WORKER_JOB_LEASE_IN_SECONDS', 120, _('Number of seconds a claimed job stays leased to a worker without a heartbeat before being requeued'), 'Worker')
+Config.define('WORKER_METRICS_EXPIRATION_IN_SECONDS', 5 * 60, _('Number of seconds the metrics of a worker are kept after its last ping'), 'Worker')
+Config.define('WORKER_PROCESS_POOL_SIZE', 0, _('Number of processes a worker uses for CPU bound steps like sitemap parsing (0 runs them inline)'), 'Worker')
 
 Config.define('CONNECT_TIMEOUT_IN_SECONDS', 10, _('Number of seconds a connection can take.'), 'Worker')
 Config.define('REQUEST_TIMEOUT_IN_SECONDS', 10, _('Number of seconds a request can take.'), 'Worker')
@@ -31,8 +38,16 @@ Config.define('FACTERS', [], _('List of classes to get facts about a website'),
 Config.define('VALIDATORS', [], _('List of classes to validate a website'), 'Review')
 Config.define('REVIEW_EXPIRATION_IN_SECONDS', 6 * 60 * 60, _('Number of seconds that a review expires in.'), 'Review')
 Config.define('NUMBER_OF_REVIEWS_TO_KEEP', 4, _('Maximum number of reviews to keep'), 'Review')
+Config.define('REVIEW_PURGE_BATCH_SIZE', 1000, _('Number of page ids whose old reviews holmes-purge deletes at a time'), 'Review')
+Config.define('REVIEW_PURGE_MAX_ROWS_PER_SECOND', 5000, _('Maximum number of review, fact and violation rows deleted per second by holmes-purge (0 disables the limit)'), 'Review')
+Config.define('REVIEW_PURGE_INTERVAL_IN_SECONDS', 10 * MINUTE, _('Number of seconds holmes-purge waits after going through all pages'), 'Review')
+Config.define('MAX_REUSED_REVIEWS', 4, _('Maximum number of consecutive times the last review of an unchanged page is reused before a full review is forced (0 disables reuse)'), 'Review')
+Config.define('MAX_CONCURRENT_SITEMAP_REQUESTS', 4, _('Maximum number of sitemaps of a domain requested at the same time'), 'Review')
+Config.define('MAX_SITEMAP_URLS_TO_ENQUEUE', 50000, _('Maximum number of urls kept from each changed sitemap to be enqueued'), 'Review')
 
 Config.define('DAYS_TO_KEEP_REQUESTS', 12, _('Number of days to keep requests'), 'Requests')
+Config.define('REQUEST_PARTITIONS_AHEAD_IN_DAYS', 7, _('Number of days ahead of today that holmes-partitions keeps request partitions created for'), 'Requests')
+Config.define('REQUEST_PARTITIONS_INTERVAL_IN_SECONDS', HOUR, _('Number of seconds holmes-partitions waits between maintenance runs'), 'Requests')
 Config.define('MAX_REQUESTS_FOR_FAILED_RESPONSES', 1000, _('Number of requests for failed responses'), 'Requests')
 Config.define('HOLMES_USER_AGENT', 'Mozilla/5.0 (compatible; Holmes)', _('User agent'), 'Requests')
 
@@ -154,6 +169,18 @@ Config.define('DEFAULT_PAGE_SCORE', 1, _('Page Score for pages that the user inc
 Config.define('PAGE_SCORE_TAX_RATE', 0.1, _('Default tax rate for scoring pages.'), 'General')
 
 Config.define('REQUEST_CACHE_EXPIRATION_IN_SECONDS', HOUR, _('Expiration in seconds for cache storage of responses.'), 'Cache')
+Config.define('REQUEST_CACHE_COMPRESSION_LEVEL', 6, _('Gzip level (1-9) of the response bodies kept in the request cache.'), 'Cache')
+Config.define('REQUEST_CACHE_MEMORY_SIZE_IN_BYTES', 32 * 1024 * 1024, _('Size of the in-process tier of the request cache (0 disables it).'), 'Cache')
+Config.define('REQUEST_CACHE_DISK_PATH', None, _('Directory of the local disk tier of the request cache (None disables it).'), 'Cache')
+Config.define('REQUEST_CACHE_DISK_SIZE_IN_BYTES', 512 * 1024 * 1024, _('Size of the local disk tier of the request cache.'), 'Cache')
+Config.define('REQUEST_CACHE_DISK_SEGMENT_SIZE_IN_BYTES', 16 * 1024 * 1024, _('Size of each segment file of the local disk tier, the oldest one is dropped when the tier is full.'), 'Cache')
+Config.define('URL_VALIDATORS_EXPIRATION_IN_SECONDS', DAY, _('Expiration in seconds for the ETag and Last-Modified kept for each reviewed page.'), 'Cache')
+Config.define('RESOURCE_METADATA_EXPIRATION_IN_SECONDS', HOUR, _('Seconds the status and sizes of an image, CSS or JS file are used before it is requested again.'), 'Cache')
+Config.define('LINK_STATUS_EXPIRATION_IN_SECONDS', HOUR, _('Seconds the status code of a link is used before it is checked again.'), 'Cache')
+Config.define('LINK_STATUS_ERROR_EXPIRATION_IN_SECONDS', 5 * MINUTE, _('Seconds a link that timed out or answered with a server error is kept before it is checked again.'), 'Cache')
+Config.define('KNOWN_PAGES_FILTER_SIZE_IN_BITS', 2 ** 27, _('Size of the bloom filter of the pages already added, 2 ** 27 bits keep about 1% of false positives for 14 million pages.'), 'Cache')
+Config.define('KNOWN_PAGES_FILTER_HASHES', 7, _('Number of bits set for each page in the bloom filter of the pages already added.'), 'Cache')
+Config.define('KNOWN_PAGES_FILTER_LOCK_EXPIRATION_IN_SECONDS', 10 * MINUTE, _('Expiration for the lock taken by the worker that builds the bloom filter of the pages already added.'), 'Cache')
 
 Config.define('MAX_URL_LEVELS', 20, _('Maximum levels of URL'))
 
@@ -175,6 +202,10 @@ throttling_message_type = {
 Config.define('EVENT_BUS_THROTTLING_MESSAGE_TYPE', throttling_message_type, _('Throttling by message type'), 'Event Bus')
 
 Config.define('SQLALCHEMY_AUTO_FLUSH', True, _('Defines whether auto-flush should be used in sqlalchemy'))
+Config.define('JSON_COMPRESSION_LEVEL', 6, _('Zlib level (1-9) of the fact and violation values stored in the database.'), 'DB')
+Config.define('JSON_COMPRESSION_MIN_SIZE', 64, _('Fact and violation values smaller than this many bytes of json are stored uncompressed.'), 'DB')
+Config.define('RECOMPRESS_BATCH_SIZE', 1000, _('Rows rewritten at a time by holmes-recompress when converting gzipped values.'), 'DB')
+Config.define('RECOMPRESS_IDLE_INTERVAL_IN_SECONDS', HOUR, _('Number of seconds holmes-recompress sleeps at a time once all values are in the current format.'), 'DB')
 
 Config.define('DOMAINS_VIOLATIONS_PREFS_EXPIRATION_IN_SECONDS', HOUR, _('Expiration in seconds for domains violations prefs.'), 'Cache')
 
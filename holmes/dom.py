@@ -0,0 +1,83 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import re
+from heapq import merge
+from collections import defaultdict
+
+from lxml.cssselect import CSSSelector
+
+
+# selectors like "a" or "a[href]" are answered by the index
+SIMPLE_SELECTOR_RE = re.compile(r'^([a-z][a-z0-9]*)(?:\[([a-z][a-z0-9_:-]*)\])?$')
+
+COMPILED_SELECTORS = {}
+
+
+def get_compiled_selector(selector):
+    compiled = COMPILED_SELECTORS.get(selector)
+
+    if compiled is None:
+        compiled = COMPILED_SELECTORS[selector] = CSSSelector(selector, translator='html')
+
+    return compiled
+
+
+class ElementIndex(object):
+    '''Indexes the elements of a document by tag in a single traversal.'''
+
+    def __init__(self, html):
+        self.html = html
+        self.elements_by_tag = defaultdict(list)
+        self.selections = {}
+
+        if html is None:
+            return
+
+        for position, element in enumerate(html.iter()):
+            # comments and processing instructions have no string tag
+            if not isinstance(element.tag, basestring):
+                continue
+
+            self.elements_by_tag[element.tag.lower()].append((position, element))
+
+    def select_simple(self, tag, attribute=None):
+        elements = self.elements_by_tag.get(tag, [])
+
+        if attribute is None:
+            return elements
+
+        return [item for item in elements if attribute in item[1].attrib]
+
+    def select(self, selector):
+        if selector not in self.selections:
+            self.selections[selector] = self._select(selector)
+
+        return list(self.selections[selector])
+
+    def _select(self, selector):
+        matches = [
+            SIMPLE_SELECTOR_RE.match(part.strip())
+            for part in selector.lower().split(',')
+        ]
+
+        if not all(matches):
+            if self.html is None:
+                return []
+
+            return get_compiled_selector(selector)(self.html)
+
+        selections = [
+            self.select_simple(match.group(1), match.group(2))
+            for match in matches
+        ]
+
+        # keeps document order and drops repeated elements
+        elements = []
+        last_position = None
+        for position, element in merge(*selections):
+            if position != last_position:
+                elements.append(element)
+            last_position = position
+
+        return elements
@@ -7,11 +7,15 @@ try:
 except ImportError:
     from urlparse import urlparse, urljoin
 
+from holmes.offload import ResponseSizes
 from holmes.utils import is_valid
 
 
 class Baser(object):
 
+    # requests issued by this plugin that are not done yet
+    pending_requests = 0
+
     def __init__(self, reviewer):
         self.reviewer = reviewer
 
@@ -52,13 +56,40 @@ class Baser(object):
         self.reviewer.add_fact(key, value)
 
     def async_get(self, url, handler, method='GET', **kw):
-        self.reviewer._async_get(url, handler, method, **kw)
+        self.reviewer._async_get(url, handler, method, plugin=self, **kw)
+
+    def get_size(self, url, handler, gzipped=False):
+        '''Loads url without keeping its body, see get_response_sizes.'''
+        self.async_get(url, handler, size_only=True, gzipped=gzipped)
+
+    def check_links(self, urls, handler):
+        '''Loads the status code and effective url of each url, without its body.'''
+        self.reviewer._check_links(urls, handler, plugin=self)
+
+    def get_response_sizes(self, response):
+        sizes = getattr(response, 'sizes', None)
+        if isinstance(sizes, ResponseSizes):
+            return sizes
+
+        if not response.text:
+            return ResponseSizes(0, 0)
+
+        return ResponseSizes(len(response.text), None)
+
+    def when_requests_done(self, callback):
+        self.reviewer.when_plugin_requests_done(self, callback)
+
+    def run_in_pool(self, func, args, callback):
+        self.reviewer.run_in_pool(func, args, callback, plugin=self)
 
 
 class Facter(Baser):
 
     unit = 'value'
 
+    # review.data keys this facter fills, None when not declared
+    produces = None
+
     @classmethod
     def get_fact_definitions(cls):
         raise NotImplementedError
@@ -4,10 +4,13 @@
 import logging
 
 from holmes.facters import Facter
+from holmes.offload import get_gzipped_size
 from holmes.utils import _
 
 
 class CSSFacter(Facter):
+    produces = ('page.css', 'total.size.css', 'total.size.css.gzipped')
+
     @classmethod
     def get_fact_definitions(cls):
         return {
@@ -79,7 +82,7 @@ class CSSFacter(Facter):
         )
 
         for url in css_to_get:
-            self.async_get(url, self.handle_url_loaded)
+            self.get_size(url, self.handle_url_loaded, gzipped=True)
 
     def handle_url_loaded(self, url, response):
         logging.debug('Got response (%s) from %s!' % (response.status_code,
@@ -88,18 +91,23 @@ class CSSFacter(Facter):
         self.review.facts['page.css']['value'].add(url)
         self.review.data['page.css'].add((url, response))
 
-        if response.text:
-            size_css = len(response.text) / 1024.0
-            size_gzip = len(self.to_gzip(response.text)) / 1024.0
-        else:
-            size_css = 0
-            size_gzip = 0
+        sizes = self.get_response_sizes(response)
+        size_css = sizes.size / 1024.0
+
+        if sizes.gzipped_size is not None:
+            self.handle_gzipped_size(sizes.gzipped_size)
+        elif response.text is not None:
+            # failed requests and 304s of unknown size carry no body
+            self.run_in_pool(get_gzipped_size, (response.text,), self.handle_gzipped_size)
 
         self.review.facts['total.size.css']['value'] += size_css
         self.review.data['total.size.css'] += size_css
 
+    def handle_gzipped_size(self, size):
+        size_gzip = size / 1024.0
+
         self.review.facts['total.size.css.gzipped']['value'] += size_gzip
         self.review.data['total.size.css.gzipped'] += size_gzip
 
     def get_css(self):
-        return self.reviewer.current_html.cssselect('link[href]')
+        return self.reviewer.select('link[href]')
@@ -9,6 +9,8 @@ from holmes.utils import _
 
 class GoogleAnalyticsFacter(Facter):
 
+    produces = ('page.google_analytics',)
+
     @classmethod
     def get_fact_definitions(cls):
         return {
@@ -47,4 +49,4 @@ class GoogleAnalyticsFacter(Facter):
             )
 
     def get_script_data(self):
-        return self.reviewer.current_html.cssselect('script')
+        return self.reviewer.select('script')
@@ -6,6 +6,8 @@ from holmes.utils import _
 
 
 class HeadingHierarchyFacter(Facter):
+    produces = ('page.heading_hierarchy',)
+
     @classmethod
     def get_fact_definitions(cls):
         return {
@@ -33,4 +35,4 @@ class HeadingHierarchyFacter(Facter):
             )
 
     def get_heading(self):
-        return self.reviewer.current_html.cssselect('body h1,h2,h3,h4,h5,h6')
+        return self.reviewer.select('body h1,h2,h3,h4,h5,h6')
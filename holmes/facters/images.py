@@ -8,6 +8,8 @@ from holmes.utils import _
 
 
 class ImageFacter(Facter):
+    produces = ('page.all_images', 'page.images', 'total.size.img')
+
     @classmethod
     def get_fact_definitions(cls):
         return {
@@ -72,7 +74,7 @@ class ImageFacter(Facter):
         self.review.data['page.all_images'] = images_without_base64
 
         for src in images_to_get:
-            self.async_get(src, self.handle_url_loaded)
+            self.get_size(src, self.handle_url_loaded)
 
         self.add_fact(
             key='total.requests.img',
@@ -83,9 +85,7 @@ class ImageFacter(Facter):
         logging.debug('Got response (%s) from %s!' % (response.status_code,
                                                       url))
 
-        size_img = 0
-        if response.text:
-            size_img = len(response.text) / 1024.0
+        size_img = self.get_response_sizes(response).size / 1024.0
 
         self.review.facts['page.images']['value'].add(url)
         self.review.data['page.images'].add((url, response))
@@ -94,4 +94,4 @@ class ImageFacter(Facter):
         self.review.data['total.size.img'] += size_img
 
     def get_images(self):
-        return self.reviewer.current_html.cssselect(':not(script) img[src]')
+        return self.reviewer.select('img[src]')
@@ -4,10 +4,13 @@
 import logging
 
 from holmes.facters import Facter
+from holmes.offload import get_gzipped_size
 from holmes.utils import _
 
 
 class JSFacter(Facter):
+    produces = ('page.js', 'total.size.js', 'total.size.js.gzipped')
+
     @classmethod
     def get_fact_definitions(cls):
         return {
@@ -77,7 +80,7 @@ class JSFacter(Facter):
         )
 
         for url in js_to_get:
-            self.async_get(url, self.handle_url_loaded)
+            self.get_size(url, self.handle_url_loaded, gzipped=True)
 
     def handle_url_loaded(self, url, response):
         logging.debug('Got response (%s) from %s!' % (response.status_code,
@@ -86,18 +89,23 @@ class JSFacter(Facter):
         self.review.facts['page.js']['value'].add(url)
         self.review.data['page.js'].add((url, response))
 
-        if response.text:
-            size_js = len(response.text) / 1024.0
-            size_gzip = len(self.to_gzip(response.text)) / 1024.0
-        else:
-            size_js = 0
-            size_gzip = 0
+        sizes = self.get_response_sizes(response)
+        size_js = sizes.size / 1024.0
+
+        if sizes.gzipped_size is not None:
+            self.handle_gzipped_size(sizes.gzipped_size)
+        elif response.text is not None:
+            # failed requests and 304s of unknown size carry no body
+            self.run_in_pool(get_gzipped_size, (response.text,), self.handle_gzipped_size)
 
         self.review.facts['total.size.js']['value'] += size_js
         self.review.data['total.size.js'] += size_js
 
+    def handle_gzipped_size(self, size):
+        size_gzip = size / 1024.0
+
         self.review.facts['total.size.js.gzipped']['value'] += size_gzip
         self.review.data['total.size.js.gzipped'] += size_gzip
 
     def get_js_requests(self):
-        return self.reviewer.current_html.cssselect('script[src]')
+        return self.reviewer.select('script[src]')
@@ -18,6 +18,8 @@ URL_RE = re.compile(
 
 
 class LinkFacter(Facter):
+    produces = ('page.all_links', 'page.links')
+
     @classmethod
     def get_fact_definitions(cls):
         return {
@@ -100,8 +102,7 @@ class LinkFacter(Facter):
                 num_links += 1
                 links_to_get.add(url)
 
-        for url in links_to_get:
-            self.async_get(url, self.handle_url_loaded)
+        self.check_links(links_to_get, self.handle_url_loaded)
 
         self.add_fact(
             key='total.number.links',
@@ -124,4 +125,4 @@ class LinkFacter(Facter):
         self.review.data['page.links'].add((url, response))
 
     def get_links(self):
-        return self.reviewer.current_html.cssselect(':not(script) a[href]')
+        return self.reviewer.select('a[href]')
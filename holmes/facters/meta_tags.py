@@ -7,6 +7,8 @@ from holmes.utils import _
 
 class MetaTagsFacter(Facter):
 
+    produces = ('meta.tags',)
+
     @classmethod
     def get_fact_definitions(cls):
         return {
@@ -71,7 +73,7 @@ class MetaTagsFacter(Facter):
         return data
 
     def get_meta_tags(self):
-        meta_tags = self.reviewer.current_html.cssselect('meta')
+        meta_tags = self.reviewer.select('meta')
         values = []
         for tags in meta_tags:
             values.append(dict(tags.items()))
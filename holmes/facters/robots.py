@@ -9,6 +9,8 @@ from holmes.utils import _
 
 class RobotsFacter(Facter):
 
+    produces = ('robots.response',)
+
     @classmethod
     def get_fact_definitions(cls):
         return {
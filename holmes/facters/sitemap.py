@@ -3,11 +3,10 @@
 
 import logging
 import re
-import lxml.etree
-from cStringIO import StringIO
-from gzip import GzipFile
+from collections import deque
 
 from holmes.facters import Facter
+from holmes.offload import parse_sitemap
 from holmes.utils import _
 
 
@@ -16,6 +15,26 @@ ROBOTS_SITEMAP = re.compile('Sitemap:\s+(.*)')
 
 class SitemapFacter(Facter):
 
+    produces = (
+        'sitemap.data',
+        'sitemap.urls',
+        'sitemap.files',
+        'sitemap.files.size',
+        'sitemap.files.urls',
+        'sitemap.files.not_encoded',
+        'total.size.sitemap',
+        'total.size.sitemap.gzipped',
+    )
+
+    def __init__(self, reviewer):
+        super(SitemapFacter, self).__init__(reviewer)
+
+        # sitemap indexes may list thousands of files, only a few are
+        # requested at a time and the rest wait here
+        self.sitemaps_to_get = deque()
+        self.sitemaps_requested = set()
+        self.sitemaps_in_flight = 0
+
     @classmethod
     def get_fact_definitions(cls):
         return {
@@ -50,6 +69,7 @@ class SitemapFacter(Facter):
         self.review.data['sitemap.files'] = set()
         self.review.data['sitemap.files.size'] = {}
         self.review.data['sitemap.files.urls'] = {}
+        self.review.data['sitemap.files.not_encoded'] = {}
         self.review.data['total.size.sitemap'] = 0
         self.review.data['total.size.sitemap.gzipped'] = 0
 
@@ -85,31 +105,111 @@ class SitemapFacter(Facter):
 
         return sitemaps
 
+    def get_sitemap(self, url):
+        if url in self.sitemaps_requested:
+            return
+
+        self.sitemaps_requested.add(url)
+        self.sitemaps_to_get.append(url)
+        self.get_next_sitemaps()
+
+    def get_next_sitemaps(self):
+        max_requests = self.config.MAX_CONCURRENT_SITEMAP_REQUESTS
+
+        while self.sitemaps_to_get and self.sitemaps_in_flight < max_requests:
+            self.sitemaps_in_flight += 1
+            self.async_get(self.sitemaps_to_get.popleft(), self.handle_sitemap_loaded, conditional=True)
+
+    def get_cached_sitemap(self, url):
+        cache = self.reviewer.cache
+
+        if cache is None:
+            return None
+
+        sitemap = cache.get_sitemap(self.reviewer.domain_name, url)
+
+        # only valid for the version of the file the validators refer to
+        if sitemap is None or sitemap['validators'] != cache.get_url_validators(url):
+            return None
+
+        return sitemap
+
+    def set_cached_sitemap(self, url, sitemap):
+        cache = self.reviewer.cache
+
+        if cache is None:
+            return
+
+        validators = cache.get_url_validators(url)
+
+        if not validators:
+            return
+
+        data = dict(sitemap, validators=validators)
+        data.pop('urls', None)
+
+        cache.set_sitemap(
+            self.reviewer.domain_name, url, data,
+            self.config.URL_VALIDATORS_EXPIRATION_IN_SECONDS
+        )
+
     def handle_sitemap_loaded(self, url, response):
         logging.debug('Got sitemap %s with status %s' % (url, response.status_code))
-        self.review.data['sitemap.data'][url] = response
 
-        namespaces = [
-            ('sm', 'http://www.sitemaps.org/schemas/sitemap/0.9'),
-        ]
+        try:
+            is_empty = response.status_code != 304 and (response.text is None or not response.text.strip())
+
+            # only the outcome is kept, sitemaps can be too big to hold
+            # their bodies until the review is saved
+            self.review.data['sitemap.data'][url] = {
+                'status_code': response.status_code,
+                'is_empty': is_empty
+            }
+
+            if response.status_code == 304:
+                self.handle_sitemap_not_modified(url, response)
+                return
 
-        if response.status_code > 399 or response.text is None or not response.text.strip():
+            if response.status_code > 399 or is_empty:
+                return
+
+            text, response.text = response.text, None
+
+            self.run_in_pool(
+                parse_sitemap,
+                (text, self.config.MAX_SITEMAP_URLS_TO_ENQUEUE),
+                lambda sitemap: self.handle_sitemap_parsed(url, sitemap)
+            )
+        finally:
+            self.sitemaps_in_flight = max(self.sitemaps_in_flight - 1, 0)
+            self.get_next_sitemaps()
+
+    def handle_sitemap_not_modified(self, url, response):
+        sitemap = self.get_cached_sitemap(url)
+
+        if sitemap is None:
+            # nothing cached for this version, so it must be loaded again
+            self.sitemaps_in_flight += 1
+            self.async_get(url, self.handle_sitemap_loaded)
             return
 
-        try:
-            gzipped = GzipFile(mode='r', fileobj=StringIO(response.text))
-            response.text = gzipped.read()
-        except IOError:
-            pass
+        # urls of unchanged sitemaps were already enqueued
+        self.add_sitemap(url, sitemap, urls=[])
+
+    def handle_sitemap_parsed(self, url, sitemap):
+        self.set_cached_sitemap(url, sitemap)
+        self.add_sitemap(url, sitemap, urls=sitemap['urls'])
 
+    def add_sitemap(self, url, sitemap, urls):
         self.review.facts['total.sitemap.indexes']['value'] += 1
 
-        size_sitemap = len(response.text) / 1024.0
-        size_gzip = len(self.to_gzip(response.text)) / 1024.0
+        size_sitemap = sitemap['size'] / 1024.0
+        size_gzip = sitemap['gzipped_size'] / 1024.0
 
-        self.review.data['sitemap.files.urls'][url] = 0
+        self.review.data['sitemap.files.urls'][url] = len(sitemap['sitemaps']) + sitemap['urls_count']
         self.review.data['sitemap.files.size'][url] = size_sitemap
-        self.review.data['sitemap.urls'][url] = set()
+        self.review.data['sitemap.urls'][url] = set(urls)
+        self.review.data['sitemap.files.not_encoded'][url] = sitemap['not_encoded']
 
         self.review.facts['total.size.sitemap']['value'] += size_sitemap
         self.review.data['total.size.sitemap'] += size_sitemap
@@ -117,25 +217,14 @@ class SitemapFacter(Facter):
         self.review.facts['total.size.sitemap.gzipped']['value'] += size_gzip
         self.review.data['total.size.sitemap.gzipped'] += size_gzip
 
-        magical_parser = lxml.etree.XMLParser(encoding='utf-8', recover=True)
-        tree = lxml.etree.parse(StringIO(response.text), magical_parser)
-
-        for sitemap in tree.xpath('//sm:sitemap | //sitemap', namespaces=namespaces):
-            for loc in sitemap.xpath('sm:loc | loc', namespaces=namespaces):
-                loc = loc.text.strip()
-                self.review.data['sitemap.files'].add(loc)
-                self.review.data['sitemap.files.urls'][url] += 1
-                self.async_get(loc, self.handle_sitemap_loaded)
+        self.review.facts['total.sitemap.urls']['value'] += sitemap['urls_count']
 
-        for sitemap in tree.xpath('//sm:url | //url', namespaces=namespaces):
-            for loc in sitemap.xpath('sm:loc | loc', namespaces=namespaces):
-                loc = loc.text.strip()
-                self.review.data['sitemap.urls'][url].add(loc)
-                self.review.data['sitemap.files.urls'][url] += 1
-                self.review.facts['total.sitemap.urls']['value'] += 1
+        for loc in sitemap['sitemaps']:
+            self.review.data['sitemap.files'].add(loc)
+            self.get_sitemap(loc)
 
     def handle_robots_loaded(self, url, response):
         sitemaps = self.get_sitemaps(response)
 
         for sitemap in sitemaps:
-            self.async_get(sitemap, self.handle_sitemap_loaded)
+            self.get_sitemap(sitemap)
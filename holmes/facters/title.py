@@ -7,6 +7,8 @@ from holmes.utils import _
 
 class TitleFacter(Facter):
 
+    produces = ('page.title', 'page.title_count')
+
     @classmethod
     def get_fact_definitions(cls):
         return {
@@ -18,7 +20,7 @@ class TitleFacter(Facter):
         }
 
     def get_facts(self):
-        titles = self.reviewer.current_html.cssselect('title')
+        titles = self.reviewer.select('title')
 
         if not titles:
             return
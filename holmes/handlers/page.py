@@ -126,6 +126,7 @@ class NextJobHandler(BaseHandler):
         page_size=int(self.get_argument('page_size', 10))
 
         next_job_list = yield self.cache.get_next_job_list(current_page, page_size)
+        shares = yield self.cache.get_next_job_shares()
 
         jobs = []
         for idx, data in enumerate(next_job_list):
@@ -133,4 +134,4 @@ class NextJobHandler(BaseHandler):
             page['num'] = idx + 1 + (current_page - 1) * page_size
             jobs.append(page)
 
-        self.write_json({'pages': jobs})
+        self.write_json({'pages': jobs, 'shares': shares})
@@ -4,6 +4,8 @@
 import datetime
 from uuid import UUID
 
+from tornado import gen
+
 from holmes.models import Review, Page
 from holmes.handlers import BaseHandler
 
@@ -80,3 +82,12 @@ class ReviewsInLastHourHandler(BaseReviewHandler):
             ellapsed = 3600
 
         self.write_json({'count': count, 'ellapsed': ellapsed})
+
+
+class ReviewDedupHandler(BaseHandler):
+
+    @gen.coroutine
+    def get(self):
+        stats = yield self.cache.get_review_dedup_stats()
+
+        self.write_json(stats)
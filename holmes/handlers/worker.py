@@ -0,0 +1,17 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from tornado import gen
+
+from holmes.metrics import render_metrics
+from holmes.handlers import BaseHandler
+
+
+class WorkersMetricsHandler(BaseHandler):
+
+    @gen.coroutine
+    def get(self):
+        metrics = yield self.cache.get_workers_metrics()
+
+        self.set_header('Content-Type', 'text/plain; version=0.0.4')
+        self.write(render_metrics(metrics))
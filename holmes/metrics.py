@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from time import time
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.counts[index] += 1
+
+    def to_dict(self):
+        return {
+            'buckets': list(self.buckets),
+            'counts': list(self.counts),
+            'sum': self.sum,
+            'count': self.count
+        }
+
+
+class Metrics(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}
+
+    def get_series(self, name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+    def increment(self, name, value=1, **labels):
+        series = self.get_series(name, labels)
+        self.counters[series] = self.counters.get(series, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        series = self.get_series(name, labels)
+
+        if series not in self.histograms:
+            self.histograms[series] = Histogram(self.buckets)
+
+        self.histograms[series].observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time()
+        try:
+            yield
+        finally:
+            self.observe(name, time() - started, **labels)
+
+    def to_dict(self):
+        counters = []
+        for (name, labels), value in sorted(self.counters.items()):
+            counters.append({'name': name, 'labels': dict(labels), 'value': value})
+
+        histograms = []
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            data = histogram.to_dict()
+            data.update({'name': name, 'labels': dict(labels)})
+            histograms.append(data)
+
+        return {'counters': counters, 'histograms': histograms}
+
+    def render(self):
+        return render_metrics({None: self.to_dict()})
+
+
+def format_series(name, labels):
+    if not labels:
+        return name
+
+    return '%s{%s}' % (name, ','.join(
+        '%s="%s"' % (key, str(labels[key]).replace('"', '\\"'))
+        for key in sorted(labels.keys())
+    ))
+
+
+def render_metrics(metrics_by_worker):
+    '''Renders metrics in the Prometheus text exposition format.'''
+
+    series = {}
+
+    for worker_id, metrics in metrics_by_worker.items():
+        for counter in metrics['counters']:
+            labels = dict(counter['labels'])
+            if worker_id is not None:
+                labels['worker'] = worker_id
+
+            series.setdefault((counter['name'], 'counter'), []).append(
+                (format_series(counter['name'], labels), counter['value'])
+            )
+
+        for histogram in metrics['histograms']:
+            name = histogram['name']
+            labels = dict(histogram['labels'])
+            if worker_id is not None:
+                labels['worker'] = worker_id
+
+            lines = series.setdefault((name, 'histogram'), [])
+
+            for upper_bound, count in zip(histogram['buckets'], histogram['counts']):
+                bucket_labels = dict(labels, le=repr(float(upper_bound)))
+                lines.append((format_series('%s_bucket' % name, bucket_labels), count))
+
+            lines.append((format_series('%s_bucket' % name, dict(labels, le='+Inf')), histogram['count']))
+            lines.append((format_series('%s_sum' % name, labels), histogram['sum']))
+            lines.append((format_series('%s_count' % name, labels), histogram['count']))
+
+    output = []
+    for (name, metric_type) in sorted(series.keys()):
+        output.append('# TYPE %s %s' % (name, metric_type))
+
+        for line, value in series[(name, metric_type)]:
+            output.append('%s %s' % (line, value))
+
+    return '\n'.join(output) + '\n'
@@ -0,0 +1,43 @@
+"""Page: next_review_at column and due-for-review index
+
+Revision ID: 3b8f1d2c9a47
+Revises: 2e3c3d79c318
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3b8f1d2c9a47'
+down_revision = '2e3c3d79c318'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column(
+        'pages',
+        sa.Column('next_review_at', sa.DateTime, nullable=True)
+    )
+
+    # REVIEW_EXPIRATION_IN_SECONDS is not known here, so reviewed pages are
+    # due right away, the least recently reviewed first, and get their real
+    # next_review_at when they are reviewed again
+    op.execute(
+        'UPDATE pages SET next_review_at = IFNULL(last_review_date, created_date)'
+    )
+
+    op.alter_column(
+        'pages', 'next_review_at', existing_type=sa.DateTime, nullable=False
+    )
+
+    op.create_index(
+        'idx_pages_next_review_at',
+        'pages',
+        ['domain_id', 'next_review_at']
+    )
+
+
+def downgrade():
+    op.drop_index('idx_pages_next_review_at', 'pages')
+    op.drop_column('pages', 'next_review_at')
@@ -0,0 +1,34 @@
+"""Page: content_hash and reused_reviews_count columns
+
+Revision ID: 4c2a7e91d5b3
+Revises: 3b8f1d2c9a47
+Create Date: 2026-10-18 11:02:47.918214
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4c2a7e91d5b3'
+down_revision = '3b8f1d2c9a47'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column(
+        'pages',
+        sa.Column('content_hash', sa.String(40), nullable=True)
+    )
+
+    op.add_column(
+        'pages',
+        sa.Column(
+            'reused_reviews_count', sa.Integer, server_default='0',
+            nullable=False
+        )
+    )
+
+
+def downgrade():
+    op.drop_column('pages', 'reused_reviews_count')
+    op.drop_column('pages', 'content_hash')
@@ -0,0 +1,44 @@
+"""Requests: range partitioned by completed_date
+
+Revision ID: 5e1b0c3d7a62
+Revises: 4c2a7e91d5b3
+Create Date: 2026-10-18 15:21:09.310442
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5e1b0c3d7a62'
+down_revision = '4c2a7e91d5b3'
+
+from datetime import date, timedelta
+
+from alembic import op
+
+
+# holmes-partitions creates the partitions after these
+DAYS_AHEAD = 7
+
+
+def partition(bound):
+    return "PARTITION p%s VALUES LESS THAN (TO_DAYS('%s'))" % (
+        bound.strftime('%Y%m%d'), bound.isoformat()
+    )
+
+
+def upgrade():
+    # every unique key of a partitioned table must include the partition column
+    op.execute('ALTER TABLE requests DROP PRIMARY KEY, ADD PRIMARY KEY (id, completed_date)')
+
+    # the first partition keeps all the requests made before today
+    today = date.today()
+    partitions = [partition(today + timedelta(days=i)) for i in range(DAYS_AHEAD + 1)]
+    partitions.append('PARTITION pmax VALUES LESS THAN MAXVALUE')
+
+    op.execute(
+        'ALTER TABLE requests PARTITION BY RANGE (TO_DAYS(completed_date)) (%s)' % ', '.join(partitions)
+    )
+
+
+def downgrade():
+    op.execute('ALTER TABLE requests REMOVE PARTITIONING')
+    op.execute('ALTER TABLE requests DROP PRIMARY KEY, ADD PRIMARY KEY (id)')
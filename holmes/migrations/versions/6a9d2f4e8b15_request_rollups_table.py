@@ -0,0 +1,58 @@
+"""Request rollups: requests per domain, day and status code
+
+Revision ID: 6a9d2f4e8b15
+Revises: 5e1b0c3d7a62
+Create Date: 2026-10-18 16:04:52.118307
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '6a9d2f4e8b15'
+down_revision = '5e1b0c3d7a62'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# the upper bounds of holmes.models.request_rollup.RESPONSE_TIME_BUCKETS
+BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def upgrade():
+    op.create_table(
+        'request_rollups',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('domain_name', sa.String(120), nullable=False),
+        sa.Column('day', sa.Date, nullable=False),
+        sa.Column('status_code', sa.Integer, nullable=False),
+        sa.Column('count', sa.Integer, server_default='0', nullable=False),
+        sa.Column('response_time_sum', sa.Float, server_default='0', nullable=False),
+        *[
+            sa.Column('bucket_%d' % index, sa.Integer, server_default='0', nullable=False)
+            for index in range(len(BUCKETS) + 1)
+        ]
+    )
+
+    op.create_index(
+        'uk_request_rollup', 'request_rollups',
+        ['domain_name', 'day', 'status_code'], unique=True
+    )
+
+    buckets = ['SUM(response_time <= %s)' % BUCKETS[0]]
+    for lower, upper in zip(BUCKETS, BUCKETS[1:]):
+        buckets.append('SUM(response_time > %s AND response_time <= %s)' % (lower, upper))
+    buckets.append('SUM(response_time > %s)' % BUCKETS[-1])
+
+    op.execute(
+        'INSERT INTO request_rollups (domain_name, day, status_code, count, response_time_sum, %s) '
+        'SELECT domain_name, completed_date, status_code, COUNT(*), SUM(response_time), %s '
+        'FROM requests GROUP BY domain_name, completed_date, status_code' % (
+            ', '.join(['bucket_%d' % index for index in range(len(BUCKETS) + 1)]),
+            ', '.join(buckets)
+        )
+    )
+
+
+def downgrade():
+    op.drop_index('uk_request_rollup', 'request_rollups')
+    op.drop_table('request_rollups')
@@ -0,0 +1,23 @@
+"""Index reviews by page and completed date
+
+Revision ID: 7b3e5a1c9f20
+Revises: 6a9d2f4e8b15
+Create Date: 2026-10-18 18:21:37.402915
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7b3e5a1c9f20'
+down_revision = '6a9d2f4e8b15'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index(
+        'idx_reviews_page_completed_date', 'reviews', ['page_id', 'completed_date']
+    )
+
+
+def downgrade():
+    op.drop_index('idx_reviews_page_completed_date', 'reviews')
@@ -1,13 +1,12 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-from gzip import GzipFile
-from cStringIO import StringIO
-
 import sqlalchemy.types as types
 from sqlalchemy.ext.declarative import declarative_base
 from ujson import dumps, loads
 
+from holmes.codec import json_codec
+
 Base = declarative_base()
 
 
@@ -36,22 +35,15 @@ class JsonType(types.TypeDecorator):
 
 
 class JsonTypeGzipped(types.TypeDecorator):
+    """Json values stored through holmes.codec, old gzipped values are still read."""
+
     impl = types.BLOB
 
     def process_bind_param(self, value, dialect):
-        value = dumps(value)
-        out = StringIO()
-        with GzipFile(fileobj=out, mode="w", mtime=0) as f:
-            f.write(value)
-        return out.getvalue()
+        return json_codec.encode(value)
 
     def process_result_value(self, value, dialect):
-        if value:
-            gzipped = GzipFile(mode='r', fileobj=StringIO(value))
-            out = loads(gzipped.read())
-        else:
-            out = ''
-        return out
+        return json_codec.decode(value)
 
 from holmes.models.domain import Domain  # NOQA
 from holmes.models.page import Page  # NOQA
@@ -61,6 +53,7 @@ from holmes.models.violation import Violation  # NOQA
 from holmes.models.keys import Key  # NOQA
 from holmes.models.keys_category import KeysCategory  # NOQA
 from holmes.models.request import Request  # NOQA
+from holmes.models.request_rollup import RequestRollup  # NOQA
 from holmes.models.user import User  # NOQA
 from holmes.models.limiter import Limiter # NOQA
 from holmes.models.domains_violations_prefs import DomainsViolationsPrefs # NOQA
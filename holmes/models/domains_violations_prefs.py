@@ -33,13 +33,37 @@ class DomainsViolationsPrefs(Base):
         return db.query(DomainsViolationsPrefs).all()
 
     @classmethod
-    def get_domains_violations_prefs(cls, db):
-        data = cls.get_all_domains_violations_prefs(db)
+    def _get_prefs_with_names(cls, db):
+        from holmes.models import Domain, Key
+
+        return db \
+            .query(
+                Domain.name.label('domain_name'),
+                Key.name.label('key_name'),
+                DomainsViolationsPrefs.value
+            ) \
+            .filter(
+                Domain.id == DomainsViolationsPrefs.domain_id,
+                Key.id == DomainsViolationsPrefs.key_id
+            ) \
+            .order_by(DomainsViolationsPrefs.id) \
+            .all()
 
+    @classmethod
+    def get_domains_violations_prefs(cls, db):
         prefs = defaultdict(dict)
 
-        for d in data:
-            prefs[d.domain.name].update({d.key.name: d.value})
+        for d in cls._get_prefs_with_names(db):
+            prefs[d.domain_name].update({d.key_name: d.value})
+
+        return prefs
+
+    @classmethod
+    def get_domains_violations_prefs_list(cls, db):
+        prefs = defaultdict(list)
+
+        for d in cls._get_prefs_with_names(db):
+            prefs[d.domain_name].append({'key': d.key_name, 'value': d.value})
 
         return prefs
 
@@ -65,8 +89,6 @@ class DomainsViolationsPrefs(Base):
         pref = DomainsViolationsPrefs(domain=domain, key=key, value=value)
         db.add(pref)
         db.flush()
-        # FIXME
-        db.commit()
 
     @classmethod
     def insert_default_violations_values_for_domain(cls, db, domain, keys, violation_definitions, cache):
@@ -87,23 +109,36 @@ class DomainsViolationsPrefs(Base):
 
         domains_violations_prefs = DomainsViolationsPrefs.get_domains_violations_prefs(db)
 
-        domains = Domain.get_all_domains(db)
+        values = []
+        changed_domains = []
 
-        for domain in domains:
-            domain_data = domains_violations_prefs.get(domain.name, None)
+        for domain_id, domain_name in db.query(Domain.id, Domain.name).all():
+            domain_data = domains_violations_prefs.get(domain_name, {})
 
-            if domain_data:
-                keys = set(default_violations_values.keys()) - set(domain_data.keys())
-            else:
-                keys = default_violations_values.keys()
+            keys = set(default_violations_values.keys()) - set(domain_data.keys())
+            if not keys:
+                continue
 
-            DomainsViolationsPrefs.insert_default_violations_values_for_domain(
-                db,
-                domain,
-                keys,
-                violation_definitions,
-                cache
+            for key_name in keys:
+                definition = violation_definitions.get(key_name)
+                values.append({
+                    'domain_id': domain_id,
+                    'key_id': definition['key'].id,
+                    'value': definition.get('default_value', None)
+                })
+
+            changed_domains.append(domain_name)
+
+        if values:
+            # IGNORE, as other processes may be inserting the same prefs
+            db.execute(
+                DomainsViolationsPrefs.__table__.insert().prefix_with('IGNORE'),
+                values
             )
+            db.commit()
+
+        for domain_name in changed_domains:
+            cache.delete_domain_violations_prefs(domain_name)
 
     @classmethod
     def update_by_domain(cls, db, cache, domain, data):
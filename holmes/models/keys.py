@@ -79,15 +79,75 @@ class Key(Base):
 
         return cls.get_by_name(db, key_name)
 
+    @classmethod
+    def get_by_names(cls, db, key_names):
+        if not key_names:
+            return {}
+
+        keys = db.query(Key).filter(Key.name.in_(key_names)).all()
+
+        return dict((key.name, key) for key in keys)
+
     @classmethod
     def insert_keys(cls, db, keys, default_values=[]):
+        from holmes.models import KeysCategory
+
+        existing_keys = cls.get_by_names(db, keys.keys())
+
+        categories = {}
+        for name in keys.keys():
+            category_name = keys[name].get('category', None)
+
+            if category_name is not None and category_name not in categories:
+                categories[category_name] = KeysCategory.get_or_create(db, category_name)
+
+        # only new keys and keys that changed category need to be written
+        changed_keys = []
         for name in keys.keys():
             category_name = keys[name].get('category', None)
+            category_id = category_name and categories[category_name].id or None
+
+            key = existing_keys.get(name)
+            if key is not None and (category_id is None or key.category_id == category_id):
+                continue
+
+            changed_keys.append({'name': name, 'category_id': category_id})
+
+        if changed_keys:
+            db.execute(
+                'INSERT INTO `keys` (name, category_id) ' \
+                'VALUES (:name, :category_id) ON DUPLICATE KEY ' \
+                'UPDATE category_id = IFNULL(VALUES(category_id), category_id)',
+                changed_keys
+            )
+            db.flush()
+
+            for key in existing_keys.values():
+                db.expire(key)
+
+            existing_keys = cls.get_by_names(db, keys.keys())
+
+        db.commit()
+
+        cls.set_definition_keys(keys, existing_keys, default_values)
 
-            key = Key.get_or_create(db, name, category_name)
-            keys[name]['key'] = key
+    @classmethod
+    def load_keys(cls, db, keys, default_values=[]):
+        '''Like insert_keys, but never writes. Returns False when a key is missing.'''
+
+        existing_keys = cls.get_by_names(db, keys.keys())
+
+        if len(existing_keys) < len(keys):
+            return False
+
+        cls.set_definition_keys(keys, existing_keys, default_values)
 
-            db.commit()
+        return True
+
+    @classmethod
+    def set_definition_keys(cls, keys, existing_keys, default_values):
+        for name in keys.keys():
+            keys[name]['key'] = existing_keys[name]
 
         for key in default_values:
             keys[key]['default_value'] = default_values[key].get('value', None)
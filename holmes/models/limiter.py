@@ -76,12 +76,12 @@ class Limiter(Base):
                 .update({'value': value})
 
             db.flush()
-            db.commit()
 
             return limiter.url
 
         limiter = Limiter(url=url, url_hash=url_hash, value=value)
         db.add(limiter)
+        db.flush()
 
         return limiter.url
 
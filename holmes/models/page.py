@@ -9,7 +9,7 @@ import logging
 
 import sqlalchemy as sa
 from sqlalchemy.orm import relationship
-from sqlalchemy import or_
+from sqlalchemy import or_, union_all
 from ujson import dumps
 from tornado.concurrent import return_future
 
@@ -34,6 +34,10 @@ class Page(Base):
     last_review = relationship("Review", foreign_keys=[last_review_id])
     last_review_date = sa.Column('last_review_date', sa.DateTime, nullable=True)
     last_review_uuid = sa.Column('last_review_uuid', sa.String(36), nullable=True)
+    next_review_at = sa.Column('next_review_at', sa.DateTime, default=datetime.utcnow, nullable=False)
+
+    content_hash = sa.Column('content_hash', sa.String(40), nullable=True)
+    reused_reviews_count = sa.Column('reused_reviews_count', sa.Integer, server_default='0', nullable=False)
 
     last_modified = sa.Column('last_modified', sa.DateTime, nullable=True)
     expires = sa.Column('expires', sa.DateTime, nullable=True)
@@ -100,15 +104,91 @@ class Page(Base):
     def by_url_hash(cls, url_hash, db):
         return db.query(Page).filter(Page.url_hash == url_hash).first()
 
+    @classmethod
+    def get_url_hash(cls, url):
+        return hashlib.sha512(url.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get_existing_url_hashes(cls, db, url_hashes, batch_size=1000):
+        url_hashes = list(url_hashes)
+        existing = set()
+
+        for index in range(0, len(url_hashes), batch_size):
+            batch = url_hashes[index:index + batch_size]
+            existing.update(
+                url_hash for (url_hash,) in
+                db.query(Page.url_hash).filter(Page.url_hash.in_(batch))
+            )
+
+        return existing
+
+    @classmethod
+    def get_all_url_hashes(cls, db, batch_size=10000):
+        last_id = 0
+
+        while True:
+            pages = db.query(Page.id, Page.url_hash) \
+                .filter(Page.id > last_id) \
+                .order_by(Page.id) \
+                .limit(batch_size) \
+                .all()
+
+            if not pages:
+                return
+
+            for page_id, url_hash in pages:
+                yield url_hash
+
+            last_id = pages[-1][0]
+
     @classmethod
     def get_page_count(cls, db):
         return int(db.query(sa.func.count(Page.id)).scalar())
 
+    @classmethod
+    def get_pages_due_for_review(cls, db, domains, due_date, limit=1000):
+        from holmes.models import Domain  # Prevent circular dependency
+
+        if not domains:
+            return []
+
+        # a slice for each domain, so a big domain that is late on its
+        # reviews can not leave the others out of the look ahead window.
+        # Each slice is a bounded scan of the (domain_id, next_review_at) index
+        slices = []
+        for domain in domains:
+            query = db.query(
+                Page.uuid,
+                Page.url,
+                Page.score,
+                Page.domain_id,
+                Page.next_review_at,
+                Domain.name.label('domain_name'),
+                Domain.url.label('domain_url')
+            ) \
+                .join(Domain, Domain.id == Page.domain_id) \
+                .filter(Page.domain_id == domain.id) \
+                .filter(Page.next_review_at <= due_date) \
+                .order_by(Page.next_review_at) \
+                .limit(limit)
+
+            # mysql only takes a limit per slice of an union inside a derived table
+            slices.append(query.subquery().select())
+
+        return db.execute(union_all(*slices).order_by('next_review_at')).fetchall()
+
     @classmethod
     @return_future
     def add_page(cls, db, cache, url, score, fetch_method, publish_method,
         config, girl, default_violations_values, violation_definitions, callback):
 
+        cls.check_page(url, fetch_method, config, cls.handle_add_page(
+            db, cache, score, publish_method, config, girl,
+            default_violations_values, violation_definitions, callback
+        ))
+
+    @classmethod
+    def check_page(cls, url, fetch_method, config, callback):
         domain_name, domain_url = get_domain_from_url(url)
         if not url or not domain_name:
             callback((False, url, {
@@ -123,10 +203,7 @@ class Page(Base):
 
         fetch_method(
             url,
-            cls.handle_request(cls.handle_add_page(
-                db, cache, url, score, publish_method, config, girl,
-                default_violations_values, violation_definitions, callback
-            )),
+            cls.handle_request(cls.handle_check_page(url, callback)),
             proxy_host=config.HTTP_PROXY_HOST,
             proxy_port=config.HTTP_PROXY_PORT,
             user_agent=config.HOLMES_USER_AGENT,
@@ -156,9 +233,7 @@ class Page(Base):
         return handle
 
     @classmethod
-    def handle_add_page(cls, db, cache, url, score, publish_method, config,
-        girl, default_violations_values, violation_definitions, callback):
-
+    def handle_check_page(cls, url, callback):
         def handle(code, body, effective_url):
             if code > 399:
                 callback((False, url, {
@@ -177,6 +252,19 @@ class Page(Base):
                 }))
                 return
 
+            callback((True, url, None))
+
+        return handle
+
+    @classmethod
+    def handle_add_page(cls, db, cache, score, publish_method, config,
+        girl, default_violations_values, violation_definitions, callback):
+
+        def handle((valid, url, details)):
+            if not valid:
+                callback((False, url, details))
+                return
+
             domain = cls.add_domain(
                 url, db, publish_method, config, girl,
                 default_violations_values, violation_definitions, cache
@@ -190,10 +278,97 @@ class Page(Base):
 
         return handle
 
+    @classmethod
+    def add_pages(cls, db, cache, pages, publish_method, config, girl,
+        default_violations_values, violation_definitions, batch_size=1000):
+        '''Adds the (url, score) pairs that passed check_page in bulk.'''
+
+        pages_by_hash = dict((cls.get_url_hash(url), (url, score)) for url, score in pages)
+
+        existing = cls.get_existing_url_hashes(db, pages_by_hash.keys())
+        if existing:
+            cache.increment_page_scores([pages_by_hash[url_hash][0] for url_hash in existing])
+
+        new_pages = [
+            (url_hash, url, score)
+            for url_hash, (url, score) in pages_by_hash.items()
+            if url_hash not in existing
+        ]
+
+        if not new_pages:
+            return []
+
+        domains = cls.get_domains_by_name(db, [url for url_hash, url, score in new_pages])
+
+        rows = []
+        now = datetime.utcnow()
+        for url_hash, url, score in new_pages:
+            domain_name, domain_url = get_domain_from_url(url)
+
+            if domain_name not in domains:
+                domains[domain_name] = cls.add_domain(
+                    url, db, publish_method, config, girl,
+                    default_violations_values, violation_definitions, cache
+                )
+
+            rows.append({
+                'url': url.encode('utf-8'),
+                'url_hash': url_hash,
+                'uuid': str(uuid4()),
+                'domain_id': domains[domain_name].id,
+                'score': score
+            })
+
+        for index in range(0, len(rows), batch_size):
+            cls.insert_pages(db, rows[index:index + batch_size], now)
+
+        publish_method(dumps({
+            'type': 'new-page',
+            'pageUrl': str(rows[0]['url']),
+            'pageCount': len(rows)
+        }))
+
+        return [row['url'] for row in rows]
+
+    @classmethod
+    def get_domains_by_name(cls, db, urls):
+        from holmes.models import Domain
+
+        names = set()
+        for url in urls:
+            domain_name, domain_url = get_domain_from_url(url)
+            names.update([domain_name, domain_name.rstrip('/'), "%s/" % domain_name])
+
+        domains = {}
+        for domain in db.query(Domain).filter(Domain.name.in_(names)):
+            domains[domain.name] = domain
+            domains.setdefault(domain.name.rstrip('/'), domain)
+
+        return domains
+
+    @classmethod
+    def insert_pages(cls, db, rows, now):
+        values = []
+        query_params = {'now': now}
+
+        for index, row in enumerate(rows):
+            values.append(
+                '(:url_{0}, :url_hash_{0}, :uuid_{0}, :domain_id_{0}, :now, :now, :score_{0})'.format(index)
+            )
+
+            for key, value in row.items():
+                query_params['%s_%d' % (key, index)] = value
+
+        db.execute(
+            'INSERT INTO pages (url, url_hash, uuid, domain_id, created_date, next_review_at, score) '
+            'VALUES %s ON DUPLICATE KEY UPDATE score = VALUES(score)' % ', '.join(values),
+            query_params
+        )
+
     @classmethod
     def insert_or_update_page(cls, url, score, domain, db, publish_method, cache, config):
+        url_hash = cls.get_url_hash(url)
         url = url.encode('utf-8')
-        url_hash = hashlib.sha512(url).hexdigest()
         page = Page.by_url_hash(url_hash, db)
 
         if page:
@@ -202,18 +377,20 @@ class Page(Base):
 
         try:
             page_uuid = uuid4()
+            now = datetime.utcnow()
             query_params = {
                 'url': url,
                 'url_hash': url_hash,
                 'uuid': page_uuid,
                 'domain_id': domain.id,
-                'created_date': datetime.utcnow(),
+                'created_date': now,
+                'next_review_at': now,
                 'score': score
             }
 
             db.execute(
-                'INSERT INTO pages (url, url_hash, uuid, domain_id, created_date, score) '
-                'VALUES (:url, :url_hash, :uuid, :domain_id, :created_date, :score) ON DUPLICATE KEY '
+                'INSERT INTO pages (url, url_hash, uuid, domain_id, created_date, next_review_at, score) '
+                'VALUES (:url, :url_hash, :uuid, :domain_id, :created_date, :next_review_at, :score) ON DUPLICATE KEY '
                 'UPDATE score = :score',
                 query_params
             )
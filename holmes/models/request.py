@@ -3,13 +3,19 @@
 
 from collections import defaultdict
 import sqlalchemy as sa
-from sqlalchemy import func, distinct
+from sqlalchemy import distinct
 from datetime import date, timedelta, datetime
 
 from ujson import dumps
 
 from holmes.utils import get_status_code_title
 from holmes.models import Base
+from holmes.models.request_rollup import RequestRollup
+
+
+# requests are partitioned by day (see holmes-partitions)
+PARTITION_NAME_FORMAT = 'p%Y%m%d'
+MAX_PARTITION_NAME = 'pmax'
 
 
 class Request(Base):
@@ -78,11 +84,11 @@ class Request(Base):
 
     @classmethod
     def get_requests_by_status_count(self, domain_name, status_code, db):
-        return db \
-            .query(func.count(Request.id)) \
-            .filter(Request.domain_name == domain_name) \
-            .filter(Request.status_code == status_code) \
-            .scalar()
+        return RequestRollup.get_request_count(
+            db,
+            domain_name,
+            lambda query: query.filter(RequestRollup.status_code == status_code)
+        )
 
     @classmethod
     def get_last_requests(self, db, current_page=1, page_size=10,
@@ -105,48 +111,89 @@ class Request(Base):
 
     @classmethod
     def get_requests_count_by_status(self, db, limit=1000):
-        per_domains = {'_all': defaultdict(int)}
-
         from holmes.models.domain import Domain
-        for domain in db.query(Domain).all():
-            requests = db \
-                .query(
-                    Request.status_code,
-                    sa.func.count(Request.id).label('count')
-                ) \
-                .filter(Request.domain_name == domain.name) \
-                .group_by(Request.status_code) \
-                .order_by('count DESC') \
-                .limit(limit) \
-                .all()
-            per_domains[domain.name] = requests
-
-            # calculating all domains by counting each domain
-            for req in requests:
-                per_domains['_all'][req[0]] += req[1]
-
-        per_domains['_all'] = per_domains['_all'].items()
+
+        per_domains = dict((name, []) for name in Domain.get_domain_names(db))
+        all_domains = defaultdict(int)
+
+        for domain_name, status_code, count in RequestRollup.get_count_by_status(db):
+            count = int(count)
+
+            if domain_name in per_domains and len(per_domains[domain_name]) < limit:
+                per_domains[domain_name].append((status_code, count))
+
+                # calculating all domains by counting each domain
+                all_domains[status_code] += count
+
+        per_domains['_all'] = all_domains.items()
 
         return per_domains
 
     @classmethod
-    def delete_old_requests(self, db, config, limit=1000):
-        dt = date.today() - timedelta(days=config.DAYS_TO_KEEP_REQUESTS)
+    def get_partition_bounds(cls, db):
+        '''Returns the dates that each daily partition of requests is less than.'''
+
+        names = db.execute(
+            "SELECT partition_name FROM information_schema.partitions "
+            "WHERE table_schema = DATABASE() AND table_name = 'requests' "
+            "AND partition_name IS NOT NULL"
+        ).fetchall()
 
-        older_requests = db \
-            .query(Request.id) \
-            .filter(Request.completed_date <= dt) \
-            .limit(limit)
+        return sorted([
+            datetime.strptime(name, PARTITION_NAME_FORMAT).date()
+            for (name, ) in names
+            if name != MAX_PARTITION_NAME
+        ])
 
-        older_requests_ids = [r for (r, ) in older_requests]
+    @classmethod
+    def create_partitions(cls, db, config, today=None):
+        if today is None:
+            today = date.today()
 
-        if not older_requests_ids:
-            return None
+        bounds = cls.get_partition_bounds(db)
+        if not bounds:
+            return []
 
-        return db \
-            .query(Request) \
-            .filter(Request.id.in_(older_requests_ids)) \
-            .delete(synchronize_session=False)
+        last_bound = today + timedelta(days=config.REQUEST_PARTITIONS_AHEAD_IN_DAYS)
+        new_bounds = [
+            bounds[-1] + timedelta(days=i)
+            for i in range(1, (last_bound - bounds[-1]).days + 1)
+        ]
+
+        if not new_bounds:
+            return []
+
+        partitions = [
+            "PARTITION %s VALUES LESS THAN (TO_DAYS('%s'))" % (
+                bound.strftime(PARTITION_NAME_FORMAT), bound.isoformat()
+            )
+            for bound in new_bounds
+        ]
+        partitions.append('PARTITION %s VALUES LESS THAN MAXVALUE' % MAX_PARTITION_NAME)
+
+        db.execute('ALTER TABLE requests REORGANIZE PARTITION %s INTO (%s)' % (
+            MAX_PARTITION_NAME, ', '.join(partitions)
+        ))
+
+        return new_bounds
+
+    @classmethod
+    def drop_old_partitions(cls, db, config, today=None):
+        if today is None:
+            today = date.today()
+
+        # a partition only holds requests completed before its bound
+        last_bound = today - timedelta(days=config.DAYS_TO_KEEP_REQUESTS - 1)
+        old_bounds = [bound for bound in cls.get_partition_bounds(db) if bound <= last_bound]
+
+        if not old_bounds:
+            return []
+
+        db.execute('ALTER TABLE requests DROP PARTITION %s' % ', '.join([
+            bound.strftime(PARTITION_NAME_FORMAT) for bound in old_bounds
+        ]))
+
+        return old_bounds
 
     @classmethod
     def get_all_status_code(self, db):
@@ -190,6 +237,11 @@ class Request(Base):
 
         db.execute(Request.__table__.insert(), data)
 
+        RequestRollup.add_requests(db, [
+            (item['domain_name'], item['completed_date'], item['status_code'], item['response_time'])
+            for item in data
+        ])
+
         url = url.encode('utf-8')
 
         publish(dumps({
@@ -0,0 +1,146 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+from datetime import date, timedelta
+
+import sqlalchemy as sa
+
+from holmes.models import Base
+
+
+# upper bounds in seconds of the response time histogram,
+# the last bucket counts the requests slower than all of them
+RESPONSE_TIME_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKET_COLUMNS = ['bucket_%d' % index for index in range(len(RESPONSE_TIME_BUCKETS) + 1)]
+
+
+def get_bucket_index(response_time):
+    for index, upper_bound in enumerate(RESPONSE_TIME_BUCKETS):
+        if response_time <= upper_bound:
+            return index
+
+    return len(RESPONSE_TIME_BUCKETS)
+
+
+class RequestRollup(Base):
+    __tablename__ = "request_rollups"
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    domain_name = sa.Column('domain_name', sa.String(120), nullable=False)
+    day = sa.Column('day', sa.Date, nullable=False)
+    status_code = sa.Column('status_code', sa.Integer, nullable=False)
+    count = sa.Column('count', sa.Integer, server_default='0', nullable=False)
+    response_time_sum = sa.Column('response_time_sum', sa.Float, server_default='0', nullable=False)
+
+    bucket_0 = sa.Column('bucket_0', sa.Integer, server_default='0', nullable=False)
+    bucket_1 = sa.Column('bucket_1', sa.Integer, server_default='0', nullable=False)
+    bucket_2 = sa.Column('bucket_2', sa.Integer, server_default='0', nullable=False)
+    bucket_3 = sa.Column('bucket_3', sa.Integer, server_default='0', nullable=False)
+    bucket_4 = sa.Column('bucket_4', sa.Integer, server_default='0', nullable=False)
+    bucket_5 = sa.Column('bucket_5', sa.Integer, server_default='0', nullable=False)
+    bucket_6 = sa.Column('bucket_6', sa.Integer, server_default='0', nullable=False)
+    bucket_7 = sa.Column('bucket_7', sa.Integer, server_default='0', nullable=False)
+
+    def get_histogram(self):
+        return [getattr(self, column) for column in BUCKET_COLUMNS]
+
+    def __str__(self):
+        return '%s %s (%s): %d' % (self.domain_name, self.day, self.status_code, self.count)
+
+    def __repr__(self):
+        return str(self)
+
+    @classmethod
+    def add_requests(cls, db, requests):
+        '''Adds (domain_name, day, status_code, response_time) tuples to the rollups.'''
+
+        rollups = defaultdict(lambda: [0, 0.0, [0] * len(BUCKET_COLUMNS)])
+
+        for domain_name, day, status_code, response_time in requests:
+            rollup = rollups[(domain_name, day, status_code)]
+            rollup[0] += 1
+            rollup[1] += response_time
+            rollup[2][get_bucket_index(response_time)] += 1
+
+        if not rollups:
+            return
+
+        data = []
+        for (domain_name, day, status_code), (count, response_time_sum, histogram) in rollups.items():
+            row = {
+                'domain_name': domain_name,
+                'day': day,
+                'status_code': status_code,
+                'count': count,
+                'response_time_sum': response_time_sum,
+            }
+            row.update(zip(BUCKET_COLUMNS, histogram))
+            data.append(row)
+
+        columns = ['domain_name', 'day', 'status_code', 'count', 'response_time_sum'] + BUCKET_COLUMNS
+        increments = ['count', 'response_time_sum'] + BUCKET_COLUMNS
+
+        db.execute(
+            'INSERT INTO request_rollups (%s) VALUES (%s) ON DUPLICATE KEY UPDATE %s' % (
+                ', '.join(columns),
+                ', '.join([':%s' % column for column in columns]),
+                ', '.join(['%s = %s + VALUES(%s)' % (column, column, column) for column in increments])
+            ),
+            data
+        )
+
+    @classmethod
+    def get_count_by_status(cls, db, domain_name=None):
+        '''Returns (domain_name, status_code, count) tuples, most frequent first.'''
+
+        query = db \
+            .query(
+                RequestRollup.domain_name,
+                RequestRollup.status_code,
+                sa.func.sum(RequestRollup.count).label('total')
+            )
+
+        if domain_name is not None:
+            query = query.filter(RequestRollup.domain_name == domain_name)
+
+        return query \
+            .group_by(RequestRollup.domain_name, RequestRollup.status_code) \
+            .order_by('total DESC') \
+            .all()
+
+    @classmethod
+    def get_request_count(cls, db, domain_name, status_filter):
+        query = db \
+            .query(sa.func.sum(RequestRollup.count)) \
+            .filter(RequestRollup.domain_name == domain_name)
+
+        return int(status_filter(query).scalar() or 0)
+
+    @classmethod
+    def get_response_time_avg(cls, db, domain_name, status_filter):
+        query = db \
+            .query(
+                sa.func.sum(RequestRollup.response_time_sum),
+                sa.func.sum(RequestRollup.count)
+            ) \
+            .filter(RequestRollup.domain_name == domain_name)
+
+        response_time_sum, count = status_filter(query).one()
+
+        if not count:
+            return 0
+
+        return float(response_time_sum) / float(count)
+
+    @classmethod
+    def delete_old_rollups(cls, db, config, today=None):
+        if today is None:
+            today = date.today()
+
+        dt = today - timedelta(days=config.DAYS_TO_KEEP_REQUESTS)
+
+        return db \
+            .query(RequestRollup) \
+            .filter(RequestRollup.day <= dt) \
+            .delete(synchronize_session=False)
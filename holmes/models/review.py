@@ -1,12 +1,13 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import time
 from uuid import uuid4
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from ujson import dumps
 import sqlalchemy as sa
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, aliased
 
 from holmes.models import Base
 
@@ -192,7 +193,7 @@ class Review(Base):
         return query.order_by(Page.last_review_date.desc())[lower_bound:upper_bound]
 
     @classmethod
-    def save_review(cls, page_uuid, review_data, db, search_provider, fact_definitions, violation_definitions, cache, publish, config):
+    def save_review(cls, page_uuid, review_data, db, search_provider, fact_definitions, violation_definitions, cache, publish, config, metrics=None):
         from holmes.models import Page, Request
 
         page = Page.by_uuid(page_uuid, db)
@@ -209,48 +210,41 @@ class Review(Base):
             domain_id=page.domain.id,
             page_id=page.id,
             is_active=True,
-            is_complete=False,
+            is_complete=True,
             completed_date=datetime.utcnow(),
             uuid=uuid4(),
         )
 
         db.add(review)
 
-        for fact in review_data['facts']:
-            name = fact['key']
-            key = fact_definitions[name]['key']
-            review.add_fact(key, fact['value'])
-
-        for violation in review_data['violations']:
-            name = violation['key']
-            key = violation_definitions[name]['key']
-            review.add_violation(
-                key,
-                violation['value'],
-                violation['points'],
-                page.domain
-            )
+        # facts and violations are inserted in bulk and need the review id
+        db.flush()
+
+        cls.insert_facts(db, review, review_data['facts'], fact_definitions)
+        cls.insert_violations(db, review, review_data['violations'], violation_definitions)
 
         page.expires = review_data['expires']
         page.last_modified = review_data['lastModified']
         page.last_review_uuid = review.uuid
         page.last_review = review
         page.last_review_date = review.completed_date
+        page.next_review_at = review.completed_date + timedelta(
+            seconds=config.REVIEW_EXPIRATION_IN_SECONDS
+        )
         page.violations_count = len(review_data['violations'])
-
-        review.is_complete = True
+        page.content_hash = review_data.get('contentHash')
+        page.reused_reviews_count = 0
 
         if not last_review:
             cache.increment_active_review_count(page.domain)
         else:
-            for violation in last_review.violations:
-                violation.review_is_active = False
-
+            cls.deactivate_violations(db, last_review)
             last_review.is_active = False
 
-        Review.delete_old_reviews(db, config, page)
-
+        started = time.time()
         search_provider.index_review(review)
+        if metrics is not None:
+            metrics.observe('holmes_index_review_seconds', time.time() - started)
 
         publish(dumps({
             'type': 'new-review',
@@ -258,16 +252,145 @@ class Review(Base):
         }))
 
     @classmethod
-    def delete_old_reviews(cls, db, config, page):
+    def insert_facts(cls, db, review, facts, fact_definitions):
+        from holmes.models.fact import Fact  # to avoid circular dependency
+
+        if not facts:
+            return
+
+        db.execute(Fact.__table__.insert(), [
+            {
+                'review_id': review.id,
+                'key_id': fact_definitions[fact['key']]['key'].id,
+                'value': fact['value']
+            }
+            for fact in facts
+        ])
+
+    @classmethod
+    def insert_violations(cls, db, review, violations, violation_definitions):
+        from holmes.models.violation import Violation  # to avoid circular dependency
+
+        if not violations:
+            return
+
+        db.execute(Violation.__table__.insert(), [
+            {
+                'review_id': review.id,
+                'key_id': violation_definitions[violation['key']]['key'].id,
+                'value': violation['value'],
+                'points': int(float(violation['points'])),
+                'domain_id': review.domain_id,
+                'review_is_active': True
+            }
+            for violation in violations
+        ])
+
+    @classmethod
+    def deactivate_violations(cls, db, review):
+        from holmes.models.violation import Violation  # to avoid circular dependency
+
+        db.query(Violation) \
+            .filter(Violation.review_id == review.id) \
+            .update({'review_is_active': False})
+
+    @classmethod
+    def renew_last_review(cls, page_uuid, review_data, db, publish, config):
+        from holmes.models import Page, Request
+
+        page = Page.by_uuid(page_uuid, db)
+
+        if page is None or page.last_review is None:
+            return False
+
+        if page.reused_reviews_count >= config.MAX_REUSED_REVIEWS:
+            return False
+
+        content_hash = review_data.get('contentHash')
+        if content_hash is not None and content_hash != page.content_hash:
+            return False
+
+        if review_data['requests']:
+            Request.save_requests(db, publish, page, review_data['requests'])
+
+        now = datetime.utcnow()
+
+        page.last_review_date = now
+        page.next_review_at = now + timedelta(
+            seconds=config.REVIEW_EXPIRATION_IN_SECONDS
+        )
+        page.reused_reviews_count += 1
+
+        return True
+
+    @classmethod
+    def get_old_review_ids(cls, db, number_to_keep, last_page_id=0, limit=1000):
+        first_page_id, max_page_id = db \
+            .query(sa.func.min(Review.page_id), sa.func.max(Review.page_id)) \
+            .filter(Review.page_id > last_page_id) \
+            .one()
+
+        if first_page_id is None:
+            return None, []
+
+        last_page_id = first_page_id + limit - 1
+
+        # a review is surplus when at least number_to_keep inactive reviews
+        # of its page are newer, ranked with the (page_id, completed_date) index
+        newer = aliased(Review)
         reviews = db \
-            .query(Review) \
-            .filter(Review.is_active == 0) \
-            .filter(Review.page_id == page.id) \
-            .order_by(Review.completed_date.desc()) \
+            .query(Review.id) \
+            .outerjoin(newer, sa.and_(
+                newer.page_id == Review.page_id,
+                newer.is_active == False,
+                sa.or_(
+                    newer.completed_date > Review.completed_date,
+                    sa.and_(newer.completed_date == Review.completed_date, newer.id > Review.id)
+                )
+            )) \
+            .filter(Review.is_active == False) \
+            .filter(Review.page_id.between(first_page_id, last_page_id)) \
+            .group_by(Review.id) \
+            .having(sa.func.count(newer.id) >= number_to_keep) \
             .all()
 
-        last_reviews = reviews[config.NUMBER_OF_REVIEWS_TO_KEEP:]
+        if last_page_id >= max_page_id:
+            last_page_id = None
+
+        return last_page_id, [review_id for (review_id,) in reviews]
+
+    @classmethod
+    def delete_reviews(cls, db, review_ids):
+        from holmes.models.fact import Fact  # to avoid circular dependency
+        from holmes.models.violation import Violation  # to avoid circular dependency
+
+        if not review_ids:
+            return {'reviews': 0, 'facts': 0, 'violations': 0}
+
+        facts = db.query(Fact) \
+            .filter(Fact.review_id.in_(review_ids)) \
+            .delete(synchronize_session=False)
+
+        violations = db.query(Violation) \
+            .filter(Violation.review_id.in_(review_ids)) \
+            .delete(synchronize_session=False)
+
+        reviews = db.query(Review) \
+            .filter(Review.id.in_(review_ids)) \
+            .delete(synchronize_session=False)
+
+        return {'reviews': reviews, 'facts': facts, 'violations': violations}
+
+    @classmethod
+    def delete_old_reviews(cls, db, config, last_page_id=0):
+        '''Deletes the inactive reviews beyond NUMBER_OF_REVIEWS_TO_KEEP of the
+        next REVIEW_PURGE_BATCH_SIZE page ids after last_page_id.
+
+        Returns the page id to continue from (None once all pages were seen)
+        and the number of rows deleted from each table.'''
+
+        last_page_id, review_ids = cls.get_old_review_ids(
+            db, config.NUMBER_OF_REVIEWS_TO_KEEP, last_page_id, config.REVIEW_PURGE_BATCH_SIZE
+        )
 
-        if len(last_reviews) > 0:
-            for review in last_reviews:
-                db.delete(review)
+        return last_page_id, cls.delete_reviews(db, review_ids)
@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# CPU bound steps that can run on the worker process pool. They must be
+# module level functions and return small picklable results, never trees.
+
+import re
+import zlib
+from collections import namedtuple
+from cStringIO import StringIO
+from gzip import GzipFile
+
+import lxml.etree
+
+
+URL_RE = re.compile(
+    r'^(?:http|ftp)s?://'  # http:// or https://
+    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|'  # domain...
+    r'localhost|'  # localhost...
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # ...or ip
+    r'(?::\d+)?'  # optional port
+    r'(?P<relative>(?:/?|[/?]\S+))$', re.IGNORECASE)
+
+HTML_ENTITIES = re.compile(r'(&amp;|&apos;|&quot;|&gt;|&lt;)')
+INVALID_CHARS = re.compile(r'(&|\'|"|>|<)')
+
+GZIP_MAGIC = '\x1f\x8b'
+# sizes are counted with the gzip container, as served with Content-Encoding: gzip
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+READ_CHUNK_SIZE = 64 * 1024
+
+# gzipped_size is None when only the plain size is known
+ResponseSizes = namedtuple('ResponseSizes', ['size', 'gzipped_size'])
+
+
+def get_gzipped_size(content):
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+
+    counter = SizeCounter()
+    counter.write(content)
+
+    return counter.finish().gzipped_size
+
+
+def is_encoded_url(url):
+    '''Returns None when url is not a valid absolute url.'''
+
+    match = URL_RE.match(url)
+
+    if not match:
+        return None
+
+    relative = match.groupdict()['relative']
+    encoded = True
+
+    try:
+        str(relative).encode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        encoded = False
+
+    relative = HTML_ENTITIES.sub('', relative)
+
+    return encoded and not INVALID_CHARS.findall(relative)
+
+
+class SizeCounter(object):
+    '''Counts the plain and gzipped size of data written in chunks.'''
+
+    def __init__(self):
+        self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, GZIP_WBITS)
+        self.size = 0
+        self.gzipped_size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        self.gzipped_size += len(self.compressor.compress(data))
+
+    def finish(self):
+        if self.compressor is not None:
+            self.gzipped_size += len(self.compressor.flush())
+            self.compressor = None
+
+        return ResponseSizes(self.size, self.gzipped_size)
+
+
+class MeasuredReader(SizeCounter):
+    '''Counts the plain and gzipped size of a stream while it is read.'''
+
+    def __init__(self, stream):
+        super(MeasuredReader, self).__init__()
+        self.stream = stream
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.write(data)
+
+        return data
+
+    def finish(self):
+        while self.read(READ_CHUNK_SIZE):
+            pass
+
+        return super(MeasuredReader, self).finish()
+
+
+def get_local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_sitemap(content, max_urls=None):
+    '''Parses a (possibly gzipped) sitemap without building the whole tree.
+
+    Every url is counted, but at most max_urls of them are returned.'''
+
+    stream = StringIO(content)
+    if content[:2] == GZIP_MAGIC:
+        stream = GzipFile(mode='r', fileobj=stream)
+
+    reader = MeasuredReader(stream)
+
+    sitemap = {
+        'sitemaps': [],
+        'urls': [],
+        'urls_count': 0,
+        'not_encoded': 0,
+    }
+
+    events = lxml.etree.iterparse(
+        reader, events=('end',), encoding='utf-8', recover=True
+    )
+
+    try:
+        for event, element in events:
+            if not isinstance(element.tag, basestring):
+                continue
+
+            name = get_local_name(element.tag)
+
+            if name not in ('sitemap', 'url'):
+                continue
+
+            for child in element:
+                if not isinstance(child.tag, basestring) or get_local_name(child.tag) != 'loc':
+                    continue
+
+                if child.text is None:
+                    continue
+
+                loc = child.text.strip()
+
+                if name == 'sitemap':
+                    sitemap['sitemaps'].append(loc)
+                    continue
+
+                sitemap['urls_count'] += 1
+
+                if is_encoded_url(loc) is False:
+                    sitemap['not_encoded'] += 1
+
+                if max_urls is None or len(sitemap['urls']) < max_urls:
+                    sitemap['urls'].append(loc)
+
+            # drops the entries already read, so memory does not grow with the file
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    except (lxml.etree.XMLSyntaxError, IOError):
+        pass
+
+    try:
+        reader.finish()
+    except IOError:
+        pass
+
+    sitemap['size'] = reader.size
+    sitemap['gzipped_size'] = reader.gzipped_size
+
+    return sitemap
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+from uuid import uuid4
+
+from holmes.cli import BaseCLI
+from holmes.models.request import Request
+from holmes.models.request_rollup import RequestRollup
+
+
+class RequestPartitionWorker(BaseCLI):
+    '''Creates the upcoming daily partitions of requests and drops the expired
+    ones, along with their rollups.'''
+
+    def initialize(self):
+        self.uuid = uuid4().hex
+
+        self.error_handlers = [handler(self.config) for handler in self.load_error_handlers()]
+
+        self.connect_sqlalchemy()
+
+    def do_work(self):
+        created = Request.create_partitions(self.db, self.config)
+        dropped = Request.drop_old_partitions(self.db, self.config)
+        rollups = RequestRollup.delete_old_rollups(self.db, self.config)
+        self.db.commit()
+
+        if created:
+            self.info('Created request partitions up to %s.' % created[-1].isoformat())
+
+        if dropped:
+            self.info('Dropped %d request partitions up to %s.' % (len(dropped), dropped[-1].isoformat()))
+
+        if rollups:
+            self.info('Deleted %d expired request rollups.' % rollups)
+
+        time.sleep(self.config.REQUEST_PARTITIONS_INTERVAL_IN_SECONDS)
+
+
+def main():
+    worker = RequestPartitionWorker(sys.argv[1:])
+    worker.run()
+
+if __name__ == '__main__':
+    main()
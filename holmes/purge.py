@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+from uuid import uuid4
+
+from holmes.cli import BaseCLI
+from holmes.models.review import Review
+
+
+class ReviewPurgeWorker(BaseCLI):
+    '''Deletes the reviews of each page beyond NUMBER_OF_REVIEWS_TO_KEEP.'''
+
+    def initialize(self):
+        self.uuid = uuid4().hex
+
+        self.error_handlers = [handler(self.config) for handler in self.load_error_handlers()]
+
+        self.connect_sqlalchemy()
+
+        self.start_pass()
+
+    def start_pass(self):
+        self.last_page_id = 0
+        self.reclaimed = {'reviews': 0, 'facts': 0, 'violations': 0}
+
+    def do_work(self):
+        started = time.time()
+
+        last_page_id, deleted = Review.delete_old_reviews(self.db, self.config, self.last_page_id)
+        self.db.commit()
+
+        for table, count in deleted.items():
+            self.reclaimed[table] += count
+
+        self.debug(
+            'Deleted %(reviews)d reviews, %(facts)d facts and %(violations)d violations.' % deleted
+        )
+
+        if last_page_id is None:
+            self.info(
+                'Purge finished: %(reviews)d reviews, %(facts)d facts and %(violations)d violations reclaimed.' % self.reclaimed
+            )
+            self.start_pass()
+            time.sleep(self.config.REVIEW_PURGE_INTERVAL_IN_SECONDS)
+            return
+
+        self.last_page_id = last_page_id
+        self.throttle(sum(deleted.values()), time.time() - started)
+
+    def throttle(self, rows, elapsed):
+        max_rows = self.config.REVIEW_PURGE_MAX_ROWS_PER_SECOND
+        if not max_rows:
+            return
+
+        wait = float(rows) / max_rows - elapsed
+        if wait > 0:
+            time.sleep(wait)
+
+
+def main():
+    worker = ReviewPurgeWorker(sys.argv[1:])
+    worker.run()
+
+if __name__ == '__main__':
+    main()
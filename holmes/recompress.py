@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+from uuid import uuid4
+
+from holmes.cli import BaseCLI
+from holmes.codec import json_codec
+
+
+class RecompressWorker(BaseCLI):
+    '''Rewrites the gzipped fact and violation values in the current codec format.'''
+
+    tables = ('facts', 'violations')
+
+    def initialize(self):
+        self.uuid = uuid4().hex
+
+        self.error_handlers = [handler(self.config) for handler in self.load_error_handlers()]
+
+        self.connect_sqlalchemy()
+
+        # None once every row of the table was seen
+        self.last_ids = dict((table, 0) for table in self.tables)
+
+    def do_work(self):
+        if all(last_id is None for last_id in self.last_ids.values()):
+            # values are always written in the current format, so once every
+            # table was walked there is nothing left to recompress
+            time.sleep(self.config.RECOMPRESS_IDLE_INTERVAL_IN_SECONDS)
+            return
+
+        for table in self.tables:
+            if self.last_ids[table] is None:
+                continue
+
+            self.last_ids[table] = self.recompress(table, self.last_ids[table])
+
+            if self.last_ids[table] is None:
+                self.info('All values in %s are in the current format.' % table)
+
+    def recompress(self, table, last_id):
+        rows = self.db.execute(
+            'SELECT id, value FROM %s WHERE id > :last_id ORDER BY id LIMIT :limit' % table,
+            {'last_id': last_id, 'limit': self.config.RECOMPRESS_BATCH_SIZE}
+        ).fetchall()
+
+        if not rows:
+            return None
+
+        values = []
+        for row_id, value in rows:
+            recoded = json_codec.recode(value)
+            if recoded is not None:
+                values.append({'id': row_id, 'value': recoded})
+
+        if values:
+            self.db.execute('UPDATE %s SET value = :value WHERE id = :id' % table, values)
+
+        self.db.commit()
+
+        self.debug('Rewrote %d of %d values in %s.' % (len(values), len(rows), table))
+
+        return rows[-1][0]
+
+
+def main():
+    worker = RecompressWorker(sys.argv[1:])
+    worker.run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import atexit
+import shutil
+import logging
+import tempfile
+from collections import OrderedDict
+
+
+class CacheTier(object):
+    name = None
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def count(self, result, value=1):
+        setattr(self, result, getattr(self, result) + value)
+
+        if self.metrics is not None:
+            self.metrics.increment('holmes_request_cache_total', value, tier=self.name, result=result)
+
+    def get(self, key):
+        '''Returns the value and its remaining seconds or None.'''
+
+        value = self._get(key)
+        self.count(value is None and 'misses' or 'hits')
+        return value
+
+    def _get(self, key):
+        raise NotImplementedError()
+
+    def set(self, key, value, expiration):
+        raise NotImplementedError()
+
+    def get_counters(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class MemoryTier(CacheTier):
+    '''Least recently used values, bounded by their total size in bytes.'''
+
+    name = 'memory'
+
+    def __init__(self, max_size, metrics=None):
+        super(MemoryTier, self).__init__(metrics)
+        self.max_size = max_size
+        self.size = 0
+        self.items = OrderedDict()
+
+    def _get(self, key):
+        item = self.items.pop(key, None)
+
+        if item is None:
+            return None
+
+        value, expires_at = item
+        ttl = expires_at - time.time()
+
+        if ttl <= 0:
+            self.size -= len(value)
+            return None
+
+        # most recently used items are kept at the end
+        self.items[key] = item
+
+        return value, ttl
+
+    def set(self, key, value, expiration):
+        if len(value) > self.max_size:
+            return
+
+        item = self.items.pop(key, None)
+        if item is not None:
+            self.size -= len(item[0])
+
+        self.items[key] = (value, time.time() + expiration)
+        self.size += len(value)
+
+        while self.size > self.max_size:
+            evicted_key, (evicted_value, expires_at) = self.items.popitem(last=False)
+            self.size -= len(evicted_value)
+            self.count('evictions')
+
+
+class DiskTier(CacheTier):
+    '''Append-only segment files, the oldest segment is dropped when full.'''
+
+    name = 'disk'
+
+    def __init__(self, path, max_size, segment_size, metrics=None):
+        super(DiskTier, self).__init__(metrics)
+        self.max_size = max_size
+        self.segment_size = segment_size
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        # the index only lives in this process, so its segments do too
+        self.path = tempfile.mkdtemp(prefix='requests-', dir=path)
+        atexit.register(self.close)
+
+        self.index = {}
+        self.segments = OrderedDict()
+        self.size = 0
+        self.current = None
+        self.current_id = 0
+
+    def get_segment_path(self, segment_id):
+        return os.path.join(self.path, '%08d.segment' % segment_id)
+
+    def _get(self, key):
+        entry = self.index.get(key)
+
+        if entry is None:
+            return None
+
+        segment_id, offset, length, expires_at = entry
+        ttl = expires_at - time.time()
+
+        if ttl <= 0 or segment_id not in self.segments:
+            del self.index[key]
+            return None
+
+        if segment_id == self.current_id:
+            self.current.flush()
+
+        with open(self.get_segment_path(segment_id), 'rb') as segment:
+            segment.seek(offset)
+            value = segment.read(length)
+
+        return value, ttl
+
+    def set(self, key, value, expiration):
+        if len(value) > self.segment_size:
+            return
+
+        if self.current is None or self.segments[self.current_id]['size'] + len(value) > self.segment_size:
+            self.start_segment()
+
+        segment = self.segments[self.current_id]
+        offset = segment['size']
+
+        self.current.write(value)
+        segment['size'] += len(value)
+        segment['keys'].append(key)
+        self.size += len(value)
+
+        self.index[key] = (self.current_id, offset, len(value), time.time() + expiration)
+
+        while self.size > self.max_size and len(self.segments) > 1:
+            self.drop_oldest_segment()
+
+    def start_segment(self):
+        if self.current is not None:
+            self.current.close()
+
+        self.current_id += 1
+        self.segments[self.current_id] = {'size': 0, 'keys': []}
+        self.current = open(self.get_segment_path(self.current_id), 'ab')
+
+    def drop_oldest_segment(self):
+        segment_id, segment = self.segments.popitem(last=False)
+        self.size -= segment['size']
+
+        evicted = 0
+        for key in segment['keys']:
+            entry = self.index.get(key)
+            if entry is not None and entry[0] == segment_id:
+                del self.index[key]
+                evicted += 1
+
+        if evicted:
+            self.count('evictions', evicted)
+
+        try:
+            os.remove(self.get_segment_path(segment_id))
+        except OSError:
+            logging.exception('Could not remove request cache segment %d.' % segment_id)
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class RedisTier(CacheTier):
+    name = 'redis'
+
+    def __init__(self, redis, metrics=None):
+        super(RedisTier, self).__init__(metrics)
+        self.redis = redis
+
+    def get_key(self, key):
+        return 'urls-%s' % key
+
+    def _get(self, key):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(self.get_key(key))
+        pipe.ttl(self.get_key(key))
+        value, ttl = pipe.execute()
+
+        if not value:
+            return None
+
+        return value, ttl
+
+    def set(self, key, value, expiration):
+        self.redis.setex(self.get_key(key), expiration, value)
+
+
+class TieredCache(object):
+    '''Reads the fastest tier first and fills the ones that missed.'''
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+
+    def get(self, key):
+        for index, tier in enumerate(self.tiers):
+            item = tier.get(key)
+
+            if item is None:
+                continue
+
+            value, ttl = item
+
+            if ttl > 0:
+                for missed_tier in self.tiers[:index]:
+                    missed_tier.set(key, value, ttl)
+
+            return value
+
+        return None
+
+    def set(self, key, value, expiration):
+        for tier in self.tiers:
+            tier.set(key, value, expiration)
+
+    def get_counters(self):
+        return dict((tier.name, tier.get_counters()) for tier in self.tiers)
+
+    def close(self):
+        for tier in self.tiers:
+            if hasattr(tier, 'close'):
+                tier.close()
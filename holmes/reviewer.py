@@ -9,11 +9,14 @@ try:
 except ImportError:
     from urlparse import urlparse
 
+import time
 import inspect
+import hashlib
 import email.utils as eut
 from datetime import datetime
 
 import codecs
+from contextlib import contextmanager
 from box.util.rotunicode import RotUnicode
 codecs.register(RotUnicode.search_function)
 
@@ -23,6 +26,8 @@ import logging
 from holmes.config import Config
 from holmes.facters import Facter
 from holmes.validators.base import Validator
+from holmes.metrics import Metrics
+from holmes.dom import ElementIndex
 from holmes.models import Page
 from holmes.utils import get_domain_from_url
 
@@ -37,6 +42,7 @@ class ReviewDAO(object):
         self.page_url = page_url
         self.last_modified = last_modified
         self.expires = expires
+        self.content_hash = None
         self.facts = {}
         self.violations = []
         self.data = {}
@@ -64,6 +70,7 @@ class ReviewDAO(object):
             'violations': self.violations,
             'lastModified': self.last_modified,
             'expires': self.expires,
+            'contentHash': self.content_hash,
             'requests': self.requests
         }
 
@@ -73,7 +80,9 @@ class Reviewer(object):
             self, api_url, page_uuid, page_url, page_score,
             config=None, validators=[], facters=[], search_provider=None, async_get=None,
             wait=None, wait_timeout=None, db=None, cache=None, publish=None,
-            fact_definitions=None, violation_definitions=None, girl=None):
+            fact_definitions=None, violation_definitions=None, girl=None,
+            concurrent=False, deduplicate=False, metrics=None, pool=None,
+            check_links=None, default_violations_values=None):
 
         self.db = db
         self.cache = cache
@@ -108,6 +117,12 @@ class Reviewer(object):
         self.validators = validators
         self.facters = facters
 
+        # facters with requests in flight and validators still to run
+        self.running_facters = []
+        self.current_facter = None
+        self.pending_validators = list(validators)
+        self.plugin_callbacks = {}
+
         self.search_provider = search_provider
 
         self.responses = {}
@@ -115,11 +130,37 @@ class Reviewer(object):
         self.status_codes = {}
 
         self.async_get_func = async_get
+        self.check_links_func = check_links
         self._wait_for_async_requests = wait
         self._wait_timeout = wait_timeout
 
+        # in concurrent mode the reviewer never blocks on the global wait,
+        # each stage runs when the requests issued by this review are done
+        self.concurrent = concurrent
+        self.pending_requests = 0
+        self.requests_done_callbacks = []
+        self.review_done_callback = None
+        self.is_done = False
+
+        # cpu bound steps run on this process pool when there is one
+        self.pool = pool
+        self.pending_tasks = []
+
+        # reuse the last review when the page body did not change
+        self.deduplicate = deduplicate
+
         self.fact_definitions = fact_definitions
         self.violation_definitions = violation_definitions
+        self.default_violations_values = default_violations_values or {}
+
+        if metrics is None:
+            metrics = Metrics()
+        self.metrics = metrics
+        self.content_requested_at = None
+        self.stage = 'content'
+
+        self._current = None
+        self._current_dom = None
 
     def get_domains_violations_prefs_by_key(self, key_name):
         if key_name is None:
@@ -147,28 +188,176 @@ class Reviewer(object):
         if self.ping_method is not None:
             self.ping_method()
 
-    def _async_get(self, url, handler, method='GET', **kw):
+    def _async_get(self, url, handler, method='GET', plugin=None, **kw):
         if self.async_get_func:
-            self.async_get_func(url, self.handle_async_get(handler), method, **kw)
+            self.pending_requests += 1
+            if plugin is not None:
+                plugin.pending_requests += 1
+
+            self.async_get_func(url, self.handle_async_get(handler, plugin), method, **kw)
+
+    def _check_links(self, urls, handler, plugin=None):
+        if self.check_links_func is None:
+            for url in urls:
+                self._async_get(url, handler, plugin=plugin)
+            return
+
+        urls = list(urls)
+        if not urls:
+            return
+
+        # the handler is called once for each url
+        self.pending_requests += len(urls)
+        if plugin is not None:
+            plugin.pending_requests += len(urls)
 
-    def handle_async_get(self, handler):
+        self.check_links_func(urls, self.handle_async_get(handler, plugin))
+
+    def handle_async_get(self, handler, plugin=None):
         def handle(url, response):
+            # responses may still arrive after the review was dropped
+            if self.is_done:
+                return
+
             if not hasattr(response, 'from_cache') or not response.from_cache:
                 response.from_cache = False
                 self.review_dao.requests.append((url, response))
 
-            handler(url, response)
+            try:
+                handler(url, response)
+            finally:
+                self.pending_requests -= 1
+
+            self.plugin_request_done(plugin)
+
+            if self.pending_requests == 0:
+                self.run_requests_done_callbacks()
 
         return handle
 
-    def review(self):
+    def run_in_pool(self, func, args, callback, plugin=None):
+        if self.pool is None:
+            callback(func(*args))
+            return
+
+        # tasks count as requests, so stages still wait for them
+        self.pending_requests += 1
+        if plugin is not None:
+            plugin.pending_requests += 1
+
+        self.pending_tasks.append((self.pool.apply_async(func, args), callback, plugin))
+
+    def run_finished_tasks(self, block=False):
+        for task in list(self.pending_tasks):
+            result, callback, plugin = task
+
+            if not block and not result.ready():
+                continue
+
+            self.pending_tasks.remove(task)
+
+            try:
+                callback(result.get())
+            finally:
+                self.pending_requests -= 1
+
+            self.plugin_request_done(plugin)
+
+        if self.pending_requests == 0:
+            self.run_requests_done_callbacks()
+
+    def plugin_request_done(self, plugin):
+        if plugin is None:
+            return
+
+        plugin.pending_requests -= 1
+
+        if plugin.pending_requests > 0:
+            return
+
+        for callback in self.plugin_callbacks.pop(plugin, []):
+            callback()
+
+        if plugin is self.current_facter:
+            return
+
+        if plugin not in self.running_facters:
+            return
+
+        self.running_facters.remove(plugin)
+
+        # in sync mode this runs inside the global wait, which must not be
+        # re-entered, so the validators are left for facts_loaded
+        if self.concurrent:
+            self.run_ready_validators()
+
+    def when_requests_done(self, callback):
+        stage = self.stage
+        started = time.time()
+
+        if not self.concurrent:
+            self.wait_for_async_requests()
+            self.metrics.observe('holmes_requests_wait_seconds', time.time() - started, stage=stage)
+            callback()
+            return
+
+        def timed_callback():
+            self.metrics.observe('holmes_requests_wait_seconds', time.time() - started, stage=stage)
+            callback()
+
+        self.requests_done_callbacks.append(timed_callback)
+
+        if self.pending_requests == 0:
+            self.run_requests_done_callbacks()
+
+    def when_plugin_requests_done(self, plugin, callback):
+        if plugin.pending_requests == 0:
+            callback()
+            return
+
+        # runs from the handler of the last response, so it must not wait
+        self.plugin_callbacks.setdefault(plugin, []).append(callback)
+
+    def run_requests_done_callbacks(self):
+        # a callback may issue new requests, the remaining ones must wait for them
+        while self.requests_done_callbacks and self.pending_requests == 0:
+            callback = self.requests_done_callbacks.pop(0)
+            callback()
+
+    def review(self, callback=None):
+        self.review_done_callback = callback
         self.load_content(self.content_loaded)
         self.wait_for_async_requests()
 
+    def finish_review(self):
+        if self.is_done:
+            return
+
+        self.is_done = True
+
+        if self.review_done_callback is not None:
+            self.review_done_callback(self)
+
+    def drop(self):
+        # nothing of a dropped review runs anymore, even if its requests
+        # or tasks finish later
+        self.is_done = True
+        self.requests_done_callbacks = []
+        self.plugin_callbacks = {}
+        self.pending_tasks = []
+
     def load_content(self, callback):
-        self._async_get(self.page_url, callback)
+        self.content_requested_at = time.time()
+        self._async_get(self.page_url, callback, conditional=True)
 
     def content_loaded(self, url, response):
+        if self.content_requested_at is not None:
+            self.metrics.observe('holmes_fetch_seconds', time.time() - self.content_requested_at)
+
+        if response.status_code == 304:
+            self.content_not_modified(url, response)
+            return
+
         if response.status_code > 499 or response.text is None:
             if response.text:
                 headers = None
@@ -180,10 +369,16 @@ class Reviewer(object):
             if headers is not None:
                 logging.warning('Response is from cache: %s' % response.from_cache)
                 logging.warning('Headers for "%s": %s' % (url, headers))
+            self.finish_review()
             return
 
         logging.debug('Content for url %s loaded.' % url)
 
+        self.review_dao.content_hash = self.get_content_hash(response.text)
+
+        if self.deduplicate and self.reuse_last_review(url):
+            return
+
         last_modified = None
 
         modified = response.headers.get('Last-Modified', None)
@@ -206,18 +401,74 @@ class Reviewer(object):
 
         self._current = response
 
-        try:
-            self._current.html = lxml.html.fromstring(response.text)
-        except (lxml.etree.XMLSyntaxError, lxml.etree.ParserError):
-            self._current.html = None
+        with self.metrics.timer('holmes_parse_seconds'):
+            try:
+                self._current.html = lxml.html.fromstring(response.text)
+            except (lxml.etree.XMLSyntaxError, lxml.etree.ParserError):
+                self._current.html = None
+
+            self._current_dom = ElementIndex(self._current.html)
 
+        self.stage = 'facters'
+        self.pending_validators = list(self.validators)
         self.run_facters()
-        self.wait_for_async_requests()
+        self.run_ready_validators()
+        self.when_requests_done(self.facts_loaded)
 
+    def facts_loaded(self):
+        self.stage = 'validators'
         self.run_validators()
-        self.wait_for_async_requests()
+        self.when_requests_done(self.validations_done)
 
+    def validations_done(self):
         self.save_review()
+        self.finish_review()
+
+    def content_not_modified(self, url, response):
+        from holmes.models import Review
+
+        logging.debug('Content for url %s not modified since last review.' % url)
+
+        with self.unit_of_work():
+            renewed = Review.renew_last_review(
+                self.page_uuid, self.review_dao.to_dict(), self.db,
+                self.publish, self.config
+            )
+
+        if renewed:
+            self.finish_review()
+            return
+
+        # nothing to reuse, so the page must be fully loaded and reviewed
+        self.content_requested_at = time.time()
+        self._async_get(self.page_url, self.content_loaded)
+
+    def get_content_hash(self, text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+
+        # whitespace-only changes do not change the review
+        normalized = ' '.join(text.split())
+
+        return hashlib.sha1(normalized).hexdigest()
+
+    def reuse_last_review(self, url):
+        from holmes.models import Review
+
+        with self.unit_of_work():
+            reused = Review.renew_last_review(
+                self.page_uuid, self.review_dao.to_dict(), self.db,
+                self.publish, self.config
+            )
+
+        if self.cache is not None:
+            self.cache.increment_review_dedup_count(reused)
+
+        if reused:
+            logging.debug('Content for url %s unchanged since last review.' % url)
+            self.finish_review()
+
+        return reused
 
     @property
     def current(self):
@@ -230,47 +481,187 @@ class Reviewer(object):
         else:
             return self.current.html
 
+    @property
+    def current_dom(self):
+        if self._current_dom is None:
+            self._current_dom = ElementIndex(getattr(self.current, 'html', None))
+
+        return self._current_dom
+
+    def select(self, selector):
+        return self.current_dom.select(selector)
+
     def run_facters(self):
-        for facter in self.facters:
+        # every facter runs, its facts are part of the review even when
+        # no validator reads its data
+        facters = [facter(self) for facter in self.facters]
+
+        # a facter counts as running until its own requests are done
+        self.running_facters = list(facters)
+
+        for facter_instance in facters:
+            facter = facter_instance.__class__
+
             self.ping()
             logging.debug('---------- Started running facter %s ---------' % facter.__name__)
-            facter_instance = facter(self)
-            facter_instance.get_facts()
+
+            self.current_facter = facter_instance
+            try:
+                with self.metrics.timer('holmes_facter_seconds', facter=facter.__name__):
+                    facter_instance.get_facts()
+            finally:
+                self.current_facter = None
+
+            if facter_instance.pending_requests == 0:
+                self.running_facters.remove(facter_instance)
+
+    def is_validator_ready(self, validator):
+        consumes = validator.consumes
+
+        if consumes is not None and not consumes:
+            return True
+
+        for facter in self.running_facters:
+            if consumes is None or facter.produces is None:
+                return False
+
+            if set(consumes) & set(facter.produces):
+                return False
+
+        return True
+
+    def run_ready_validators(self):
+        for validator in list(self.pending_validators):
+            # a validator run below may have finished a facter and run this one
+            if validator not in self.pending_validators:
+                continue
+
+            if self.is_validator_ready(validator):
+                self.pending_validators.remove(validator)
+                self.run_validator(validator)
 
     def run_validators(self):
-        for validator in self.validators:
-            self.ping()
-            logging.debug('---------- Started running validator %s ---------' % validator.__name__)
-            validator_instance = validator(self)
+        validators, self.pending_validators = self.pending_validators, []
+
+        for validator in validators:
+            self.run_validator(validator)
+
+    def run_validator(self, validator):
+        self.ping()
+        logging.debug('---------- Started running validator %s ---------' % validator.__name__)
+        validator_instance = validator(self)
+
+        with self.metrics.timer('holmes_validator_seconds', validator=validator.__name__):
             validator_instance.validate()
 
     def get_url(self, url):
         return join(self.api_url.rstrip('/'), url.lstrip('/'))
 
-    def enqueue(self, urls):
+    def enqueue(self, urls, responses=None):
         if not urls:
             return
 
+        responses = responses or {}
+        urls = self.get_unknown_urls(urls)
+
+        # links checked by other reviews do not need to be loaded again
+        statuses = {}
+        unloaded_urls = [url for url, score in urls if url not in responses]
+        if unloaded_urls and self.cache is not None:
+            statuses = self.cache.get_link_statuses(unloaded_urls)
+
+        # pages are checked one by one and added together once all are done
+        batch = {'pending': len(urls), 'pages': []}
+
         for url, score in urls:
-            Page.add_page(
-                self.db,
-                self.cache,
-                url,
-                score,
-                self.async_get_func,
-                self.publish,
-                self.config,
-                self.girl,
-                self.violation_definitions,
-                self.handle_page_added
-            )
+            self.check_page(url, responses, statuses, self.handle_page_checked(score, batch))
 
         self.wait_for_async_requests()
 
-    def handle_page_added(self, (url, result, page)):
-        if not result:
-            error_message = "Could not enqueue page '" + url + "'! Error: %s"
-            logging.error(error_message % page)
+    def check_page(self, url, responses, statuses, callback):
+        if url in responses:
+            response = responses[url]
+
+            if response is None:
+                callback((True, url, None))
+            else:
+                Page.handle_request(Page.handle_check_page(url, callback))(url, response)
+
+            return
+
+        if url in statuses:
+            status = statuses[url]
+            Page.handle_check_page(url, callback)(status['status_code'], None, status['effective_url'])
+            return
+
+        # counted like any other request, so the review is only saved
+        # once its pages were added
+        Page.check_page(url, self._async_get, self.config, callback)
+
+    def get_unknown_urls(self, urls):
+        '''Scores the urls that already have a page and returns the others.'''
+
+        if self.cache is None or not self.cache.has_known_pages():
+            return urls
+
+        urls = list(urls)
+        url_hashes = [Page.get_url_hash(url) for url, score in urls]
+
+        # pages the filter may know are confirmed with a single query
+        maybe_known = [
+            url_hash
+            for url_hash, known in zip(url_hashes, self.cache.get_known_pages(url_hashes))
+            if known
+        ]
+        known = Page.get_existing_url_hashes(self.db, maybe_known)
+
+        # pages that fail to be added are only false positives later on
+        self.cache.add_known_pages(url_hashes)
+
+        unknown_urls = []
+        for (url, score), url_hash in zip(urls, url_hashes):
+            if url_hash not in known:
+                unknown_urls.append((url, score))
+
+        if known:
+            self.cache.increment_page_scores([
+                url for (url, score), url_hash in zip(urls, url_hashes)
+                if url_hash in known
+            ])
+
+        self.metrics.increment('holmes_enqueued_urls_total', len(known), result='known')
+        self.metrics.increment('holmes_enqueued_urls_total', len(unknown_urls), result='unknown')
+
+        return unknown_urls
+
+    def handle_page_checked(self, score, batch):
+        def handle((valid, url, details)):
+            batch['pending'] -= 1
+
+            if valid:
+                batch['pages'].append((url, score))
+            else:
+                error_message = "Could not enqueue page '" + url + "'! Error: %s"
+                logging.error(error_message % details)
+
+            if batch['pending'] == 0:
+                self.add_pages(batch['pages'])
+
+        return handle
+
+    def add_pages(self, pages):
+        if pages:
+            with self.metrics.timer('holmes_add_pages_seconds'), self.unit_of_work():
+                Page.add_pages(
+                    self.db,
+                    self.cache,
+                    pages,
+                    self.publish,
+                    self.config,
+                    self.girl,
+                    self.default_violations_values,
+                    self.violation_definitions
+                )
 
         self.ping()
 
@@ -285,15 +676,42 @@ class Reviewer(object):
 
         data = self.review_dao.to_dict()
 
-        Review.save_review(
-            self.page_uuid, data, self.db, self.search_provider,
-            self.fact_definitions, self.violation_definitions,
-            self.cache, self.publish, self.config
-        )
+        with self.metrics.timer('holmes_save_review_seconds'), self.unit_of_work():
+            Review.save_review(
+                self.page_uuid, data, self.db, self.search_provider,
+                self.fact_definitions, self.violation_definitions,
+                self.cache, self.publish, self.config, self.metrics
+            )
+
+    @contextmanager
+    def unit_of_work(self):
+        # concurrent reviews share the session, so a failure must only
+        # undo the writes of this review and not the ones of the others
+        if not self.concurrent:
+            yield
+            return
+
+        savepoint = self.db.begin_nested()
+
+        try:
+            yield
+        except Exception:
+            savepoint.rollback()
+            raise
+
+        savepoint.commit()
 
     def wait_for_async_requests(self):
+        if self.concurrent:
+            return
+
         self._wait_for_async_requests(self._wait_timeout)
 
+        # finished tasks may issue new requests
+        while self.pending_tasks:
+            self.run_finished_tasks(block=True)
+            self._wait_for_async_requests(self._wait_timeout)
+
     def is_root(self):
         result = urlparse(self.page_url)
         return '{0}://{1}'.format(result.scheme, result.netloc) == self.page_url.rstrip('/')
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+from collections import defaultdict
+
+
+class Scheduler(object):
+    '''Orders the pages due for review before they go to the job bucket.
+
+    Pages of each domain are given virtual finish tags (n / weight for the
+    n-th page of the domain) and served in tag order, so each domain with
+    pages waiting receives a share of the bucket proportional to its weight.
+    '''
+
+    def __init__(self, config):
+        self.config = config
+        self.weights = {}
+
+    def get_weight(self, domain_name, pages, limiter_capacity):
+        raise NotImplementedError()
+
+    def get_limiter_capacity(self, domain_url, limiter_buckets):
+        for limiter, available in limiter_buckets:
+            if limiter.matches(domain_url):
+                return available
+
+        return None
+
+    def schedule(self, pages, limiter_buckets):
+        pages_per_domain = defaultdict(list)
+        for page in pages:
+            pages_per_domain[page.domain_name].append(page)
+
+        self.weights = {}
+        heap = []
+
+        for domain_name, domain_pages in pages_per_domain.items():
+            capacity = self.get_limiter_capacity(domain_pages[0].domain_url, limiter_buckets)
+            weight = self.get_weight(domain_name, domain_pages, capacity)
+            self.weights[domain_name] = weight
+
+            if weight <= 0:
+                continue
+
+            for index, page in enumerate(domain_pages):
+                heap.append(((index + 1) / weight, page.next_review_at, domain_name, page))
+
+        heapq.heapify(heap)
+
+        while heap:
+            yield heapq.heappop(heap)[-1]
+
+
+class RoundRobinScheduler(Scheduler):
+    def get_weight(self, domain_name, pages, limiter_capacity):
+        return 1.0
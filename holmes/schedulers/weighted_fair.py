@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+
+from holmes.schedulers import Scheduler
+
+
+class WeightedFairScheduler(Scheduler):
+    def get_weight(self, domain_name, pages, limiter_capacity):
+        # a saturated limiter means any slot given to this domain is wasted.
+        # The free capacity itself is no weight, the bucket refill already
+        # stops at it, and it would hand the biggest limiters every slot
+        if limiter_capacity is not None and limiter_capacity <= 0:
+            return 0.0
+
+        weights = self.config.DOMAIN_SCHEDULING_WEIGHTS or {}
+        weight = float(weights.get(domain_name, 1.0))
+
+        # page scores grow with every link found to the page, so only
+        # their order of magnitude counts or popular domains take it all
+        scores = [max(page.score, 0) for page in pages]
+        weight *= 1.0 + math.log1p(sum(scores) / len(scores))
+
+        return weight
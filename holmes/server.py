@@ -18,7 +18,8 @@ from holmes.handlers.violation import (
     MostCommonViolationsHandler, ViolationsHandler, ViolationHandler, ViolationDomainsHandler
 )
 from holmes.handlers.review import (
-    ReviewHandler, LastReviewsHandler, ReviewsInLastHourHandler
+    ReviewHandler, LastReviewsHandler, ReviewsInLastHourHandler,
+    ReviewDedupHandler
 )
 from holmes.handlers.domains import (
     DomainsHandler, DomainDetailsHandler, DomainViolationsPerDayHandler,
@@ -40,10 +41,14 @@ from holmes.handlers.users_violations_prefs import UsersViolationsPrefsHandler
 from holmes.handlers.users import UserLocaleHandler
 
 from holmes.handlers.bus import EventBusHandler
+from holmes.handlers.worker import WorkersMetricsHandler
 from holmes.event_bus import EventBus
-from holmes.utils import load_classes, load_languages, locale_path
+from holmes.utils import (
+    load_classes, load_languages, locale_path, get_definitions_fingerprint
+)
 from holmes.models import Key, DomainsViolationsPrefs
-from holmes.cache import Cache
+from holmes.cache import Cache, SyncCache
+from holmes.codec import json_codec
 from holmes import __version__
 from holmes.handlers import BaseHandler
 
@@ -88,6 +93,8 @@ class HolmesApiServer(Server):
             ('/most-common-violations/?', MostCommonViolationsHandler),
             ('/last-reviews/?', LastReviewsHandler),
             ('/reviews-in-last-hour/?', ReviewsInLastHourHandler, dict(is_public=True)),
+            ('/review-dedup/?', ReviewDedupHandler),
+            ('/workers/metrics/?', WorkersMetricsHandler),
             ('/page/(%s)/review/(%s)/?' % (uuid_regex, uuid_regex), ReviewHandler),
             ('/page/(%s)/reviews/?' % uuid_regex, PageReviewsHandler),
             ('/page/(%s)/violations-per-day/?' % uuid_regex, PageViolationsPerDayHandler),
@@ -134,6 +141,8 @@ class HolmesApiServer(Server):
         else:
             self.application.db = self.application.get_sqlalchemy_session()
 
+        json_codec.configure(self.application.config)
+
         if self.debug:
             from sqltap import sqltap
             self.sqltap = sqltap.start()
@@ -163,8 +172,6 @@ class HolmesApiServer(Server):
         for facter in self.application.facters:
             self.application.fact_definitions.update(facter.get_fact_definitions())
 
-        Key.insert_keys(self.application.db, self.application.fact_definitions)
-
         for validator in self.application.validators:
             self.application.violation_definitions.update(validator.get_violation_definitions())
 
@@ -172,12 +179,6 @@ class HolmesApiServer(Server):
                 validator.get_default_violations_values(self.application.config)
             )
 
-        Key.insert_keys(
-            self.application.db,
-            self.application.violation_definitions,
-            self.application.default_violations_values
-        )
-
         self.application.event_bus = EventBus(self.application)
         self.application.http_client = AsyncHTTPClient(io_loop=io_loop)
 
@@ -187,13 +188,50 @@ class HolmesApiServer(Server):
 
         self.configure_i18n()
 
+        self.sync_definitions()
+
+    def sync_definitions(self):
+        host = self.config.get('REDISHOST')
+        port = self.config.get('REDISPORT')
+
+        cache = SyncCache(
+            self.application.db,
+            redis.StrictRedis(host=host, port=port, db=0),
+            self.application.config
+        )
+
+        fingerprint = get_definitions_fingerprint(
+            self.application.fact_definitions,
+            self.application.violation_definitions,
+            self.application.default_violations_values
+        )
+
+        # keys and the prefs of all domains only change with the definitions
+        if cache.get_definitions_fingerprint() == fingerprint and \
+                Key.load_keys(self.application.db, self.application.fact_definitions) and \
+                Key.load_keys(
+                    self.application.db,
+                    self.application.violation_definitions,
+                    self.application.default_violations_values
+                ):
+            return
+
+        Key.insert_keys(self.application.db, self.application.fact_definitions)
+        Key.insert_keys(
+            self.application.db,
+            self.application.violation_definitions,
+            self.application.default_violations_values
+        )
+
         DomainsViolationsPrefs.insert_default_violations_values_for_all_domains(
             self.application.db,
             self.application.default_violations_values,
             self.application.violation_definitions,
-            self.application.cache
+            cache
         )
 
+        cache.set_definitions_fingerprint(fingerprint)
+
     def configure_material_girl(self):
         from holmes.material import configure_materials
 
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import hashlib
 from os.path import abspath, join, dirname
 import logging
 import gettext
@@ -176,3 +177,20 @@ class Jwt(object):
             return True, self.decode(encrypted_payload)
         except (jwt.ExpiredSignature, jwt.DecodeError, AttributeError):
             return False, None
+
+
+def get_definitions_fingerprint(fact_definitions, violation_definitions, default_violations_values):
+    facts = sorted(
+        (name, definition.get('category', None))
+        for name, definition in fact_definitions.items()
+    )
+    violations = sorted(
+        (name, definition.get('category', None))
+        for name, definition in violation_definitions.items()
+    )
+    defaults = sorted(
+        (name, repr(value.get('value', None)))
+        for name, value in default_violations_values.items()
+    )
+
+    return hashlib.sha1(repr((facts, violations, defaults))).hexdigest()
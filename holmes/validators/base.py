@@ -6,10 +6,17 @@ from holmes.facters import Baser
 
 class Validator(Baser):
 
+    # review.data keys this validator reads, None when not declared
+    consumes = None
+
     def __init__(self, reviewer):
         self.reviewer = reviewer
         self.url_buffer = set()
 
+        # responses already loaded for the buffered urls, None for urls
+        # that are left to be checked by their first review
+        self.url_responses = {}
+
     @classmethod
     def get_violation_definitions(cls):
         raise NotImplementedError
@@ -24,8 +31,8 @@ class Validator(Baser):
     def validate(self):
         return True
 
-    def enqueue(self, url):
-        self.reviewer.enqueue(url)
+    def enqueue(self, url, responses=None):
+        self.reviewer.enqueue(url, responses)
 
     def get_violation_pref(self, key):
         return self.reviewer.get_domains_violations_prefs_by_key(key)
@@ -51,6 +58,14 @@ class Validator(Baser):
     def send_url(self, url, score, response):
         if self.test_url(url, response, self.broken_link_violation, self.moved_link_violation):
             self.url_buffer.add((url, score))
+            self.url_responses[url] = response
+
+        if len(self.url_buffer) > self.config.MAX_ENQUEUE_BUFFER_LENGTH:
+            self.flush()
+
+    def send_unchecked_url(self, url, score):
+        self.url_buffer.add((url, score))
+        self.url_responses[url] = None
 
         if len(self.url_buffer) > self.config.MAX_ENQUEUE_BUFFER_LENGTH:
             self.flush()
@@ -59,8 +74,9 @@ class Validator(Baser):
         if not self.url_buffer:
             return
 
-        self.enqueue(self.url_buffer)
+        self.enqueue(self.url_buffer, self.url_responses)
         self.url_buffer = set()
+        self.url_responses = {}
 
     def broken_link_violation(self):
         text = 'broken_link_violation method need to be implemented by {0}'
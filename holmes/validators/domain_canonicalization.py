@@ -8,6 +8,8 @@ from holmes.utils import _
 
 class DomainCanonicalizationValidator(Validator):
 
+    consumes = ()
+
     @classmethod
     def get_no_301_parsed_value(cls, value):
         return {
@@ -85,8 +87,11 @@ class DomainCanonicalizationValidator(Validator):
         self.async_get(canonical_urls['no_www_url'],
                        self.handle_no_www_url_res,
                        follow_redirects=False)
-        self.reviewer.wait_for_async_requests()
+        self.when_requests_done(
+            lambda: self.check_canonical_urls(canonical_urls)
+        )
 
+    def check_canonical_urls(self, canonical_urls):
         if not self.has_same_effective_urls():
             self.add_violation(
                 key='page.canonicalization.different_endpoints',
@@ -7,6 +7,8 @@ from holmes.utils import _
 
 class HeadingHierarchyValidator(Validator):
 
+    consumes = ('page.heading_hierarchy',)
+
     @classmethod
     def get_violation_parsed_value(cls, value):
         return {
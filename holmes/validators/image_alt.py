@@ -6,6 +6,8 @@ from holmes.utils import _
 
 
 class ImageAltValidator(Validator):
+    consumes = ('page.all_images',)
+
     @classmethod
     def get_without_alt_parsed_value(cls, value):
         result = []
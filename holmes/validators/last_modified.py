@@ -7,6 +7,8 @@ from holmes.utils import _
 
 class LastModifiedValidator(Validator):
 
+    consumes = ('page.last_modified',)
+
     @classmethod
     def get_violation_definitions(cls):
         return {
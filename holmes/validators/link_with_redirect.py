@@ -7,6 +7,8 @@ from holmes.utils import _
 
 class LinkWithRedirectValidator(Validator):
 
+    consumes = ('page.links',)
+
     @classmethod
     def get_violation_definitions(cls):
         return {
@@ -13,6 +13,8 @@ from holmes.validators.base import Validator
 
 class LinkWithRelCanonicalValidator(Validator):
 
+    consumes = ('page.head',)
+
     @classmethod
     def get_violation_definitions(cls):
         return {
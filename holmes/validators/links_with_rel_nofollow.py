@@ -6,6 +6,8 @@ from holmes.validators.base import Validator
 
 
 class LinkWithRelNofollowValidator(Validator):
+    consumes = ('page.all_links',)
+
     @classmethod
     def get_links_nofollow_parsed_value(cls, value):
         return {'links': ', '.join([
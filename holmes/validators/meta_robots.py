@@ -6,6 +6,8 @@ from holmes.utils import _
 
 
 class MetaRobotsValidator(Validator):
+    consumes = ('meta.tags',)
+
     META_ROBOTS_NO_INDEX = _('A meta tag with the robots="noindex" '
                              'attribute tells the search engines that '
                              'they should not index this page.')
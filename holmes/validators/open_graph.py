@@ -7,6 +7,8 @@ from holmes.utils import _
 
 class OpenGraphValidator(Validator):
 
+    consumes = ('meta.tags',)
+
     @classmethod
     def get_open_graph_parsed_value(cls, value):
         return {'tags': ', '.join(value)}
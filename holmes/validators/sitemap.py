@@ -1,27 +1,22 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-import re
-
 from holmes.validators.base import Validator
+from holmes.offload import is_encoded_url
 from holmes.utils import _
 
-URL_RE = re.compile(
-    r'^(?:http|ftp)s?://'  # http:// or https://
-    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|'  # domain...
-    r'localhost|'  # localhost...
-    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # ...or ip
-    r'(?::\d+)?'  # optional port
-    r'(?P<relative>(?:/?|[/?]\S+))$', re.IGNORECASE)
-
-HTML_ENTITIES = re.compile(r'(&amp;|&apos;|&quot;|&gt;|&lt;)')
-INVALID_CHARS = re.compile(r'(&|\'|"|>|<)')
-
-
 class SitemapValidator(Validator):
     MAX_SITEMAP_SIZE = 10  # 10 MB
     MAX_LINKS_SITEMAP = 50000
 
+    consumes = (
+        'sitemap.data',
+        'sitemap.urls',
+        'sitemap.files.size',
+        'sitemap.files.urls',
+        'sitemap.files.not_encoded',
+    )
+
     @classmethod
     def get_violation_definitions(cls):
         return {
@@ -81,7 +76,7 @@ class SitemapValidator(Validator):
         for sitemap, size in self.review.data['sitemap.files.size'].items():
             response = self.review.data['sitemap.data'][sitemap]
 
-            if response.status_code > 399:
+            if response['status_code'] > 399:
                 self.add_violation(
                     key='sitemap.not_found',
                     value=sitemap,
@@ -89,7 +84,8 @@ class SitemapValidator(Validator):
                 )
                 return
 
-            if not response.text.strip():
+            # a not modified sitemap has no body, its data comes from the cache
+            if response['is_empty']:
                 self.add_violation(
                     key='sitemap.empty',
                     value=sitemap,
@@ -99,7 +95,11 @@ class SitemapValidator(Validator):
 
             size_mb = (size / 1024.0)
             urls_count = self.review.data['sitemap.files.urls'][sitemap]
-            not_encoded_links = 0
+            # counted while parsing, even for urls that are not kept
+            not_encoded_links = self.review.data.get('sitemap.files.not_encoded', {}).get(sitemap)
+            count_not_encoded = not_encoded_links is None
+            if count_not_encoded:
+                not_encoded_links = 0
 
             if size_mb > self.MAX_SITEMAP_SIZE:
                 self.add_violation(
@@ -122,27 +122,16 @@ class SitemapValidator(Validator):
                 )
 
             for url in self.review.data['sitemap.urls'][sitemap]:
-                match = URL_RE.match(url)
+                encoded = is_encoded_url(url)
 
-                if not match:
+                if encoded is None:
                     continue
 
-                parse = match.groupdict()
-                relative = parse['relative']
-                encoded = True
-
-                try:
-                    str(relative).encode('utf-8')
-                except (UnicodeEncodeError, UnicodeDecodeError):
-                    encoded = False
-
-                relative = HTML_ENTITIES.sub('', relative)
-                encoded = encoded and not INVALID_CHARS.findall(relative)
-
-                if not encoded:
+                if count_not_encoded and not encoded:
                     not_encoded_links += 1
 
-                self.send_url(url, self.reviewer.page_score / float(urls_count), response)
+                # sitemap urls are not loaded here, their first review checks them
+                self.send_unchecked_url(url, self.reviewer.page_score / float(urls_count))
 
             if not_encoded_links > 0:
                 self.add_violation(
@@ -7,6 +7,8 @@ from holmes.utils import _
 
 class TitleValidator(Validator):
 
+    consumes = ('page.title', 'page.title_count')
+
     @classmethod
     def get_violation_definitions(cls):
         return {
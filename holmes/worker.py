@@ -2,24 +2,36 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import time
 import logging
+from multiprocessing import Pool
+from collections import deque
 from uuid import uuid4
 from datetime import datetime, timedelta
 
 from ujson import dumps
 from colorama import Fore, Style
 from octopus import TornadoOctopus
+from octopus.model import Response
 from octopus.limiter.redis.per_domain import Limiter
-from retools.lock import Lock, LockTimeout
 from sqlalchemy.orm import scoped_session
+from tornado.ioloop import PeriodicCallback
 
 from holmes import __version__
 from holmes.reviewer import Reviewer
-from holmes.utils import load_classes, count_url_levels, get_domain_from_url
-from holmes.models import Request, Key, DomainsViolationsPrefs
+from holmes.metrics import Metrics
+from holmes.cache import get_validators
+from holmes.offload import ResponseSizes, SizeCounter
+from holmes.utils import (
+    load_classes, count_url_levels, get_domain_from_url,
+    get_definitions_fingerprint
+)
+from holmes.models import Key, DomainsViolationsPrefs, Page
 from holmes.cli import BaseCLI
 
 
+TASKS_POLL_INTERVAL_IN_SECONDS = 0.05
+
 class BaseWorker(BaseCLI):
     def _load_validators(self):
         return load_classes(default=self.config.VALIDATORS)
@@ -58,6 +70,17 @@ class BaseWorker(BaseCLI):
         )
         self.otto.start()
 
+        # pool tasks finish while octopus waits on requests, so they are
+        # run from within its loop instead of once every request is done
+        self.tasks_poller = None
+        if self.pool is not None:
+            self.tasks_poller = PeriodicCallback(
+                self._run_finished_tasks,
+                TASKS_POLL_INTERVAL_IN_SECONDS * 1000,
+                io_loop=self.otto.ioloop
+            )
+            self.tasks_poller.start()
+
     def handle_error(self, exc_type, exc_value, tb):
         try:
             if not self.db.connection().invalidated:
@@ -67,10 +90,17 @@ class BaseWorker(BaseCLI):
             logging.error("Cannot rollback: %s" % str(err))
 
         self.otto.url_queue = []
+        self.fail_size_requests(str(exc_value))
+        self.fail_link_requests(str(exc_value))
+
         self.db.close_all()
         self.db.remove()
         self.db = scoped_session(self.sqlalchemy_db_maker)
 
+        # the queued requests of the reviews in flight were dropped above, so
+        # they would wait forever. Their writes were rolled back as well
+        self._drop_reviews_in_flight()
+
         for handler in self.error_handlers:
             handler.handle_exception(
                 exc_type, exc_value, tb, extra={
@@ -79,7 +109,41 @@ class BaseWorker(BaseCLI):
                 }
             )
 
-    def async_get(self, url, handler, method='GET', **kw):
+    def get_failed_response(self, url, error):
+        response = self.get_bodyless_response(url, 599, url)
+        response.error = error
+        response.from_cache = False
+
+        return response
+
+    def fail_size_requests(self, error):
+        # the requests these handlers wait on were dropped with the url queue
+        size_requests, self.size_requests = self.size_requests, {}
+
+        for (url, gzipped), handlers in size_requests.items():
+            response = self.get_failed_response(url, error)
+            response.sizes = ResponseSizes(0, 0)
+            self.run_failed_handlers(url, response, handlers)
+
+    def fail_link_requests(self, error):
+        link_requests, self.link_requests = self.link_requests, {}
+
+        for url, handlers in link_requests.items():
+            self.run_failed_handlers(url, self.get_failed_response(url, error), handlers)
+
+    def run_failed_handlers(self, url, response, handlers):
+        for handler in handlers:
+            try:
+                handler(url, response)
+            except Exception:
+                err = sys.exc_info()[1]
+                logging.error("Cannot fail request for %s: %s" % (url, str(err)))
+
+    def async_get(self, url, handler, method='GET', conditional=False, size_only=False, gzipped=False, **kw):
+        if size_only:
+            self.get_size(url, handler, gzipped, **kw)
+            return
+
         url, response = self.cache.get_request(url)
 
         kw['user_agent'] = self.config.HOLMES_USER_AGENT
@@ -88,21 +152,225 @@ class BaseWorker(BaseCLI):
             kw['proxy_host'] = self.config.HTTP_PROXY_HOST
             kw['proxy_port'] = self.config.HTTP_PROXY_PORT
 
+            if conditional:
+                validators = self.cache.get_url_validators(url)
+                if validators:
+                    headers = kw.get('headers', None) or {}
+                    headers.update(validators)
+                    kw['headers'] = headers
+
             self.debug('Enqueueing %s for %s...' % (method, url))
-            self.otto.enqueue(url, self.handle_response(url, handler), method, **kw)
+            self.otto.enqueue(url, self.handle_response(url, handler, conditional), method, **kw)
         else:
             handler(url, response)
 
-    def handle_response(self, url, handler):
+    def handle_response(self, url, handler, conditional=False):
         def handle(url, response):
             self.cache.set_request(
                 url, response.status_code, response.headers, response.cookies,
                 response.text, response.effective_url, response.error, response.request_time,
                 self.config.REQUEST_CACHE_EXPIRATION_IN_SECONDS
             )
+
+            if conditional and response.status_code == 200:
+                self.cache.set_url_validators(
+                    url, response.headers,
+                    self.config.URL_VALIDATORS_EXPIRATION_IN_SECONDS
+                )
+
             handler(url, response)
         return handle
 
+    def get_size(self, url, handler, gzipped=False, **kw):
+        # bodies are never kept, so these requests skip the request cache
+        # and use the metadata shared by every worker instead
+        metadata = self.cache.get_resource_metadata(url)
+
+        if self.is_metadata_fresh(metadata, gzipped):
+            handler(url, self.get_metadata_response(url, metadata))
+            return
+
+        # pages of a domain share their assets, so a request already in
+        # flight for another review is reused
+        for key in ((url, True), (url, gzipped)):
+            if key in self.size_requests:
+                self.size_requests[key].append(handler)
+                return
+
+        self.size_requests[(url, gzipped)] = [handler]
+        handler = self.handle_size_loaded(url, gzipped, metadata)
+
+        kw['user_agent'] = self.config.HOLMES_USER_AGENT
+        kw['proxy_host'] = self.config.HTTP_PROXY_HOST
+        kw['proxy_port'] = self.config.HTTP_PROXY_PORT
+
+        if metadata is not None and metadata['validators']:
+            headers = kw.get('headers', None) or {}
+            headers.update(metadata['validators'])
+            kw['headers'] = headers
+
+        if gzipped:
+            # the gzipped size can only be estimated from the body
+            self.get_streamed_size(url, handler, **kw)
+            return
+
+        self.debug('Enqueueing HEAD for %s...' % url)
+        self.otto.enqueue(url, self.handle_head_response(url, handler, kw), 'HEAD', **kw)
+
+    def is_metadata_fresh(self, metadata, gzipped):
+        if metadata is None or metadata['fresh_until'] < time.time():
+            return False
+
+        return not gzipped or metadata['gzipped_size'] is not None
+
+    def get_bodyless_response(self, url, status_code, effective_url):
+        response = Response(
+            url=url,
+            status_code=status_code,
+            headers={},
+            cookies=None,
+            text=None,
+            effective_url=effective_url,
+            error=None,
+            request_time=0
+        )
+        response.from_cache = True
+
+        return response
+
+    def get_metadata_response(self, url, metadata):
+        response = self.get_bodyless_response(url, metadata['status_code'], metadata['effective_url'])
+        response.sizes = ResponseSizes(metadata['size'], metadata['gzipped_size'])
+
+        return response
+
+    def handle_size_loaded(self, url, gzipped, metadata):
+        def handle(url, response):
+            if response.status_code == 304 and metadata is not None:
+                # only the freshness of the metadata changes
+                response = self.get_metadata_response(url, metadata)
+                response.from_cache = False
+
+            # timeouts and server errors are not kept
+            if response.status_code < 500:
+                validators = get_validators(response.headers)
+                if not validators and metadata is not None:
+                    validators = metadata['validators']
+
+                self.cache.set_resource_metadata(
+                    url, response.status_code, response.effective_url,
+                    response.sizes, validators,
+                    self.config.RESOURCE_METADATA_EXPIRATION_IN_SECONDS,
+                    self.config.URL_VALIDATORS_EXPIRATION_IN_SECONDS
+                )
+
+            for handler in self.size_requests.pop((url, gzipped), []):
+                handler(url, response)
+        return handle
+
+    def handle_head_response(self, url, handler, kw):
+        def handle(url, response):
+            if response.status_code == 304:
+                handler(url, response)
+                return
+
+            # servers that do not allow HEAD are asked again with a GET
+            if response.status_code > 399 and response.status_code not in (405, 501):
+                size = 0
+            else:
+                size = self.get_content_length(response)
+
+            if size is None:
+                self.get_streamed_size(url, handler, **kw)
+                return
+
+            response.sizes = ResponseSizes(size, None)
+            response.text = None
+            handler(url, response)
+        return handle
+
+    def get_content_length(self, response):
+        if response.status_code > 399 or not response.headers:
+            return None
+
+        # the length of a compressed body is not the size of the resource
+        if response.headers.get('Content-Encoding', 'identity') != 'identity':
+            return None
+
+        try:
+            return int(response.headers.get('Content-Length'))
+        except (TypeError, ValueError):
+            return None
+
+    def get_streamed_size(self, url, handler, **kw):
+        counter = SizeCounter()
+        kw['streaming_callback'] = counter.write
+
+        self.debug('Enqueueing streamed GET for %s...' % url)
+        self.otto.enqueue(url, self.handle_streamed_response(url, handler, counter), 'GET', **kw)
+
+    def handle_streamed_response(self, url, handler, counter):
+        def handle(url, response):
+            response.sizes = counter.finish()
+            response.text = None
+            handler(url, response)
+        return handle
+
+    def check_links(self, urls, handler):
+        # the navigation of a domain repeats on all of its pages, so the
+        # status of each link is shared by every review and worker
+        statuses = self.cache.get_link_statuses(urls)
+
+        for url in urls:
+            status = statuses.get(url)
+
+            if status is not None:
+                handler(url, self.get_bodyless_response(url, status['status_code'], status['effective_url']))
+                continue
+
+            if url in self.link_requests:
+                self.link_requests[url].append(handler)
+                continue
+
+            self.link_requests[url] = [handler]
+
+            kw = {
+                'user_agent': self.config.HOLMES_USER_AGENT,
+                'proxy_host': self.config.HTTP_PROXY_HOST,
+                'proxy_port': self.config.HTTP_PROXY_PORT
+            }
+
+            self.debug('Enqueueing HEAD for %s...' % url)
+            self.otto.enqueue(url, self.handle_link_head_response(url, kw), 'HEAD', **kw)
+
+    def handle_link_head_response(self, url, kw):
+        def handle(url, response):
+            # servers that do not allow HEAD are asked again with a GET
+            # whose body is dropped as it arrives
+            if response.status_code in (405, 501):
+                kw['streaming_callback'] = lambda chunk: None
+
+                self.debug('Enqueueing GET for %s...' % url)
+                self.otto.enqueue(url, self.handle_link_checked, 'GET', **kw)
+                return
+
+            self.handle_link_checked(url, response)
+        return handle
+
+    def handle_link_checked(self, url, response):
+        response.text = None
+
+        # timeouts and server errors are checked again sooner
+        if response.status_code > 499:
+            expiration = self.config.LINK_STATUS_ERROR_EXPIRATION_IN_SECONDS
+        else:
+            expiration = self.config.LINK_STATUS_EXPIRATION_IN_SECONDS
+
+        self.cache.set_link_status(url, response.status_code, response.effective_url, expiration)
+
+        for handler in self.link_requests.pop(url, []):
+            handler(url, response)
+
     def handle_limiter_miss(self, url):
         pass
 
@@ -116,6 +384,15 @@ class HolmesWorker(BaseWorker):
         self.working_url = None
         self.domain_name = None
         self.last_ping = None
+        self.jobs = deque()
+        self.reviews_in_flight = {}
+        self.size_requests = {}
+        self.link_requests = {}
+        self.metrics = Metrics()
+
+        self.pool = None
+        if self.config.WORKER_PROCESS_POOL_SIZE > 0:
+            self.pool = Pool(self.config.WORKER_PROCESS_POOL_SIZE)
 
         authnz_wrapper_class = self.load_authnz_wrapper()
         if authnz_wrapper_class:
@@ -136,6 +413,7 @@ class HolmesWorker(BaseWorker):
         )
 
         self.connect_to_redis()
+        self.cache.metrics = self.metrics
         self.start_otto()
 
         self.fact_definitions = {}
@@ -146,8 +424,6 @@ class HolmesWorker(BaseWorker):
         for facter in self.facters:
             self.fact_definitions.update(facter.get_fact_definitions())
 
-        Key.insert_keys(self.db, self.fact_definitions)
-
         for validator in self.validators:
             self.violation_definitions.update(validator.get_violation_definitions())
 
@@ -155,12 +431,34 @@ class HolmesWorker(BaseWorker):
                 validator.get_default_violations_values(self.config)
             )
 
+        self.configure_material_girl()
+
+        self.sync_definitions()
+
+        self.load_all_domains_violations_prefs()
+        self.load_known_pages()
+
+    def sync_definitions(self):
+        fingerprint = get_definitions_fingerprint(
+            self.fact_definitions,
+            self.violation_definitions,
+            self.default_violations_values
+        )
+
+        # keys and the prefs of all domains only change with the definitions,
+        # so while they are the same as the last synced ones a worker only reads
+        if self.cache.get_definitions_fingerprint() == fingerprint and \
+                Key.load_keys(self.db, self.fact_definitions) and \
+                Key.load_keys(self.db, self.violation_definitions, self.default_violations_values):
+            return
+
+        Key.insert_keys(self.db, self.fact_definitions)
         Key.insert_keys(
             self.db, self.violation_definitions, self.default_violations_values
         )
 
-        self.configure_material_girl()
-
+        # new domains get their default prefs when created, so all domains
+        # only need to be synced when the definitions change
         DomainsViolationsPrefs.insert_default_violations_values_for_all_domains(
             self.db,
             self.default_violations_values,
@@ -168,13 +466,26 @@ class HolmesWorker(BaseWorker):
             self.cache
         )
 
-        self.load_all_domains_violations_prefs()
+        self.cache.set_definitions_fingerprint(fingerprint)
 
     def load_all_domains_violations_prefs(self):
-        from holmes.models import Domain
+        self.cache.set_domains_violations_prefs(
+            DomainsViolationsPrefs.get_domains_violations_prefs_list(self.db)
+        )
+
+    def load_known_pages(self):
+        if self.cache.has_known_pages():
+            return
+
+        # until the filter exists every url is added the long way
+        self.info('Building the filter of known pages...')
+        built = self.cache.build_known_pages(
+            Page.get_all_url_hashes(self.db),
+            self.config.KNOWN_PAGES_FILTER_LOCK_EXPIRATION_IN_SECONDS
+        )
 
-        for domain in Domain.get_all_domains(self.db):
-            self.cache.get_domain_violations_prefs(domain.name)
+        if not built:
+            self.info('The filter of known pages is being built by another worker.')
 
     def config_parser(self, parser):
         parser.add_argument(
@@ -190,6 +501,13 @@ class HolmesWorker(BaseWorker):
             help='Whether http requests should be cached by Octopus.'
         )
 
+        parser.add_argument(
+            '--reviews-in-flight',
+            type=int,
+            default=1,
+            help='Number of reviews to interleave on the same Octopus'
+        )
+
     def get_description(self):
         uuid = str(getattr(self, 'uuid', ''))
 
@@ -204,6 +522,11 @@ class HolmesWorker(BaseWorker):
         self.debug('Started doing work...')
 
         self.update_otto_limiter()
+
+        if self.options.reviews_in_flight > 1:
+            self._do_concurrent_work()
+            return
+
         job = self._load_next_job()
 
         if job is None:
@@ -212,24 +535,122 @@ class HolmesWorker(BaseWorker):
             return
 
         if not self._start_job(job):
-            self.info('Could not start job for url "%s". Maybe other worker doing it?' % job['url'])
-            lock = job.get('lock', None)
-            self._release_lock(lock)
+            self.info('Lease for url "%s" expired before the job started. Skipping...' % job['url'])
             return
 
         self.info('Starting new job for %s...' % job['url'])
         self._start_reviewer(job=job)
 
-        lock = job.get('lock', None)
-        self._complete_job(lock)
-        self.db.commit()
+        self._complete_job(job)
+
+    def _do_concurrent_work(self):
+        self._start_concurrent_reviews()
+
+        if not self.reviews_in_flight:
+            self.info('No jobs could be found! Returning...')
+            self._ping_api()
+            return
+
+        while self.reviews_in_flight:
+            # octopus returns at once when it has nothing to fetch, so the
+            # worker blocks on the pool instead of spinning
+            if self.otto.url_queue or self.otto.running_urls:
+                self.otto.wait(0)
+            else:
+                self._wait_for_tasks()
+
+            self._run_finished_tasks()
+            self._drop_stalled_reviews()
+
+    def _wait_for_tasks(self, timeout=0.1):
+        # the pool can not wait on several results at once
+        deadline = time.time() + timeout
+
+        while not self._has_finished_tasks() and time.time() < deadline:
+            time.sleep(TASKS_POLL_INTERVAL_IN_SECONDS)
+
+    def _has_finished_tasks(self):
+        for reviewer in self.reviews_in_flight:
+            for result, callback, plugin in reviewer.pending_tasks:
+                if result.ready():
+                    return True
+
+        return False
+
+    def _run_finished_tasks(self):
+        for reviewer in list(self.reviews_in_flight.keys()):
+            reviewer.run_finished_tasks()
+
+    def _start_concurrent_reviews(self):
+        while len(self.reviews_in_flight) < self.options.reviews_in_flight:
+            job = self._load_next_job()
+
+            if job is None:
+                return
+
+            if not self._start_job(job):
+                self.info('Lease for url "%s" expired before the job started. Skipping...' % job['url'])
+                continue
+
+            self.info('Starting new concurrent job for %s...' % job['url'])
+            reviewer = self._get_reviewer(job, concurrent=True)
+
+            if reviewer is None:
+                self._complete_job(job)
+                continue
+
+            self.reviews_in_flight[reviewer] = job
+            reviewer.review(self.handle_review_done)
+
+    def handle_review_done(self, reviewer):
+        job = self.reviews_in_flight.pop(reviewer, None)
+
+        if job is None:
+            return
+
+        self._complete_job(job)
+
+        self._start_concurrent_reviews()
+
+    def _drop_stalled_reviews(self):
+        # with no pending requests nothing can move these reviews forward,
+        # which means one of their callbacks failed. The session is shared
+        # with the other reviews, the writes of the failed step were already
+        # undone by its unit of work (see Reviewer.unit_of_work)
+        for reviewer, job in list(self.reviews_in_flight.items()):
+            if reviewer.pending_requests > 0 or reviewer.is_done:
+                continue
+
+            self.error('Review for "%s" stalled. Dropping it...' % job['url'])
+            self._drop_review(reviewer, status='stalled')
+
+    def _drop_reviews_in_flight(self):
+        for reviewer, job in list(self.reviews_in_flight.items()):
+            self.error('Review for "%s" failed. Dropping it...' % job['url'])
+
+            try:
+                self._drop_review(reviewer, status='failed')
+            except Exception:
+                err = sys.exc_info()[1]
+                logging.error("Cannot drop review for %s: %s" % (job['url'], str(err)))
+
+    def _drop_review(self, reviewer, status):
+        job = self.reviews_in_flight.pop(reviewer)
+        reviewer.drop()
+        self._complete_job(job, status=status)
 
     def _start_reviewer(self, job):
+        reviewer = self._get_reviewer(job)
+
+        if reviewer is not None:
+            reviewer.review()
+
+    def _get_reviewer(self, job, concurrent=False):
         if job:
 
             if count_url_levels(job['url']) > self.config.MAX_URL_LEVELS:
                 self.info('Max URL levels! Details: %s' % job['url'])
-                return
+                return None
 
             self.debug('Starting Review for [%s]' % job['url'])
             reviewer = Reviewer(
@@ -242,6 +663,7 @@ class HolmesWorker(BaseWorker):
                 facters=self.facters,
                 search_provider=self.search_provider,
                 async_get=self.async_get,
+                check_links=self.check_links,
                 wait=self.otto.wait,
                 wait_timeout=0,  # max time to wait for all requests to finish
                 db=self.db,
@@ -249,10 +671,18 @@ class HolmesWorker(BaseWorker):
                 publish=self.publish,
                 girl=self.girl,
                 fact_definitions=self.fact_definitions,
-                violation_definitions=self.violation_definitions
+                violation_definitions=self.violation_definitions,
+                default_violations_values=self.default_violations_values,
+                concurrent=concurrent,
+                deduplicate=True,
+                metrics=self.metrics,
+                pool=self.pool
             )
+            reviewer.ping_method = lambda: self._renew_job_lease(job)
 
-            reviewer.review()
+            return reviewer
+
+        return None
 
     def _ping_api(self):
         self.debug('Pinging that this worker is still alive...')
@@ -267,6 +697,12 @@ class HolmesWorker(BaseWorker):
             'domainName': self.domain_name,
         }))
 
+        self.cache.set_worker_metrics(
+            self.uuid,
+            self.metrics.to_dict(),
+            self.config.WORKER_METRICS_EXPIRATION_IN_SECONDS
+        )
+
     def handle_limiter_miss(self, url):
         self.working_url = url
 
@@ -274,36 +710,70 @@ class HolmesWorker(BaseWorker):
             self._ping_api()
 
     def _load_next_job(self):
-        return self.cache.get_next_job(self.config.REVIEW_EXPIRATION_IN_SECONDS, self.config.WORKERS_LOOK_AHEAD_PAGES)
+        if not self.jobs:
+            jobs = self.cache.get_next_jobs(
+                self.config.WORKERS_LOOK_AHEAD_PAGES,
+                self.config.WORKER_JOBS_BATCH_SIZE,
+                self.config.WORKER_JOB_LEASE_IN_SECONDS
+            )
+
+            claimed_at = time.time()
+            for job in jobs:
+                job['claimed_at'] = claimed_at
+
+            self.jobs.extend(jobs)
+
+        if not self.jobs:
+            return None
+
+        return self.jobs.popleft()
 
     def _start_job(self, job):
-        try:
-            lock = Lock(job['url'], redis=self.redis, timeout=1)
-            lock.acquire()
+        # the lease may have expired while the job waited in the local batch
+        if not self._renew_job_lease(job, force=True):
+            self.metrics.increment('holmes_jobs_total', status='expired')
+            return False
 
-            self.working_url = job['url']
+        if 'claimed_at' in job:
+            self.metrics.observe('holmes_queue_wait_seconds', time.time() - job['claimed_at'])
 
-            if self.working_url:
-                self.domain_name, domain_url = get_domain_from_url(self.working_url)
+        self.working_url = job['url']
 
-            self._ping_api()
-            job['lock'] = lock
+        if self.working_url:
+            self.domain_name, domain_url = get_domain_from_url(self.working_url)
+
+        self._ping_api()
 
+        return True
+
+    def _renew_job_lease(self, job, force=False):
+        lease = self.config.get('WORKER_JOB_LEASE_IN_SECONDS')
+
+        # without a lease jobs are never requeued, so there is nothing to keep
+        if not lease:
             return True
-        except LockTimeout:
-            job['lock'] = None
-            return False
 
-    def _complete_job(self, lock):
+        now = time.time()
+
+        # reviewers ping a lot, the lease only needs a few heartbeats per period
+        if not force and now - job.get('lease_renewed_at', 0) < lease / 4.0:
+            return True
+
+        job['lease_renewed_at'] = now
+
+        return self.cache.extend_job_lease(job['bucket_item'], lease, job.get('lease_token'))
+
+    def _complete_job(self, job, status='completed'):
         self.working_url = None
         self.domain_name = None
+        self.metrics.increment('holmes_jobs_total', status=status)
         self._ping_api()
-        self._release_lock(lock)
-        Request.delete_old_requests(self.db, self.config)
 
-    def _release_lock(self, lock):
-        if lock is not None:
-            lock.release()
+        self.db.commit()
+
+        # only released after the commit, so the page is not due anymore
+        # when other workers can claim it again
+        self.cache.release_job_lease(job['bucket_item'], job.get('lease_token'))
 
 
 def main():
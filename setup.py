@@ -80,6 +80,9 @@ Holmes is a service to investigate your website health.
             'holmes-worker=holmes.worker:main',
             'holmes-material=holmes.material:main',
             'holmes-search=holmes.search:main',
+            'holmes-recompress=holmes.recompress:main',
+            'holmes-purge=holmes.purge:main',
+            'holmes-partitions=holmes.partitions:main',
         ],
     },
 )
@@ -12,7 +12,7 @@ from sqlalchemy.orm import scoped_session, sessionmaker
 
 from holmes.models import (
     Domain, Page, Review, Violation, Fact, Key, KeysCategory, Request,
-    User, Limiter, DomainsViolationsPrefs, UsersViolationsPrefs
+    RequestRollup, User, Limiter, DomainsViolationsPrefs, UsersViolationsPrefs
 )
 from uuid import uuid4
 
@@ -189,6 +189,18 @@ class RequestFactory(BaseFactory):
     review_url = 'http://globo.com/'
 
 
+class RequestRollupFactory(BaseFactory):
+    class Meta:
+        model = RequestRollup
+
+    domain_name = 'g1.globo.com'
+    day = datetime.date(2013, 02, 12)
+    status_code = 301
+    count = 1
+    response_time_sum = 0.23
+    bucket_1 = 1
+
+
 class UserFactory(BaseFactory):
     class Meta:
         model = User
@@ -8,6 +8,7 @@ from preggy import expect
 from holmes.config import Config
 from holmes.reviewer import Reviewer
 from holmes.facters.css import CSSFacter
+from holmes.offload import ResponseSizes
 from tests.unit.base import FacterTestCase
 from tests.fixtures import PageFactory
 
@@ -80,7 +81,9 @@ class TestCSSFacter(FacterTestCase):
 
         facter.async_get.assert_called_once_with(
             'http://my-site.com/a.css',
-            facter.handle_url_loaded
+            facter.handle_url_loaded,
+            size_only=True,
+            gzipped=True
         )
 
     def test_handle_url_loaded(self):
@@ -162,6 +165,57 @@ class TestCSSFacter(FacterTestCase):
         expect(facter.review.data).to_include('total.size.css.gzipped')
         expect(facter.review.data['total.size.css.gzipped']).to_equal(0)
 
+    def test_handle_url_loaded_with_measured_sizes(self):
+        page = PageFactory.create()
+
+        reviewer = Reviewer(
+            api_url='http://localhost:2368',
+            page_uuid=page.uuid,
+            page_url=page.url,
+            page_score=0.0,
+            config=Config(),
+            facters=[]
+        )
+        reviewer.run_in_pool = Mock()
+
+        response = Mock(status_code=200, text=None, sizes=ResponseSizes(2048, 1024))
+
+        facter = CSSFacter(reviewer)
+        facter.async_get = Mock()
+        facter.get_facts()
+
+        facter.handle_url_loaded('http://my-site.com/a.css', response)
+
+        expect(facter.review.data['total.size.css']).to_equal(2.0)
+        expect(facter.review.data['total.size.css.gzipped']).to_equal(1.0)
+        expect(reviewer.run_in_pool.called).to_be_false()
+
+    def test_handle_url_loaded_without_body_nor_gzipped_size(self):
+        page = PageFactory.create()
+
+        reviewer = Reviewer(
+            api_url='http://localhost:2368',
+            page_uuid=page.uuid,
+            page_url=page.url,
+            page_score=0.0,
+            config=Config(),
+            facters=[]
+        )
+        reviewer.run_in_pool = Mock()
+
+        # a 304 for metadata that only knows the plain size
+        response = Mock(status_code=304, text=None, sizes=ResponseSizes(2048, None))
+
+        facter = CSSFacter(reviewer)
+        facter.async_get = Mock()
+        facter.get_facts()
+
+        facter.handle_url_loaded('http://my-site.com/a.css', response)
+
+        expect(facter.review.data['total.size.css']).to_equal(2.0)
+        expect(facter.review.data['total.size.css.gzipped']).to_equal(0)
+        expect(reviewer.run_in_pool.called).to_be_false()
+
     def test_can_get_fact_definitions(self):
         reviewer = Mock()
         facter = CSSFacter(reviewer)
@@ -80,7 +80,9 @@ class TestImageFacter(FacterTestCase):
 
         facter.async_get.assert_called_once_with(
             'http://my-site.com/test.png',
-            facter.handle_url_loaded
+            facter.handle_url_loaded,
+            size_only=True,
+            gzipped=False
         )
 
     def test_handle_url_loaded(self):
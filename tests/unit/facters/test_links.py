@@ -43,7 +43,7 @@ class TestLinksFacter(FacterTestCase):
         facter = LinkFacter(reviewer)
         facter.add_fact = Mock()
 
-        facter.async_get = Mock()
+        facter.check_links = Mock()
         facter.get_facts()
 
         expect(facter.review.data).to_length(2)
@@ -57,7 +57,10 @@ class TestLinksFacter(FacterTestCase):
         expect(link.get('href')).to_equal('/')
         expect(link.get('title')).to_equal('globo.com')
 
-        expect(facter.async_get.call_count).to_equal(335)
+        expect(facter.check_links.call_count).to_equal(1)
+        urls, handler = facter.check_links.call_args[0]
+        expect(urls).to_length(335)
+        expect(handler).to_equal(facter.handle_url_loaded)
 
         expect(facter.add_fact.call_args_list).to_include(
             call(
@@ -110,7 +113,7 @@ class TestLinksFacter(FacterTestCase):
         reviewer.content_loaded(page.url, response)
 
         facter = LinkFacter(reviewer)
-        facter.async_get = Mock()
+        facter.check_links = Mock()
         facter.get_facts()
 
         facter.handle_url_loaded(page.url, response)
@@ -159,7 +162,7 @@ class TestLinksFacter(FacterTestCase):
         facter = LinkFacter(reviewer)
         facter.add_fact = Mock()
 
-        facter.async_get = Mock()
+        facter.check_links = Mock()
         facter.get_facts()
 
         expect(facter.add_fact.call_args_list).to_include(
@@ -174,7 +177,7 @@ class TestLinksFacter(FacterTestCase):
                 value=0
             ))
 
-        expect(facter.async_get.called).to_be_false()
+        facter.check_links.assert_called_once_with(set(), facter.handle_url_loaded)
 
     def test_javascript_link(self):
         page = PageFactory.create()
@@ -205,7 +208,7 @@ class TestLinksFacter(FacterTestCase):
         facter = LinkFacter(reviewer)
         facter.add_fact = Mock()
 
-        facter.async_get = Mock()
+        facter.check_links = Mock()
         facter.get_facts()
 
         expect(facter.add_fact.call_args_list).to_include(
@@ -249,7 +252,7 @@ class TestLinksFacter(FacterTestCase):
         facter = LinkFacter(reviewer)
         facter.add_fact = Mock()
 
-        facter.async_get = Mock()
+        facter.check_links = Mock()
         facter.get_facts()
 
         expect(facter.add_fact.call_args_list).to_include(
@@ -154,7 +154,10 @@ class TestSitemapFacter(FacterTestCase):
         facter.async_get = Mock()
         facter.handle_sitemap_loaded("http://g1.globo.com/sitemap.xml", response)
 
-        expect(facter.review.data['sitemap.data']["http://g1.globo.com/sitemap.xml"]).to_equal(response)
+        expect(facter.review.data['sitemap.data']["http://g1.globo.com/sitemap.xml"]).to_equal({
+            'status_code': 404,
+            'is_empty': False
+        })
 
     def test_handle_sitemap_index_loaded(self):
         page = PageFactory.create(url="http://g1.globo.com/")
@@ -187,10 +190,10 @@ class TestSitemapFacter(FacterTestCase):
         expect(facter.review.data['total.size.sitemap.gzipped']).to_equal(0.146484375)
         expect(facter.review.data['sitemap.files.urls']["http://g1.globo.com/sitemap.xml"]).to_equal(2)
         expect(facter.async_get.call_args_list).to_include(
-            call('http://domain.com/1.xml', facter.handle_sitemap_loaded),
+            call('http://domain.com/1.xml', facter.handle_sitemap_loaded, conditional=True),
         )
         expect(facter.async_get.call_args_list).to_include(
-            call('http://domain.com/2.xml', facter.handle_sitemap_loaded),
+            call('http://domain.com/2.xml', facter.handle_sitemap_loaded, conditional=True),
         )
 
     def test_handle_sitemap_url_loaded(self):
@@ -224,6 +227,11 @@ class TestSitemapFacter(FacterTestCase):
         expect(facter.review.data['total.size.sitemap.gzipped']).to_equal(0.1494140625)
         expect(facter.review.data['sitemap.files.urls']["http://g1.globo.com/sitemap.xml"]).to_equal(2)
         expect(facter.review.facts['total.sitemap.urls']['value']).to_equal(2)
+        expect(facter.review.data['sitemap.data']["http://g1.globo.com/sitemap.xml"]).to_equal({
+            'status_code': 200,
+            'is_empty': False
+        })
+        expect(response.text).to_be_null()
 
     def test_handle_robots_loaded(self):
         page = PageFactory.create(url="http://g1.globo.com/")
@@ -244,7 +252,8 @@ class TestSitemapFacter(FacterTestCase):
 
         facter.async_get.assert_called_once_with(
             'http://g1.globo.com/sitemap.xml',
-            facter.handle_sitemap_loaded
+            facter.handle_sitemap_loaded,
+            conditional=True
         )
 
     def test_gzipeed_sitemap(self):
@@ -278,10 +287,166 @@ class TestSitemapFacter(FacterTestCase):
         expect(facter.review.data['total.size.sitemap.gzipped']).to_equal(0.146484375)
         expect(facter.review.data['sitemap.files.urls']["http://g1.globo.com/sitemap.xml.gz"]).to_equal(2)
         expect(facter.async_get.call_args_list).to_include(
-            call('http://domain.com/1.xml', facter.handle_sitemap_loaded),
+            call('http://domain.com/1.xml', facter.handle_sitemap_loaded, conditional=True),
         )
         expect(facter.async_get.call_args_list).to_include(
-            call('http://domain.com/2.xml', facter.handle_sitemap_loaded),
+            call('http://domain.com/2.xml', facter.handle_sitemap_loaded, conditional=True),
+        )
+
+    def test_limits_concurrent_sitemap_requests(self):
+        page = PageFactory.create(url="http://g1.globo.com/")
+
+        config = Config()
+        config.MAX_CONCURRENT_SITEMAP_REQUESTS = 2
+
+        reviewer = Reviewer(
+            api_url='http://localhost:2368',
+            page_uuid=page.uuid,
+            page_url=page.url,
+            page_score=0.0,
+            config=config,
+            validators=[]
+        )
+
+        facter = SitemapFacter(reviewer)
+        facter.async_get = Mock()
+        facter.get_facts()
+        facter.async_get = Mock()
+
+        for index in range(4):
+            facter.get_sitemap('http://g1.globo.com/%d.xml' % index)
+        facter.get_sitemap('http://g1.globo.com/0.xml')
+
+        expect(facter.async_get.call_count).to_equal(2)
+
+        facter.handle_sitemap_loaded('http://g1.globo.com/0.xml', Mock(status_code=404, text='Not found'))
+
+        expect(facter.async_get.call_count).to_equal(3)
+        expect(facter.async_get.call_args_list[-1]).to_equal(
+            call('http://g1.globo.com/2.xml', facter.handle_sitemap_loaded, conditional=True)
+        )
+
+    def test_handle_sitemap_not_modified_uses_cached_sitemap(self):
+        page = PageFactory.create(url="http://g1.globo.com/")
+
+        validators = {'If-None-Match': '"abc"'}
+        cache = Mock()
+        cache.get_url_validators.return_value = validators
+        cache.get_sitemap.return_value = {
+            'size': 1024,
+            'gzipped_size': 512,
+            'sitemaps': ['http://g1.globo.com/1.xml'],
+            'urls_count': 10,
+            'not_encoded': 1,
+            'validators': validators
+        }
+
+        reviewer = Reviewer(
+            api_url='http://localhost:2368',
+            page_uuid=page.uuid,
+            page_url=page.url,
+            page_score=0.0,
+            config=Config(),
+            validators=[],
+            cache=cache
+        )
+
+        facter = SitemapFacter(reviewer)
+        facter.async_get = Mock()
+        facter.get_facts()
+        facter.async_get = Mock()
+
+        facter.handle_sitemap_loaded('http://g1.globo.com/sitemap.xml', Mock(status_code=304, text=''))
+
+        cache.get_sitemap.assert_called_once_with('g1.globo.com', 'http://g1.globo.com/sitemap.xml')
+        expect(facter.review.data['sitemap.files.size']['http://g1.globo.com/sitemap.xml']).to_equal(1.0)
+        expect(facter.review.data['sitemap.files.urls']['http://g1.globo.com/sitemap.xml']).to_equal(11)
+        expect(facter.review.data['sitemap.files.not_encoded']['http://g1.globo.com/sitemap.xml']).to_equal(1)
+        expect(facter.review.data['sitemap.urls']['http://g1.globo.com/sitemap.xml']).to_equal(set())
+        expect(facter.review.facts['total.sitemap.urls']['value']).to_equal(10)
+        expect(facter.review.facts['total.size.sitemap.gzipped']['value']).to_equal(0.5)
+        facter.async_get.assert_called_once_with(
+            'http://g1.globo.com/1.xml', facter.handle_sitemap_loaded, conditional=True
+        )
+
+    def test_handle_sitemap_not_modified_without_cache_loads_it_again(self):
+        page = PageFactory.create(url="http://g1.globo.com/")
+
+        cache = Mock()
+        cache.get_url_validators.return_value = {'If-None-Match': '"abc"'}
+        cache.get_sitemap.return_value = {
+            'size': 1024,
+            'gzipped_size': 512,
+            'sitemaps': [],
+            'urls_count': 10,
+            'not_encoded': 0,
+            'validators': {'If-None-Match': '"old"'}
+        }
+
+        reviewer = Reviewer(
+            api_url='http://localhost:2368',
+            page_uuid=page.uuid,
+            page_url=page.url,
+            page_score=0.0,
+            config=Config(),
+            validators=[],
+            cache=cache
+        )
+
+        facter = SitemapFacter(reviewer)
+        facter.async_get = Mock()
+        facter.get_facts()
+        facter.async_get = Mock()
+
+        facter.handle_sitemap_loaded('http://g1.globo.com/sitemap.xml', Mock(status_code=304, text=''))
+
+        expect(facter.review.data['sitemap.files.size']).to_be_empty()
+        facter.async_get.assert_called_once_with(
+            'http://g1.globo.com/sitemap.xml', facter.handle_sitemap_loaded
+        )
+
+    def test_handle_sitemap_parsed_caches_sitemap(self):
+        page = PageFactory.create(url="http://g1.globo.com/")
+
+        cache = Mock()
+        cache.get_url_validators.return_value = {'If-None-Match': '"abc"'}
+
+        reviewer = Reviewer(
+            api_url='http://localhost:2368',
+            page_uuid=page.uuid,
+            page_url=page.url,
+            page_score=0.0,
+            config=Config(),
+            validators=[],
+            cache=cache
+        )
+
+        facter = SitemapFacter(reviewer)
+        facter.async_get = Mock()
+        facter.get_facts()
+
+        facter.handle_sitemap_parsed('http://g1.globo.com/sitemap.xml', {
+            'size': 1024,
+            'gzipped_size': 512,
+            'sitemaps': [],
+            'urls': ['http://g1.globo.com/1.html'],
+            'urls_count': 1,
+            'not_encoded': 0
+        })
+
+        cache.set_sitemap.assert_called_once_with(
+            'g1.globo.com', 'http://g1.globo.com/sitemap.xml', {
+                'size': 1024,
+                'gzipped_size': 512,
+                'sitemaps': [],
+                'urls_count': 1,
+                'not_encoded': 0,
+                'validators': {'If-None-Match': '"abc"'}
+            },
+            Config().URL_VALIDATORS_EXPIRATION_IN_SECONDS
+        )
+        expect(facter.review.data['sitemap.urls']['http://g1.globo.com/sitemap.xml']).to_equal(
+            set(['http://g1.globo.com/1.html'])
         )
 
     def test_can_get_fact_definitions(self):
@@ -252,6 +252,8 @@ class TestNextJobHandler(ApiTestCase):
                 'num': x
             })
 
+        expect(returned_page['shares']).to_be_empty()
+
     @gen_test
     def test_can_get_pages_with_pagination(self):
         key = 'next-job-bucket'
@@ -293,3 +295,15 @@ class TestNextJobHandler(ApiTestCase):
                 'page': '%d' % x,
                 'num': x
             })
+
+    @gen_test
+    def test_can_get_next_job_shares(self):
+        shares = [{'domain': 'g1.com', 'weight': 2.0, 'scheduled': 1, 'share': 1.0}]
+        self.sync_cache.redis.set('next-job-shares', dumps(shares))
+
+        response = yield self.authenticated_fetch('/next-jobs')
+
+        returned_page = loads(response.body)
+
+        expect(response.code).to_equal(200)
+        expect(returned_page['shares']).to_be_like(shares)
@@ -255,3 +255,24 @@ class TestLastReviewsInLastHourHandler(ApiTestCase):
 
         result = loads(response.body)
         expect(result['count']).to_equal(2)
+
+
+class TestReviewDedupHandler(ApiTestCase):
+
+    @property
+    def sync_cache(self):
+        return self.connect_to_sync_redis()
+
+    @gen_test
+    def test_can_get_review_dedup_stats(self):
+        self.sync_cache.redis.set('review-dedup-hits', 3)
+        self.sync_cache.redis.set('review-dedup-misses', 1)
+
+        response = yield self.authenticated_fetch('/review-dedup')
+
+        expect(response.code).to_equal(200)
+        expect(loads(response.body)).to_be_like({
+            'hits': 3,
+            'misses': 1,
+            'hitRate': 0.75
+        })
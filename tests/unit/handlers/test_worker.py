@@ -0,0 +1,32 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from preggy import expect
+from tornado.testing import gen_test
+
+from holmes.metrics import Metrics
+from tests.unit.base import ApiTestCase
+
+
+class TestWorkersMetricsHandler(ApiTestCase):
+
+    @property
+    def sync_cache(self):
+        return self.connect_to_sync_redis()
+
+    @gen_test
+    def test_can_get_workers_metrics(self):
+        metrics = Metrics()
+        metrics.increment('holmes_jobs_total', status='completed')
+
+        self.sync_cache.set_worker_metrics('w1', metrics.to_dict(), 10)
+        self.sync_cache.redis.sadd('workers-metrics', 'dead-worker')
+
+        response = yield self.authenticated_fetch('/workers/metrics')
+
+        expect(response.code).to_equal(200)
+        expect(response.headers['Content-Type']).to_include('text/plain')
+        expect(response.body).to_include(
+            'holmes_jobs_total{status="completed",worker="w1"} 1'
+        )
+        expect(response.body).not_to_include('dead-worker')
@@ -6,9 +6,9 @@ from datetime import datetime
 from preggy import expect
 from tornado.testing import gen_test
 
-from holmes.models import Domain, Request
+from holmes.models import Domain, RequestRollup
 from tests.unit.base import ApiTestCase
-from tests.fixtures import DomainFactory, PageFactory, ReviewFactory, RequestFactory
+from tests.fixtures import DomainFactory, PageFactory, ReviewFactory, RequestRollupFactory
 
 
 class TestDomain(ApiTestCase):
@@ -186,64 +186,64 @@ class TestDomain(ApiTestCase):
         ])
 
     def test_can_get_good_request_count(self):
-        self.db.query(Request).delete()
+        self.db.query(RequestRollup).delete()
 
         domain = DomainFactory.create()
 
         good = domain.get_good_request_count(self.db)
         expect(good).to_equal(0)
 
-        RequestFactory.create(status_code=200, domain_name=domain.name)
-        RequestFactory.create(status_code=304, domain_name=domain.name)
+        RequestRollupFactory.create(status_code=200, domain_name=domain.name)
+        RequestRollupFactory.create(status_code=304, domain_name=domain.name)
 
         good = domain.get_good_request_count(self.db)
         expect(good).to_equal(2)
 
-        RequestFactory.create(status_code=400, domain_name=domain.name)
-        RequestFactory.create(status_code=403, domain_name=domain.name)
-        RequestFactory.create(status_code=404, domain_name=domain.name)
+        RequestRollupFactory.create(status_code=400, domain_name=domain.name)
+        RequestRollupFactory.create(status_code=403, domain_name=domain.name)
+        RequestRollupFactory.create(status_code=404, domain_name=domain.name)
 
         good = domain.get_good_request_count(self.db)
         expect(good).to_equal(2)
 
     def test_can_get_bad_request_count(self):
-        self.db.query(Request).delete()
+        self.db.query(RequestRollup).delete()
 
         domain = DomainFactory.create()
 
         bad = domain.get_bad_request_count(self.db)
         expect(bad).to_equal(0)
 
-        RequestFactory.create(status_code=200, domain_name=domain.name)
-        RequestFactory.create(status_code=304, domain_name=domain.name)
+        RequestRollupFactory.create(status_code=200, domain_name=domain.name)
+        RequestRollupFactory.create(status_code=304, domain_name=domain.name)
 
         bad = domain.get_bad_request_count(self.db)
         expect(bad).to_equal(0)
 
-        RequestFactory.create(status_code=400, domain_name=domain.name)
-        RequestFactory.create(status_code=403, domain_name=domain.name)
-        RequestFactory.create(status_code=404, domain_name=domain.name)
+        RequestRollupFactory.create(status_code=400, domain_name=domain.name)
+        RequestRollupFactory.create(status_code=403, domain_name=domain.name)
+        RequestRollupFactory.create(status_code=404, domain_name=domain.name)
 
         bad = domain.get_bad_request_count(self.db)
         expect(bad).to_equal(3)
 
     def test_can_get_response_time_avg(self):
-        self.db.query(Request).delete()
+        self.db.query(RequestRollup).delete()
 
         domain = DomainFactory.create()
 
         avg = domain.get_response_time_avg(self.db)
         expect(avg).to_be_like(0)
 
-        RequestFactory.create(status_code=200, domain_name=domain.name, response_time=0.25)
-        RequestFactory.create(status_code=304, domain_name=domain.name, response_time=0.35)
+        RequestRollupFactory.create(status_code=200, domain_name=domain.name, response_time_sum=0.25)
+        RequestRollupFactory.create(status_code=304, domain_name=domain.name, response_time_sum=0.35)
 
         avg = domain.get_response_time_avg(self.db)
         expect(avg).to_be_like(0.3)
 
-        RequestFactory.create(status_code=400, domain_name=domain.name, response_time=0.25)
-        RequestFactory.create(status_code=403, domain_name=domain.name, response_time=0.35)
-        RequestFactory.create(status_code=404, domain_name=domain.name, response_time=0.25)
+        RequestRollupFactory.create(status_code=400, domain_name=domain.name, response_time_sum=0.25)
+        RequestRollupFactory.create(status_code=403, domain_name=domain.name, response_time_sum=0.35)
+        RequestRollupFactory.create(status_code=404, domain_name=domain.name, response_time_sum=0.25)
 
         avg = domain.get_response_time_avg(self.db)
         expect(avg).to_be_like(0.3)
@@ -267,11 +267,11 @@ class TestDomain(ApiTestCase):
         ReviewFactory.create(domain=domain, page=page2, is_active=True, number_of_violations=10)
         ReviewFactory.create(domain=domain2, page=page3, is_active=True, number_of_violations=30)
 
-        RequestFactory.create(status_code=200, domain_name=domain.name, response_time=0.25)
-        RequestFactory.create(status_code=304, domain_name=domain.name, response_time=0.35)
-        RequestFactory.create(status_code=400, domain_name=domain.name, response_time=0.25)
-        RequestFactory.create(status_code=403, domain_name=domain.name, response_time=0.35)
-        RequestFactory.create(status_code=404, domain_name=domain.name, response_time=0.25)
+        RequestRollupFactory.create(status_code=200, domain_name=domain.name, response_time_sum=0.25)
+        RequestRollupFactory.create(status_code=304, domain_name=domain.name, response_time_sum=0.35)
+        RequestRollupFactory.create(status_code=400, domain_name=domain.name, response_time_sum=0.25)
+        RequestRollupFactory.create(status_code=403, domain_name=domain.name, response_time_sum=0.35)
+        RequestRollupFactory.create(status_code=404, domain_name=domain.name, response_time_sum=0.25)
 
         details = Domain.get_domains_details(self.db)
 
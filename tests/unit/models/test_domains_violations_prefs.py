@@ -92,6 +92,25 @@ class TestDomainsViolationsPrefs(ApiTestCase):
             }
         })
 
+    def test_can_get_domains_violations_prefs_list(self):
+        domain = DomainFactory.create(name='globo.com')
+
+        for i in range(2):
+            DomainsViolationsPrefsFactory.create(
+                domain=domain,
+                key=KeyFactory.create(name='some.random.%d' % i),
+                value='v%d' % i
+            )
+
+        data = DomainsViolationsPrefs.get_domains_violations_prefs_list(self.db)
+
+        expect(data).to_be_like({
+            'globo.com': [
+                {'key': 'some.random.0', 'value': 'v0'},
+                {'key': 'some.random.1', 'value': 'v1'}
+            ]
+        })
+
     def test_can_insert_domains_violations_prefs(self):
         domain = DomainFactory.create()
         key = KeyFactory.create()
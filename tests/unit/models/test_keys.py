@@ -114,6 +114,19 @@ class TestKey(ApiTestCase):
         expect(loaded_key.name).to_equal('some.random.key')
         expect(loaded_key.category.name).to_equal('HTTP')
 
+    def test_can_load_keys(self):
+        key = KeyFactory.create(name='some.random.key')
+        default_values = {'some.random.key': {'value': 100, 'description': 'my description'}}
+
+        keys = {'some.random.key': {'category': 'SEO'}}
+        expect(Key.load_keys(self.db, keys, default_values)).to_be_true()
+        expect(keys['some.random.key']['key'].id).to_equal(key.id)
+        expect(keys['some.random.key']['default_value']).to_equal(100)
+
+        keys = {'some.random.key': {}, 'other.key': {}}
+        expect(Key.load_keys(self.db, keys)).to_be_false()
+        expect(self.db.query(Key).count()).to_equal(1)
+
     def test_can_convert_key_to_dict(self):
         key = KeyFactory.create()
 
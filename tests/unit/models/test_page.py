@@ -2,14 +2,15 @@
 # -*- coding: utf-8 -*-
 
 from uuid import uuid4
-from datetime import datetime
+from datetime import datetime, timedelta
 
+from mock import Mock
 from preggy import expect
 
 from holmes.config import Config
-from holmes.models import Page
+from holmes.models import Page, Domain
 from tests.unit.base import ApiTestCase
-from tests.fixtures import PageFactory, ReviewFactory
+from tests.fixtures import PageFactory, ReviewFactory, DomainFactory
 
 
 class TestPage(ApiTestCase):
@@ -85,3 +86,110 @@ class TestPage(ApiTestCase):
 
         invalid_page = Page.by_uuid('123', self.db)
         expect(invalid_page).to_be_null()
+
+    def test_can_get_existing_url_hashes(self):
+        page = PageFactory.create()
+        other_page = PageFactory.create()
+
+        existing = Page.get_existing_url_hashes(
+            self.db, [page.url_hash, other_page.url_hash, Page.get_url_hash('http://unknown.com/')],
+            batch_size=2
+        )
+
+        expect(existing).to_equal(set([page.url_hash, other_page.url_hash]))
+
+    def test_can_get_all_url_hashes(self):
+        self.db.query(Page).delete()
+
+        pages = [PageFactory.create() for index in range(3)]
+
+        url_hashes = list(Page.get_all_url_hashes(self.db, batch_size=2))
+
+        expect(url_hashes).to_equal([page.url_hash for page in pages])
+
+    def test_url_hash_is_sha512_of_url(self):
+        page = PageFactory.create(url='http://g.com/a')
+
+        expect(Page.get_url_hash(page.url)).to_equal(page.url_hash)
+
+    def test_can_add_pages(self):
+        domain = DomainFactory.create(name='g.com', url='http://g.com/')
+        PageFactory.create(domain=domain, url='http://g.com/a')
+        cache = Mock()
+        publish = Mock()
+
+        added = Page.add_pages(
+            self.db, cache,
+            [('http://g.com/a', 1.0), ('http://g.com/b', 2.0), ('http://g.com/c', 3.0)],
+            publish, Config(), Mock(), {}, {}, batch_size=1
+        )
+
+        expect(sorted(added)).to_equal(['http://g.com/b', 'http://g.com/c'])
+        cache.increment_page_scores.assert_called_once_with(['http://g.com/a'])
+
+        page = Page.by_url_hash(Page.get_url_hash('http://g.com/b'), self.db)
+        expect(page.domain_id).to_equal(domain.id)
+        expect(page.score).to_equal(2.0)
+
+        expect(publish.call_count).to_equal(1)
+
+    def test_add_pages_without_new_pages_publishes_nothing(self):
+        page = PageFactory.create()
+        publish = Mock()
+
+        added = Page.add_pages(
+            self.db, Mock(), [(page.url, 1.0)], publish, Config(), Mock(), {}, {}
+        )
+
+        expect(added).to_be_empty()
+        expect(publish.called).to_be_false()
+
+    def test_can_get_pages_due_for_review(self):
+        self.db.query(Page).delete()
+        self.db.query(Domain).delete()
+
+        now = datetime.utcnow()
+
+        domain = DomainFactory.create()
+        inactive_domain = DomainFactory.create(is_active=False)
+
+        page1 = PageFactory.create(domain=domain, next_review_at=now - timedelta(hours=1))
+        page2 = PageFactory.create(domain=domain, next_review_at=now - timedelta(hours=2))
+        PageFactory.create(domain=domain, next_review_at=now + timedelta(hours=1))
+        PageFactory.create(domain=inactive_domain, next_review_at=now - timedelta(hours=3))
+
+        domains = Domain.get_active_domains(self.db)
+
+        pages = Page.get_pages_due_for_review(self.db, domains, now)
+
+        expect(pages).to_length(2)
+        expect(pages[0].uuid).to_equal(str(page2.uuid))
+        expect(pages[1].uuid).to_equal(str(page1.uuid))
+
+        pages = Page.get_pages_due_for_review(self.db, domains, now, limit=1)
+        expect(pages).to_length(1)
+
+    def test_pages_due_for_review_are_limited_per_domain(self):
+        self.db.query(Page).delete()
+        self.db.query(Domain).delete()
+
+        now = datetime.utcnow()
+
+        big_domain = DomainFactory.create()
+        small_domain = DomainFactory.create()
+
+        for hours in range(3, 6):
+            PageFactory.create(domain=big_domain, next_review_at=now - timedelta(hours=hours))
+        page = PageFactory.create(domain=small_domain, next_review_at=now - timedelta(hours=1))
+
+        domains = [big_domain, small_domain]
+
+        pages = Page.get_pages_due_for_review(self.db, domains, now, limit=2)
+
+        expect(pages).to_length(3)
+        expect([item.domain_id for item in pages]).to_equal([
+            big_domain.id, big_domain.id, small_domain.id
+        ])
+        expect(pages[2].uuid).to_equal(str(page.uuid))
+
+        expect(Page.get_pages_due_for_review(self.db, [], now)).to_be_empty()
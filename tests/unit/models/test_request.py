@@ -8,8 +8,8 @@ from mock import Mock
 from ujson import dumps
 
 from tests.unit.base import ApiTestCase
-from tests.fixtures import RequestFactory, DomainFactory, PageFactory
-from holmes.models import Request
+from tests.fixtures import RequestFactory, RequestRollupFactory, DomainFactory, PageFactory
+from holmes.models import Request, RequestRollup
 from holmes.config import Config
 
 
@@ -80,8 +80,7 @@ class TestRequest(ApiTestCase):
         expect(invalid_code).to_equal([])
 
     def test_can_get_requests_by_status_count(self):
-        for i in range(4):
-            RequestFactory.create(domain_name='globo.com', status_code=200)
+        RequestRollupFactory.create(domain_name='globo.com', status_code=200, count=4)
 
         total = Request.get_requests_by_status_count(
             'globo.com',
@@ -112,24 +111,24 @@ class TestRequest(ApiTestCase):
         DomainFactory.create(name='domain3.com')
 
         for i in range(3):
-            RequestFactory.create(
+            RequestRollupFactory.create(
                 status_code=200,
-                completed_date=utcnow.date() - timedelta(days=i),
+                day=utcnow.date() - timedelta(days=i),
                 domain_name='globo.com'
             )
-            RequestFactory.create(
+            RequestRollupFactory.create(
                 status_code=404,
-                completed_date=utcnow.date() - timedelta(days=i),
+                day=utcnow.date() - timedelta(days=i),
                 domain_name='globo.com'
             )
-            RequestFactory.create(
+            RequestRollupFactory.create(
                 status_code=404,
-                completed_date=utcnow.date() - timedelta(days=i),
+                day=utcnow.date() - timedelta(days=i),
                 domain_name='globoesporte.com'
             )
-            RequestFactory.create(
+            RequestRollupFactory.create(
                 status_code=599,
-                completed_date=utcnow.date() - timedelta(days=i),
+                day=utcnow.date() - timedelta(days=i),
             )
 
         self.db.flush()
@@ -142,24 +141,38 @@ class TestRequest(ApiTestCase):
              u'globoesporte.com': [(404, 3)]
         })
 
-    def test_can_remove_old_requests(self):
-        self.db.query(Request).delete()
+    def test_can_create_partitions(self):
+        config = Config()
+        config.REQUEST_PARTITIONS_AHEAD_IN_DAYS = 3
+
+        db = Mock()
+        db.execute.return_value.fetchall.return_value = [
+            ('p20131210', ), ('p20131211', ), ('pmax', )
+        ]
+
+        created = Request.create_partitions(db, config, today=date(2013, 12, 10))
+
+        expect(created).to_equal([date(2013, 12, 12), date(2013, 12, 13)])
+        db.execute.assert_called_with(
+            "ALTER TABLE requests REORGANIZE PARTITION pmax INTO ("
+            "PARTITION p20131212 VALUES LESS THAN (TO_DAYS('2013-12-12')), "
+            "PARTITION p20131213 VALUES LESS THAN (TO_DAYS('2013-12-13')), "
+            "PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        )
 
+    def test_can_drop_old_partitions(self):
         config = Config()
         config.DAYS_TO_KEEP_REQUESTS = 1
 
-        for i in range(4):
-            RequestFactory.create(
-                url='http://m.com/page-%d' % i,
-                domain_name='m.com',
-                status_code=200,
-                completed_date=date.today() - timedelta(days=i)
-            )
+        db = Mock()
+        db.execute.return_value.fetchall.return_value = [
+            ('pmax', ), ('p20131211', ), ('p20131209', ), ('p20131210', )
+        ]
 
-        Request.delete_old_requests(self.db, config)
+        dropped = Request.drop_old_partitions(db, config, today=date(2013, 12, 10))
 
-        requests = self.db.query(Request).all()
-        expect(requests).to_length(1)
+        expect(dropped).to_equal([date(2013, 12, 9), date(2013, 12, 10)])
+        db.execute.assert_called_with('ALTER TABLE requests DROP PARTITION p20131209, p20131210')
 
     def test_can_get_all_status_code(self):
         self.db.query(Request).delete()
@@ -194,6 +207,7 @@ class TestRequest(ApiTestCase):
 
     def test_can_save_requests(self):
         self.db.query(Request).delete()
+        self.db.query(RequestRollup).delete()
 
         domain = DomainFactory.create(name='t.com')
         page = PageFactory.create(domain=domain, url='http://t.com/a.html')
@@ -224,6 +238,13 @@ class TestRequest(ApiTestCase):
             expect(request.domain_name).to_equal('t.com')
             expect(request.review_url).to_equal('http://t.com/a.html')
 
+        rollups = self.db.query(RequestRollup).order_by(RequestRollup.status_code).all()
+
+        expect(rollups).to_length(3)
+        expect([rollup.status_code for rollup in rollups]).to_equal([0, 100, 200])
+        expect([rollup.count for rollup in rollups]).to_equal([1, 1, 1])
+        expect(rollups[2].get_histogram()).to_equal([0, 1, 0, 0, 0, 0, 0, 0])
+
         expect(publish.called).to_be_true()
 
         publish.assert_called_once_with(
@@ -0,0 +1,72 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+from preggy import expect
+
+from tests.unit.base import ApiTestCase
+from tests.fixtures import RequestRollupFactory
+from holmes.models import RequestRollup
+from holmes.models.request_rollup import get_bucket_index
+from holmes.config import Config
+
+
+class TestRequestRollup(ApiTestCase):
+    def test_can_get_bucket_index(self):
+        expect(get_bucket_index(0.05)).to_equal(0)
+        expect(get_bucket_index(0.1)).to_equal(0)
+        expect(get_bucket_index(0.3)).to_equal(2)
+        expect(get_bucket_index(60)).to_equal(7)
+
+    def test_can_add_requests(self):
+        self.db.query(RequestRollup).delete()
+
+        day = date(2013, 12, 10)
+
+        RequestRollup.add_requests(self.db, [
+            ('globo.com', day, 200, 0.05),
+            ('globo.com', day, 200, 0.3),
+            ('globo.com', day, 404, 12.0),
+        ])
+        RequestRollup.add_requests(self.db, [
+            ('globo.com', day, 200, 0.05),
+        ])
+
+        rollups = self.db.query(RequestRollup).order_by(RequestRollup.status_code).all()
+
+        expect(rollups).to_length(2)
+
+        expect(rollups[0].count).to_equal(3)
+        expect(rollups[0].response_time_sum).to_be_like(0.4)
+        expect(rollups[0].get_histogram()).to_equal([2, 0, 1, 0, 0, 0, 0, 0])
+
+        expect(rollups[1].count).to_equal(1)
+        expect(rollups[1].get_histogram()).to_equal([0, 0, 0, 0, 0, 0, 0, 1])
+
+    def test_can_get_count_by_status(self):
+        self.db.query(RequestRollup).delete()
+
+        RequestRollupFactory.create(domain_name='globo.com', status_code=200, count=2, day=date(2013, 12, 9))
+        RequestRollupFactory.create(domain_name='globo.com', status_code=200, count=3, day=date(2013, 12, 10))
+        RequestRollupFactory.create(domain_name='globo.com', status_code=404, count=1)
+        RequestRollupFactory.create(domain_name='g1.globo.com', status_code=404, count=7)
+
+        expect(RequestRollup.get_count_by_status(self.db, 'globo.com')).to_equal([
+            ('globo.com', 200, 5),
+            ('globo.com', 404, 1),
+        ])
+
+    def test_can_delete_old_rollups(self):
+        self.db.query(RequestRollup).delete()
+
+        config = Config()
+        config.DAYS_TO_KEEP_REQUESTS = 1
+
+        for day in range(8, 11):
+            RequestRollupFactory.create(day=date(2013, 12, day))
+
+        deleted = RequestRollup.delete_old_rollups(self.db, config, today=date(2013, 12, 10))
+
+        expect(deleted).to_equal(2)
+        expect(self.db.query(RequestRollup).all()).to_length(1)
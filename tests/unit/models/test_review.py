@@ -6,6 +6,7 @@ from uuid import uuid4
 from datetime import datetime
 
 from preggy import expect
+from mock import Mock
 #from tornado.testing import gen_test
 
 from holmes.config import Config
@@ -244,6 +245,7 @@ class TestReview(ApiTestCase):
 
         config = Config()
         config.NUMBER_OF_REVIEWS_TO_KEEP = 4
+        config.REVIEW_PURGE_BATCH_SIZE = 1000
 
         dt = datetime(2013, 12, 11, 10, 9, 8)
 
@@ -278,7 +280,10 @@ class TestReview(ApiTestCase):
         facts = self.db.query(Fact).all()
         expect(facts).to_length(7)
 
-        Review.delete_old_reviews(self.db, config, page1)
+        last_page_id, deleted = Review.delete_old_reviews(self.db, config)
+
+        expect(last_page_id).to_be_null()
+        expect(deleted).to_equal({'reviews': 2, 'facts': 2, 'violations': 4})
 
         reviews = self.db.query(Review).all()
         expect(reviews).to_length(6)
@@ -286,3 +291,141 @@ class TestReview(ApiTestCase):
         expect(violations).to_length(9)
         facts = self.db.query(Fact).all()
         expect(facts).to_length(5)
+
+    def test_get_old_review_ids_walks_page_id_ranges(self):
+        self.db.query(Violation).delete()
+        self.db.query(Fact).delete()
+        self.db.query(Review).delete()
+        self.db.query(Page).delete()
+
+        page1 = PageFactory.create()
+        page2 = PageFactory.create()
+
+        old_reviews = []
+        for page in (page1, page2):
+            for x in range(3):
+                review = ReviewFactory.create(
+                    page=page, is_active=False, completed_date=datetime(2013, 12, 11, 10, 10, x)
+                )
+                old_reviews.append(review)
+
+        # reviews of the same date are ranked by id
+        tied = ReviewFactory.create(
+            page=page2, is_active=False, completed_date=datetime(2013, 12, 11, 10, 10, 2)
+        )
+        self.db.flush()
+
+        last_page_id, review_ids = Review.get_old_review_ids(self.db, 2, limit=1)
+        expect(last_page_id).to_equal(page1.id)
+        expect(review_ids).to_equal([old_reviews[0].id])
+
+        last_page_id, review_ids = Review.get_old_review_ids(
+            self.db, 2, last_page_id=page2.id - 1, limit=1
+        )
+        expect(last_page_id).to_be_null()
+        expect(sorted(review_ids)).to_equal(sorted([old_reviews[3].id, old_reviews[4].id]))
+        expect(review_ids).not_to_include(tied.id)
+
+        expect(Review.get_old_review_ids(self.db, 2, last_page_id=page2.id)).to_equal((None, []))
+
+    def save_review(self, page, facts, violations, fact_definitions, violation_definitions):
+        Review.save_review(
+            page.uuid,
+            {
+                'requests': [],
+                'facts': facts,
+                'violations': violations,
+                'expires': None,
+                'lastModified': None,
+                'contentHash': 'abc'
+            },
+            self.db, Mock(), fact_definitions, violation_definitions,
+            Mock(), Mock(), Config()
+        )
+        self.db.flush()
+
+        return page.last_review
+
+    def test_can_save_review(self):
+        page = PageFactory.create()
+        fact_key = KeyFactory.create(name='fact.key')
+        violation_key = KeyFactory.create(name='violation.key')
+        fact_definitions = {'fact.key': {'key': fact_key}}
+        violation_definitions = {'violation.key': {'key': violation_key}}
+
+        first_review = self.save_review(
+            page,
+            [{'key': 'fact.key', 'value': {'a': 1}}],
+            [{'key': 'violation.key', 'value': ['x'], 'points': '10.5'}],
+            fact_definitions, violation_definitions
+        )
+
+        expect(first_review.is_complete).to_be_true()
+        expect(first_review.facts).to_length(1)
+        expect(first_review.facts[0].value).to_equal({'a': 1})
+        expect(first_review.violations).to_length(1)
+        expect(first_review.violations[0].points).to_equal(10)
+        expect(first_review.violations[0].domain_id).to_equal(page.domain.id)
+        expect(first_review.violations[0].review_is_active).to_be_true()
+        expect(page.violations_count).to_equal(1)
+        expect(page.content_hash).to_equal('abc')
+
+        second_review = self.save_review(
+            page, [], [{'key': 'violation.key', 'value': None, 'points': 1}],
+            fact_definitions, violation_definitions
+        )
+
+        expect(second_review.id).not_to_equal(first_review.id)
+        expect(first_review.is_active).to_be_false()
+
+        active = self.db.query(Violation.review_is_active) \
+            .filter(Violation.review_id == first_review.id) \
+            .scalar()
+        expect(active).to_be_false()
+        expect(second_review.violations[0].review_is_active).to_be_true()
+
+    def test_can_renew_last_review(self):
+        config = Config()
+        page = PageFactory.create()
+
+        expect(Review.renew_last_review(
+            page.uuid, {'requests': []}, self.db, Mock(), config
+        )).to_be_false()
+
+        review = ReviewFactory.create(
+            page=page, is_active=True, is_complete=True,
+            completed_date=datetime(2013, 12, 11, 10, 9, 8)
+        )
+        page.last_review = review
+        self.db.flush()
+
+        expect(Review.renew_last_review(
+            page.uuid, {'requests': []}, self.db, Mock(), config
+        )).to_be_true()
+
+        expect(page.last_review_date).to_be_greater_than(review.completed_date)
+        expect(page.next_review_at).to_be_greater_than(datetime.utcnow())
+        expect(page.last_review.id).to_equal(review.id)
+        expect(review.is_active).to_be_true()
+
+    def test_renew_last_review_checks_content_hash_and_reuse_limit(self):
+        config = Config(MAX_REUSED_REVIEWS=2)
+        page = PageFactory.create(content_hash='abc')
+        review = ReviewFactory.create(page=page, is_active=True, is_complete=True)
+        page.last_review = review
+        self.db.flush()
+
+        expect(Review.renew_last_review(
+            page.uuid, {'requests': [], 'contentHash': 'def'}, self.db, Mock(), config
+        )).to_be_false()
+
+        for i in range(2):
+            expect(Review.renew_last_review(
+                page.uuid, {'requests': [], 'contentHash': 'abc'}, self.db, Mock(), config
+            )).to_be_true()
+
+        expect(page.reused_reviews_count).to_equal(2)
+
+        expect(Review.renew_last_review(
+            page.uuid, {'requests': [], 'contentHash': 'abc'}, self.db, Mock(), config
+        )).to_be_false()
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import math
+from unittest import TestCase
+from datetime import datetime, timedelta
+
+from mock import Mock
+from preggy import expect
+
+from holmes.config import Config
+from holmes.schedulers import RoundRobinScheduler
+from holmes.schedulers.weighted_fair import WeightedFairScheduler
+
+
+def get_pages(*domains):
+    dt = datetime(2014, 1, 1)
+    pages = []
+
+    for index, domain in enumerate(domains):
+        pages.append(Mock(
+            url='%s%d' % (domain, index),
+            domain_name=domain,
+            domain_url='http://%s' % domain,
+            next_review_at=dt + timedelta(seconds=index),
+            score=0.0
+        ))
+
+    return pages
+
+
+class TestRoundRobinScheduler(TestCase):
+    def test_can_interleave_domains(self):
+        pages = get_pages('a.com', 'a.com', 'a.com', 'b.com', 'c.com', 'b.com')
+
+        scheduler = RoundRobinScheduler(Config())
+        scheduled = [page.url for page in scheduler.schedule(pages, [])]
+
+        expect(scheduled).to_be_like([
+            'a.com0', 'b.com3', 'c.com4', 'a.com1', 'b.com5', 'a.com2'
+        ])
+        expect(scheduler.weights).to_be_like({
+            'a.com': 1.0, 'b.com': 1.0, 'c.com': 1.0
+        })
+
+
+class TestWeightedFairScheduler(TestCase):
+    def test_can_give_configured_share(self):
+        pages = get_pages(*(['a.com'] * 4 + ['b.com'] * 4))
+
+        config = Config(DOMAIN_SCHEDULING_WEIGHTS={'a.com': 3})
+        scheduler = WeightedFairScheduler(config)
+        scheduled = [page.domain_name for page in scheduler.schedule(pages, [])]
+
+        expect(scheduled[:5]).to_be_like(['a.com', 'a.com', 'a.com', 'b.com', 'a.com'])
+
+    def test_saturated_limiter_domain_is_skipped(self):
+        pages = get_pages('a.com', 'b.com', 'b.com')
+
+        limiter = Mock()
+        limiter.matches = lambda url: url == 'http://a.com'
+
+        scheduler = WeightedFairScheduler(Config())
+        scheduled = [page.domain_name for page in scheduler.schedule(pages, [(limiter, 0)])]
+
+        expect(scheduled).to_be_like(['b.com', 'b.com'])
+        expect(scheduler.weights['a.com']).to_equal(0)
+
+    def test_score_increases_weight(self):
+        pages = get_pages('a.com', 'b.com')
+        pages[1].score = 1.0
+
+        scheduler = WeightedFairScheduler(Config())
+        list(scheduler.schedule(pages, []))
+
+        expect(scheduler.weights).to_be_like({'a.com': 1.0, 'b.com': 1.0 + math.log(2)})
+
+    def test_score_weight_is_damped(self):
+        pages = get_pages('a.com', 'b.com')
+        pages[1].score = 10000.0
+
+        scheduler = WeightedFairScheduler(Config())
+        list(scheduler.schedule(pages, []))
+
+        expect(scheduler.weights['b.com']).to_be_lesser_than(11.0)
+
+    def test_free_limiter_capacity_does_not_change_weight(self):
+        pages = get_pages('a.com', 'b.com')
+
+        limiter = Mock()
+        limiter.matches = lambda url: url == 'http://a.com'
+
+        scheduler = WeightedFairScheduler(Config())
+        list(scheduler.schedule(pages, [(limiter, 50)]))
+
+        expect(scheduler.weights).to_be_like({'a.com': 1.0, 'b.com': 1.0})
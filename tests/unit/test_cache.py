@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import time
+from datetime import datetime, timedelta
 from gzip import GzipFile
 from cStringIO import StringIO
 from ujson import dumps, loads
@@ -11,7 +12,9 @@ from preggy import expect
 from tornado.testing import gen_test
 from tornado.gen import Task
 
-from holmes.cache import Cache
+from holmes.cache import Cache, SyncCache
+from holmes.config import Config
+from holmes.offload import ResponseSizes
 from holmes.models import Domain, Limiter, Page
 from tests.unit.base import ApiTestCase
 from tests.fixtures import (
@@ -704,3 +707,286 @@ class SyncCacheTestCase(ApiTestCase):
 
         data = self.sync_cache.get_next_job_bucket()
         expect(data).to_be_null()
+
+    def test_fill_job_bucket_round_robins_domains(self):
+        key = 'next-job-bucket'
+        self.sync_cache.redis.delete(key)
+        self.db.query(Page).delete()
+        self.db.query(Limiter).delete()
+        self.db.query(Domain).delete()
+
+        due = datetime.utcnow() - timedelta(hours=1)
+
+        big = DomainFactory.create(name='big.com', url='http://big.com')
+        small = DomainFactory.create(name='small.com', url='http://small.com')
+
+        for x in range(3):
+            PageFactory.create(
+                domain=big, url='http://big.com/%d' % x,
+                next_review_at=due - timedelta(minutes=10 - x)
+            )
+
+        PageFactory.create(
+            domain=small, url='http://small.com/0', next_review_at=due
+        )
+
+        self.sync_cache.fill_job_bucket(look_ahead_pages=10)
+
+        data = [loads(item)['url'] for item in self.sync_cache.redis.zrange(key, 0, -1)]
+        expect(data).to_length(4)
+        expect(data).to_include('http://small.com/0')
+
+        shares = loads(self.sync_cache.redis.get('next-job-shares'))
+        expect(shares).to_length(2)
+        expect(shares[0]['domain']).to_equal('big.com')
+        expect(shares[0]['scheduled']).to_equal(3)
+        expect(shares[1]['domain']).to_equal('small.com')
+        expect(shares[1]['scheduled']).to_equal(1)
+
+    def test_claim_next_jobs(self):
+        key = 'next-job-bucket'
+
+        self.sync_cache.redis.delete(key)
+        self.sync_cache.redis.delete('next-job-leases')
+
+        for x in range(3):
+            self.sync_cache.redis.zadd(
+                key, x, dumps({'page': str(x), 'url': 'http://g%d.com' % x})
+            )
+
+        items, remaining = self.sync_cache.claim_next_jobs(2)
+        expect(items).to_be_like([
+            dumps({"url": "http://g0.com", "page": "0"}),
+            dumps({"url": "http://g1.com", "page": "1"}),
+        ])
+        expect(remaining).to_equal(1)
+        expect(self.sync_cache.redis.zcard('next-job-leases')).to_equal(0)
+
+        items, remaining = self.sync_cache.claim_next_jobs(2, lease=30, token='owner')
+        expect(items).to_length(1)
+        expect(remaining).to_equal(0)
+        expect(self.sync_cache.redis.zcard('next-job-leases')).to_equal(1)
+        expect(self.sync_cache.redis.hget('next-job-lease-owners', items[0])).to_equal('owner')
+
+        items, remaining = self.sync_cache.claim_next_jobs(2)
+        expect(items).to_be_empty()
+        expect(remaining).to_equal(0)
+
+    def test_claim_next_jobs_skips_leased_jobs(self):
+        self.sync_cache.redis.delete('next-job-bucket')
+        self.sync_cache.redis.delete('next-job-leases')
+
+        item = dumps({'page': '1', 'url': 'http://g1.com'})
+        self.sync_cache.redis.zadd('next-job-leases', time.time() + 30, item)
+        self.sync_cache.redis.zadd('next-job-bucket', 1, item)
+
+        items, remaining = self.sync_cache.claim_next_jobs(1, lease=30)
+        expect(items).to_be_empty()
+        expect(remaining).to_equal(0)
+
+    def test_can_extend_and_release_job_lease(self):
+        self.sync_cache.redis.delete('next-job-bucket')
+        self.sync_cache.redis.delete('next-job-leases')
+        self.sync_cache.redis.delete('next-job-lease-owners')
+
+        item = dumps({'page': '1', 'url': 'http://g1.com'})
+        expect(self.sync_cache.extend_job_lease(item, 30, 'owner')).to_be_false()
+
+        self.sync_cache.redis.zadd('next-job-bucket', 1, item)
+        self.sync_cache.claim_next_jobs(1, lease=1, token='owner')
+
+        expect(self.sync_cache.extend_job_lease(item, 30, 'owner')).to_be_true()
+        expect(self.sync_cache.redis.zscore('next-job-leases', item)).to_be_greater_than(time.time() + 20)
+
+        self.sync_cache.release_job_lease(item, 'owner')
+        expect(self.sync_cache.redis.zcard('next-job-leases')).to_equal(0)
+        expect(self.sync_cache.redis.hlen('next-job-lease-owners')).to_equal(0)
+
+    def test_only_the_lease_owner_extends_or_releases_it(self):
+        self.sync_cache.redis.delete('next-job-bucket')
+        self.sync_cache.redis.delete('next-job-leases')
+        self.sync_cache.redis.delete('next-job-lease-owners')
+
+        item = dumps({'page': '1', 'url': 'http://g1.com'})
+        self.sync_cache.redis.zadd('next-job-bucket', 1, item)
+
+        # the lease of the first claim expired and the job was claimed again
+        self.sync_cache.claim_next_jobs(1, lease=-1, token='first')
+        self.sync_cache.requeue_expired_jobs()
+        self.sync_cache.claim_next_jobs(1, lease=30, token='second')
+
+        expect(self.sync_cache.extend_job_lease(item, 30, 'first')).to_be_false()
+        expect(self.sync_cache.release_job_lease(item, 'first')).to_be_false()
+        expect(self.sync_cache.redis.zcard('next-job-leases')).to_equal(1)
+
+        expect(self.sync_cache.extend_job_lease(item, 30, 'second')).to_be_true()
+        expect(self.sync_cache.release_job_lease(item, 'second')).to_be_true()
+
+    def test_can_requeue_expired_jobs(self):
+        self.sync_cache.redis.delete('next-job-bucket')
+        self.sync_cache.redis.delete('next-job-leases')
+
+        expired = dumps({'page': '1', 'url': 'http://g1.com'})
+        leased = dumps({'page': '2', 'url': 'http://g2.com'})
+        self.sync_cache.redis.zadd('next-job-bucket', time.time(), dumps({'page': '3', 'url': 'http://g3.com'}))
+        self.sync_cache.redis.zadd('next-job-leases', time.time() - 1, expired)
+        self.sync_cache.redis.zadd('next-job-leases', time.time() + 30, leased)
+
+        expect(self.sync_cache.requeue_expired_jobs()).to_equal(1)
+
+        expect(self.sync_cache.redis.zrange('next-job-leases', 0, -1)).to_equal([leased])
+        expect(self.sync_cache.redis.zrange('next-job-bucket', 0, 0)).to_equal([expired])
+        expect(self.sync_cache.redis.hexists('next-job-lease-owners', expired)).to_be_false()
+
+    def test_set_request_with_status_code_304(self):
+        test_url = 'http://g.com/test.html'
+        self.sync_cache.redis.delete('urls-%s' % test_url)
+
+        self.sync_cache.set_request(
+            url=test_url,
+            status_code=304,
+            headers={},
+            cookies=None,
+            text='',
+            effective_url=test_url,
+            error=None,
+            request_time=1,
+            expiration=5
+        )
+
+        url, response = self.sync_cache.get_request(test_url)
+        expect(response).to_be_null()
+
+    def test_can_increment_review_dedup_count(self):
+        self.sync_cache.redis.delete('review-dedup-hits', 'review-dedup-misses')
+
+        self.sync_cache.increment_review_dedup_count(True)
+        self.sync_cache.increment_review_dedup_count(True)
+        self.sync_cache.increment_review_dedup_count(False)
+
+        expect(self.sync_cache.redis.get('review-dedup-hits')).to_equal('2')
+        expect(self.sync_cache.redis.get('review-dedup-misses')).to_equal('1')
+
+    def test_can_set_domains_violations_prefs(self):
+        self.sync_cache.redis.delete('violations-prefs-globo.com')
+
+        self.sync_cache.set_domains_violations_prefs({
+            'globo.com': [{'key': 'page.title.size', 'value': 70}]
+        })
+
+        prefs = self.sync_cache.redis.get('violations-prefs-globo.com')
+        expect(loads(prefs)).to_equal([{'key': 'page.title.size', 'value': 70}])
+
+    def test_can_set_and_get_definitions_fingerprint(self):
+        self.sync_cache.redis.delete('definitions-fingerprint')
+
+        expect(self.sync_cache.get_definitions_fingerprint()).to_be_null()
+
+        self.sync_cache.set_definitions_fingerprint('abc')
+
+        expect(self.sync_cache.get_definitions_fingerprint()).to_equal('abc')
+
+    def test_can_set_and_get_url_validators(self):
+        test_url = 'http://g.com/test.html'
+        self.sync_cache.redis.delete('validators-%s' % test_url)
+
+        expect(self.sync_cache.get_url_validators(test_url)).to_be_null()
+
+        self.sync_cache.set_url_validators(test_url, {'Content-Type': 'text/html'}, 10)
+        expect(self.sync_cache.get_url_validators(test_url)).to_be_null()
+
+        self.sync_cache.set_url_validators(test_url, {
+            'ETag': '"abc"',
+            'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'
+        }, 10)
+
+        expect(self.sync_cache.get_url_validators(test_url)).to_be_like({
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'
+        })
+
+    def test_can_set_and_get_resource_metadata(self):
+        test_url = 'http://g.com/a.css'
+        self.sync_cache.redis.delete('resource-%s' % test_url)
+
+        expect(self.sync_cache.get_resource_metadata(test_url)).to_be_null()
+
+        self.sync_cache.set_resource_metadata(
+            test_url, 200, test_url, ResponseSizes(2048, 512),
+            {'If-None-Match': '"abc"'}, 60, 120
+        )
+
+        metadata = self.sync_cache.get_resource_metadata(test_url)
+        expect(metadata['status_code']).to_equal(200)
+        expect(metadata['size']).to_equal(2048)
+        expect(metadata['gzipped_size']).to_equal(512)
+        expect(metadata['validators']).to_equal({'If-None-Match': '"abc"'})
+        expect(metadata['fresh_until']).to_be_greater_than(time.time())
+        expect(self.sync_cache.redis.ttl('resource-%s' % test_url)).to_be_greater_than(60)
+
+    def test_can_set_and_get_link_statuses(self):
+        self.sync_cache.redis.delete('link-http://g.com/a', 'link-http://g.com/b')
+
+        expect(self.sync_cache.get_link_statuses([])).to_equal({})
+
+        self.sync_cache.set_link_status('http://g.com/a', 301, 'http://g.com/c', 10)
+
+        statuses = self.sync_cache.get_link_statuses(['http://g.com/a', 'http://g.com/b'])
+        expect(statuses).to_be_like({
+            'http://g.com/a': {'status_code': 301, 'effective_url': 'http://g.com/c'}
+        })
+        expect(self.sync_cache.redis.ttl('link-http://g.com/a')).to_be_greater_than(0)
+
+    def get_known_pages_cache(self):
+        cache = SyncCache(self.db, self.sync_cache.redis, Config(
+            KNOWN_PAGES_FILTER_SIZE_IN_BITS=1024,
+            KNOWN_PAGES_FILTER_HASHES=3
+        ))
+        cache.redis.delete('known-pages', 'known-pages-building')
+
+        return cache
+
+    def test_can_add_and_get_known_pages(self):
+        cache = self.get_known_pages_cache()
+        known_hash = Page.get_url_hash('http://g.com/a')
+        unknown_hash = Page.get_url_hash('http://g.com/b')
+
+        expect(cache.has_known_pages()).to_be_false()
+
+        cache.add_known_pages([known_hash])
+
+        expect(cache.has_known_pages()).to_be_true()
+        expect(cache.get_known_pages([known_hash, unknown_hash])).to_equal([True, False])
+
+    def test_can_build_known_pages(self):
+        cache = self.get_known_pages_cache()
+        url_hashes = [Page.get_url_hash('http://g.com/%d' % index) for index in range(5)]
+
+        expect(cache.build_known_pages(iter(url_hashes), 10, batch_size=2)).to_be_true()
+
+        expect(cache.get_known_pages(url_hashes)).to_equal([True] * 5)
+        expect(cache.redis.exists('known-pages-building')).to_be_false()
+
+    def test_build_known_pages_without_pages_creates_empty_filter(self):
+        cache = self.get_known_pages_cache()
+
+        cache.build_known_pages(iter([]), 10)
+
+        expect(cache.has_known_pages()).to_be_true()
+        expect(cache.get_known_pages([Page.get_url_hash('http://g.com/a')])).to_equal([False])
+
+    def test_can_set_and_get_sitemap(self):
+        self.sync_cache.redis.delete('sitemaps-g.com')
+
+        expect(self.sync_cache.get_sitemap('g.com', 'http://g.com/sitemap.xml')).to_be_null()
+
+        self.sync_cache.set_sitemap('g.com', 'http://g.com/sitemap.xml', {
+            'size': 10,
+            'urls_count': 2
+        }, 10)
+
+        expect(self.sync_cache.get_sitemap('g.com', 'http://g.com/sitemap.xml')).to_be_like({
+            'size': 10,
+            'urls_count': 2
+        })
+        expect(self.sync_cache.redis.ttl('sitemaps-g.com')).to_be_greater_than(0)
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from gzip import GzipFile
+from cStringIO import StringIO
+from unittest import TestCase
+
+from mock import Mock
+from preggy import expect
+from ujson import dumps
+
+from holmes.codec import JsonCodec, RAW, ZLIB
+
+
+def gzipped(value):
+    out = StringIO()
+    with GzipFile(mode='w', fileobj=out) as f:
+        f.write(dumps(value))
+    return out.getvalue()
+
+
+class TestJsonCodec(TestCase):
+    def test_small_values_are_stored_raw(self):
+        codec = JsonCodec(min_size=64)
+
+        value = codec.encode({'a': 1})
+
+        expect(value).to_equal(RAW + '{"a":1}')
+        expect(codec.decode(value)).to_equal({'a': 1})
+
+    def test_large_values_are_compressed(self):
+        codec = JsonCodec(min_size=64)
+        data = ['http://www.globo.com/%d' % i for i in range(100)]
+
+        value = codec.encode(data)
+
+        expect(value[0]).to_equal(ZLIB)
+        expect(len(value)).to_be_lesser_than(len(dumps(data)))
+        expect(codec.decode(value)).to_equal(data)
+
+    def test_can_decode_legacy_gzip_values(self):
+        codec = JsonCodec()
+        value = gzipped({'a': 1})
+
+        expect(codec.is_legacy(value)).to_be_true()
+        expect(codec.decode(value)).to_equal({'a': 1})
+
+    def test_decode_empty_value(self):
+        expect(JsonCodec().decode(None)).to_equal('')
+
+    def test_decode_unknown_format_fails(self):
+        with expect.error_to_happen(ValueError):
+            JsonCodec().decode('\x7f{}')
+
+    def test_recode(self):
+        codec = JsonCodec()
+
+        expect(codec.recode(gzipped({'a': 1}))).to_equal(RAW + '{"a":1}')
+        expect(codec.recode(RAW + '{"a":1}')).to_be_null()
+
+    def test_configure(self):
+        codec = JsonCodec()
+
+        codec.configure(Mock(JSON_COMPRESSION_LEVEL=9, JSON_COMPRESSION_MIN_SIZE=128))
+
+        expect(codec.level).to_equal(9)
+        expect(codec.min_size).to_equal(128)
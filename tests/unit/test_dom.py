@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+import lxml.html
+from preggy import expect
+
+from holmes.dom import ElementIndex, get_compiled_selector
+
+
+HTML = '''<html>
+<head><title>Test</title><link href="a.css" rel="stylesheet"><link rel="icon"></head>
+<body>
+<!-- comment -->
+<h2>second</h2>
+<h1>first</h1>
+<a href="/a">a</a><a name="anchor">b</a>
+<img src="a.png"><script src="a.js"></script><script>var a;</script>
+</body>
+</html>'''
+
+
+class TestElementIndex(TestCase):
+    def get_index(self):
+        return ElementIndex(lxml.html.fromstring(HTML))
+
+    def test_can_select_by_tag(self):
+        index = self.get_index()
+
+        expect(index.select('title')[0].text).to_equal('Test')
+        expect(index.select('script')).to_length(2)
+        expect(index.select('video')).to_be_empty()
+
+    def test_can_select_by_tag_and_attribute(self):
+        index = self.get_index()
+
+        links = index.select('link[href]')
+        expect(links).to_length(1)
+        expect(links[0].get('href')).to_equal('a.css')
+
+        expect(index.select('a[href]')).to_length(1)
+        expect(index.select('script[src]')).to_length(1)
+        expect(index.select('img[src]')).to_length(1)
+
+    def test_selector_lists_keep_document_order(self):
+        index = self.get_index()
+
+        headings = index.select('h1, h2, h3')
+
+        expect([heading.tag for heading in headings]).to_equal(['h2', 'h1'])
+
+    def test_matches_compiled_selector(self):
+        html = lxml.html.fromstring(HTML)
+        index = ElementIndex(html)
+
+        for selector in ('a[href]', 'link[href]', 'script', 'body h1,h2,h3,h4,h5,h6'):
+            expect(index.select(selector)).to_equal(
+                get_compiled_selector(selector)(html)
+            )
+
+    def test_compiled_selectors_use_html_rules(self):
+        html = lxml.html.fromstring(HTML)
+
+        for selector in ('a:link', 'A[HREF]'):
+            expect(get_compiled_selector(selector)(html)).to_equal(html.cssselect(selector))
+
+        expect(get_compiled_selector('a:link')(html)).to_length(1)
+
+    def test_selected_lists_are_copies(self):
+        index = self.get_index()
+
+        index.select('script').pop()
+
+        expect(index.select('script')).to_length(2)
+
+    def test_empty_index(self):
+        index = ElementIndex(None)
+
+        expect(index.select('a[href]')).to_be_empty()
+        expect(index.select('body h1')).to_be_empty()
+
+    def test_selectors_are_compiled_once(self):
+        expect(get_compiled_selector('body h1')).to_equal(get_compiled_selector('body h1'))
@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+from preggy import expect
+
+from holmes.metrics import Metrics, render_metrics
+
+
+class TestMetrics(TestCase):
+    def test_can_increment_counters(self):
+        metrics = Metrics()
+
+        metrics.increment('holmes_jobs_total', status='completed')
+        metrics.increment('holmes_jobs_total', 2, status='completed')
+        metrics.increment('holmes_jobs_total', status='expired')
+
+        expect(metrics.to_dict()['counters']).to_be_like([
+            {'name': 'holmes_jobs_total', 'labels': {'status': 'completed'}, 'value': 3},
+            {'name': 'holmes_jobs_total', 'labels': {'status': 'expired'}, 'value': 1},
+        ])
+
+    def test_can_observe_histograms(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+
+        metrics.observe('holmes_fetch_seconds', 0.05)
+        metrics.observe('holmes_fetch_seconds', 0.5)
+        metrics.observe('holmes_fetch_seconds', 5)
+
+        expect(metrics.to_dict()['histograms']).to_be_like([{
+            'name': 'holmes_fetch_seconds',
+            'labels': {},
+            'buckets': [0.1, 1.0],
+            'counts': [1, 2],
+            'sum': 5.55,
+            'count': 3
+        }])
+
+    def test_timer_observes_elapsed_time(self):
+        metrics = Metrics()
+
+        with metrics.timer('holmes_facter_seconds', facter='TitleFacter'):
+            pass
+
+        histogram = metrics.to_dict()['histograms'][0]
+        expect(histogram['labels']).to_equal({'facter': 'TitleFacter'})
+        expect(histogram['count']).to_equal(1)
+
+    def test_can_render_metrics_by_worker(self):
+        metrics = Metrics(buckets=(1.0,))
+        metrics.increment('holmes_jobs_total', status='completed')
+        metrics.observe('holmes_fetch_seconds', 0.5)
+
+        text = render_metrics({'w1': metrics.to_dict()})
+
+        expect(text).to_equal(
+            '# TYPE holmes_fetch_seconds histogram\n'
+            'holmes_fetch_seconds_bucket{le="1.0",worker="w1"} 1\n'
+            'holmes_fetch_seconds_bucket{le="+Inf",worker="w1"} 1\n'
+            'holmes_fetch_seconds_sum{worker="w1"} 0.5\n'
+            'holmes_fetch_seconds_count{worker="w1"} 1\n'
+            '# TYPE holmes_jobs_total counter\n'
+            'holmes_jobs_total{status="completed",worker="w1"} 1\n'
+        )
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from os.path import abspath, dirname, join
+from unittest import TestCase
+
+from preggy import expect
+
+from holmes.offload import (
+    get_gzipped_size, is_encoded_url, parse_sitemap, SizeCounter
+)
+
+
+FILES_ROOT_PATH = abspath(join(dirname(__file__), 'files'))
+
+
+class TestOffload(TestCase):
+    def get_file(self, name):
+        with open(join(FILES_ROOT_PATH, name), 'r') as local_file:
+            return local_file.read()
+
+    def test_can_get_gzipped_size(self):
+        expect(get_gzipped_size('a' * 1000)).to_be_lesser_than(1000)
+
+    def test_gzipped_size_of_unicode_is_the_one_of_utf8(self):
+        content = u'ação ' * 100
+
+        expect(get_gzipped_size(content)).to_equal(get_gzipped_size(content.encode('utf-8')))
+        expect(get_gzipped_size('a' * 1000)).to_equal(len(('a' * 1000).encode('zlib')) + 12)
+
+    def test_can_parse_sitemap_index(self):
+        sitemap = parse_sitemap(self.get_file('index_sitemap.xml'))
+
+        expect(sitemap['size']).to_equal(267)
+        expect(sitemap['gzipped_size']).to_equal(162)
+        expect(sitemap['sitemaps']).to_equal([
+            'http://domain.com/1.xml', 'http://domain.com/2.xml'
+        ])
+        expect(sitemap['urls']).to_be_empty()
+
+    def test_can_parse_gzipped_sitemap(self):
+        sitemap = parse_sitemap(self.get_file('index_sitemap.xml.gz'))
+
+        expect(sitemap['size']).to_equal(267)
+        expect(sitemap['sitemaps']).to_length(2)
+
+    def test_can_parse_sitemap_urls(self):
+        sitemap = parse_sitemap(self.get_file('url_sitemap.xml'))
+
+        expect(sitemap['sitemaps']).to_be_empty()
+        expect(sitemap['urls']).to_equal([
+            'http://domain.com/1.html', 'http://domain.com/2.html'
+        ])
+        expect(sitemap['urls_count']).to_equal(2)
+        expect(sitemap['not_encoded']).to_equal(0)
+
+    def test_parse_sitemap_keeps_at_most_max_urls(self):
+        sitemap = parse_sitemap(self.get_file('url_sitemap.xml'), max_urls=1)
+
+        expect(sitemap['urls']).to_equal(['http://domain.com/1.html'])
+        expect(sitemap['urls_count']).to_equal(2)
+        expect(sitemap['size']).to_equal(304)
+
+    def test_can_parse_broken_sitemap(self):
+        sitemap = parse_sitemap('<urlset><url><loc>http://domain.com/1.html</loc></url><url>')
+
+        expect(sitemap['urls']).to_equal(['http://domain.com/1.html'])
+        expect(sitemap['size']).to_equal(59)
+
+    def test_size_counter_matches_gzipped_size(self):
+        content = self.get_file('url_sitemap.xml')
+
+        counter = SizeCounter()
+        for index in range(0, len(content), 10):
+            counter.write(content[index:index + 10])
+
+        sizes = counter.finish()
+        expect(sizes.size).to_equal(len(content))
+        expect(sizes.gzipped_size).to_equal(get_gzipped_size(content))
+
+    def test_can_check_if_url_is_encoded(self):
+        expect(is_encoded_url('not an url')).to_be_null()
+        expect(is_encoded_url('http://domain.com/a.html')).to_be_true()
+        expect(is_encoded_url('http://domain.com/a.html?a=1&amp;b=2')).to_be_true()
+        expect(is_encoded_url('http://domain.com/a.html?a=1&b=2')).to_be_false()
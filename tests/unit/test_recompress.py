@@ -0,0 +1,38 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from os.path import abspath, dirname, join
+
+from mock import Mock, patch
+from preggy import expect
+
+from holmes.recompress import RecompressWorker
+from tests.unit.base import ApiTestCase
+
+
+class TestRecompressWorker(ApiTestCase):
+    root_path = abspath(join(dirname(__file__), '..', '..'))
+
+    def get_worker(self):
+        worker = RecompressWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.db = Mock()
+        worker.last_ids = {'facts': 0, 'violations': 0}
+        return worker
+
+    def test_walks_each_table_until_no_rows_are_left(self):
+        worker = self.get_worker()
+        worker.db.execute.return_value.fetchall.return_value = []
+
+        worker.do_work()
+
+        expect(worker.last_ids).to_equal({'facts': None, 'violations': None})
+
+    @patch('holmes.recompress.time.sleep')
+    def test_sleeps_once_all_tables_were_walked(self, sleep_mock):
+        worker = self.get_worker()
+        worker.last_ids = {'facts': None, 'violations': None}
+
+        worker.do_work()
+
+        expect(worker.db.execute.called).to_be_false()
+        sleep_mock.assert_called_once_with(worker.config.RECOMPRESS_IDLE_INTERVAL_IN_SECONDS)
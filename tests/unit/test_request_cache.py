@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import Mock
+from preggy import expect
+
+from holmes.metrics import Metrics
+from holmes.request_cache import MemoryTier, DiskTier, RedisTier, TieredCache
+
+
+class TestMemoryTier(TestCase):
+    def test_can_get_and_set(self):
+        tier = MemoryTier(100)
+
+        expect(tier.get('a')).to_be_null()
+
+        tier.set('a', 'value', 10)
+        value, ttl = tier.get('a')
+
+        expect(value).to_equal('value')
+        expect(ttl).to_be_greater_than(9)
+        expect(tier.get_counters()).to_equal({'hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_expired_values_are_missed(self):
+        tier = MemoryTier(100)
+
+        tier.set('a', 'value', -1)
+
+        expect(tier.get('a')).to_be_null()
+        expect(tier.size).to_equal(0)
+
+    def test_evicts_least_recently_used(self):
+        metrics = Metrics()
+        tier = MemoryTier(10, metrics)
+
+        tier.set('a', 'aaaa', 10)
+        tier.set('b', 'bbbb', 10)
+        tier.get('a')
+        tier.set('c', 'cccc', 10)
+
+        expect(tier.get('b')).to_be_null()
+        expect(tier.get('a')).not_to_be_null()
+        expect(tier.get('c')).not_to_be_null()
+        expect(tier.evictions).to_equal(1)
+        expect(metrics.counters[('holmes_request_cache_total', (('result', 'evictions'), ('tier', 'memory')))]).to_equal(1)
+
+
+class TestDiskTier(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_can_get_and_set(self):
+        tier = DiskTier(self.path, 100, 10)
+
+        tier.set('a', 'aaaa', 10)
+        tier.set('b', 'bbbb', 10)
+
+        expect(tier.get('a')[0]).to_equal('aaaa')
+        expect(tier.get('b')[0]).to_equal('bbbb')
+        expect(tier.get('c')).to_be_null()
+
+    def test_drops_oldest_segment_when_full(self):
+        tier = DiskTier(self.path, 12, 8)
+
+        tier.set('a', 'aaaa', 10)
+        tier.set('b', 'bbbb', 10)
+        tier.set('c', 'cccc', 10)
+        tier.set('d', 'dddd', 10)
+
+        expect(tier.get('a')).to_be_null()
+        expect(tier.get('b')).to_be_null()
+        expect(tier.get('d')[0]).to_equal('dddd')
+        expect(tier.evictions).to_equal(2)
+        expect(os.listdir(tier.path)).to_length(1)
+
+    def test_close_removes_segments(self):
+        tier = DiskTier(self.path, 100, 10)
+        tier.set('a', 'aaaa', 10)
+
+        tier.close()
+
+        expect(os.path.exists(tier.path)).to_be_false()
+
+
+class TestTieredCache(TestCase):
+    def test_fills_tiers_that_missed(self):
+        redis = Mock()
+        redis.pipeline.return_value.execute.return_value = ['value', 30]
+
+        memory = MemoryTier(100)
+        cache = TieredCache([memory, RedisTier(redis)])
+
+        expect(cache.get('a')).to_equal('value')
+        expect(memory.get('a')[0]).to_equal('value')
+
+        expect(cache.get('a')).to_equal('value')
+        expect(redis.pipeline.call_count).to_equal(1)
+
+        expect(cache.get_counters()).to_equal({
+            'memory': {'hits': 2, 'misses': 1, 'evictions': 0},
+            'redis': {'hits': 1, 'misses': 0, 'evictions': 0},
+        })
+
+    def test_set_writes_every_tier(self):
+        redis = Mock()
+
+        memory = MemoryTier(100)
+        cache = TieredCache([memory, RedisTier(redis)])
+
+        cache.set('a', 'value', 30)
+
+        expect(memory.get('a')[0]).to_equal('value')
+        redis.setex.assert_called_once_with('urls-a', 30, 'value')
@@ -9,9 +9,10 @@ from preggy import expect
 from mock import patch, Mock, call
 
 from holmes.reviewer import Reviewer, ReviewDAO
-from holmes.models import Page, Domain, Key, DomainsViolationsPrefs
+from holmes.models import Page, Domain, Key, DomainsViolationsPrefs, Limiter
 from holmes.config import Config
 from holmes.validators.base import Validator
+from holmes.facters import Facter
 from tests.unit.base import ApiTestCase
 from tests.fixtures import (
     DomainFactory, PageFactory, DomainsViolationsPrefsFactory
@@ -161,7 +162,160 @@ class TestReview(ApiTestCase):
         mock_callback = Mock()
 
         reviewer.load_content(mock_callback)
-        get_mock.assert_called_once_with(page_url, mock_callback)
+        get_mock.assert_called_once_with(page_url, mock_callback, conditional=True)
+
+    @patch('holmes.models.Review.renew_last_review')
+    def test_not_modified_content_renews_last_review(self, renew_mock):
+        renew_mock.return_value = True
+
+        reviewer = self.get_reviewer()
+        reviewer.run_facters = Mock()
+        reviewer._async_get = Mock()
+        callback = Mock()
+        reviewer.review_done_callback = callback
+
+        reviewer.content_loaded('http://page.url', Mock(status_code=304, text='', headers={}))
+
+        expect(renew_mock.called).to_be_true()
+        expect(reviewer.run_facters.called).to_be_false()
+        expect(reviewer._async_get.called).to_be_false()
+        callback.assert_called_once_with(reviewer)
+
+    @patch('holmes.models.Review.renew_last_review')
+    def test_not_modified_content_without_last_review_is_reloaded(self, renew_mock):
+        renew_mock.return_value = False
+
+        reviewer = self.get_reviewer()
+        reviewer._async_get = Mock()
+
+        reviewer.content_loaded('http://page.url', Mock(status_code=304, text='', headers={}))
+
+        reviewer._async_get.assert_called_once_with('http://page.url', reviewer.content_loaded)
+
+    def test_run_facters_records_timings(self):
+        class MockFacter(Facter):
+            def get_facts(self):
+                pass
+
+        reviewer = self.get_reviewer()
+        reviewer.facters = [MockFacter]
+
+        reviewer.run_facters()
+
+        histograms = reviewer.metrics.to_dict()['histograms']
+        expect(histograms).to_length(1)
+        expect(histograms[0]['name']).to_equal('holmes_facter_seconds')
+        expect(histograms[0]['labels']).to_equal({'facter': 'MockFacter'})
+
+    def test_run_in_pool_without_pool_runs_inline(self):
+        reviewer = self.get_reviewer()
+        callback = Mock()
+
+        reviewer.run_in_pool(len, ('abc',), callback)
+
+        callback.assert_called_once_with(3)
+        expect(reviewer.pending_requests).to_equal(0)
+
+    def test_run_in_pool_waits_for_the_task(self):
+        reviewer = self.get_reviewer()
+        reviewer.concurrent = True
+        reviewer.pool = Mock()
+        result = reviewer.pool.apply_async.return_value
+        result.ready.return_value = False
+        result.get.return_value = 3
+        callback = Mock()
+        done = Mock()
+
+        reviewer.run_in_pool(len, ('abc',), callback)
+        reviewer.when_requests_done(done)
+
+        expect(reviewer.pending_requests).to_equal(1)
+        reviewer.pool.apply_async.assert_called_once_with(len, ('abc',))
+
+        reviewer.run_finished_tasks()
+        expect(callback.called).to_be_false()
+
+        result.ready.return_value = True
+        reviewer.run_finished_tasks()
+
+        callback.assert_called_once_with(3)
+        expect(reviewer.pending_requests).to_equal(0)
+        expect(reviewer.pending_tasks).to_be_empty()
+        expect(done.called).to_be_true()
+
+    def test_check_links_counts_a_request_for_each_url(self):
+        reviewer = self.get_reviewer()
+        reviewer.check_links_func = Mock()
+        handler = Mock()
+        done = Mock()
+
+        reviewer._check_links(['http://a.com', 'http://b.com'], handler)
+        reviewer.when_requests_done(done)
+
+        expect(reviewer.pending_requests).to_equal(2)
+
+        urls, links_handler = reviewer.check_links_func.call_args[0]
+        expect(urls).to_equal(['http://a.com', 'http://b.com'])
+
+        links_handler('http://a.com', Mock(from_cache=True))
+        expect(done.called).to_be_false()
+
+        links_handler('http://b.com', Mock(from_cache=True))
+        expect(handler.call_count).to_equal(2)
+        expect(reviewer.pending_requests).to_equal(0)
+        expect(done.called).to_be_true()
+
+    def test_check_links_falls_back_to_async_get(self):
+        reviewer = self.get_reviewer()
+        reviewer._async_get = Mock()
+        handler = Mock()
+
+        reviewer._check_links(['http://a.com'], handler)
+
+        reviewer._async_get.assert_called_once_with('http://a.com', handler, plugin=None)
+
+    def test_content_hash_ignores_whitespace(self):
+        reviewer = self.get_reviewer()
+
+        content_hash = reviewer.get_content_hash('<html>\n  <body>a</body></html>')
+
+        expect(content_hash).to_length(40)
+        expect(reviewer.get_content_hash(u'<html> <body>a</body></html>')).to_equal(content_hash)
+        expect(reviewer.get_content_hash('<html><body>b</body></html>')).not_to_equal(content_hash)
+
+    @patch('holmes.models.Review.renew_last_review')
+    def test_unchanged_content_reuses_last_review(self, renew_mock):
+        renew_mock.return_value = True
+
+        cache = Mock()
+        reviewer = self.get_reviewer(cache=cache)
+        reviewer.deduplicate = True
+        reviewer.run_facters = Mock()
+        callback = Mock()
+        reviewer.review_done_callback = callback
+
+        reviewer.content_loaded('http://page.url', Mock(status_code=200, text='<html></html>', headers={}))
+
+        data = renew_mock.call_args[0][1]
+        expect(data['contentHash']).to_equal(reviewer.get_content_hash('<html></html>'))
+        expect(reviewer.run_facters.called).to_be_false()
+        cache.increment_review_dedup_count.assert_called_once_with(True)
+        callback.assert_called_once_with(reviewer)
+
+    @patch('holmes.models.Review.renew_last_review')
+    def test_changed_content_is_fully_reviewed(self, renew_mock):
+        renew_mock.return_value = False
+
+        cache = Mock()
+        reviewer = self.get_reviewer(cache=cache)
+        reviewer.deduplicate = True
+        reviewer.run_facters = Mock()
+        reviewer.when_requests_done = Mock()
+
+        reviewer.content_loaded('http://page.url', Mock(status_code=200, text='<html></html>', headers={}))
+
+        expect(reviewer.run_facters.called).to_be_true()
+        cache.increment_review_dedup_count.assert_called_once_with(False)
 
     def test_review_calls_validators(self):
         test_class = {}
@@ -192,6 +346,158 @@ class TestReview(ApiTestCase):
         reviewer._wait_for_async_requests.assert_called_once_with(1)
         expect(test_class['has_validated']).to_be_true()
 
+    def test_concurrent_review_runs_stages_when_its_requests_are_done(self):
+        test_class = {'loaded': []}
+
+        class MockValidator(Validator):
+            def validate(self):
+                self.async_get('http://www.google.com/a.png', self.handle)
+
+            def handle(self, url, response):
+                test_class['loaded'].append(url)
+
+        page_url = 'http://www.google.com'
+        reviewer = self.get_reviewer(page_url=page_url, validators=[MockValidator])
+        reviewer.concurrent = True
+        reviewer._wait_for_async_requests = Mock()
+        reviewer.save_review = Mock()
+
+        handlers = []
+        reviewer.async_get_func = lambda url, handler, method, **kw: handlers.append((url, handler))
+
+        callback = Mock()
+        reviewer.review(callback)
+
+        expect(handlers).to_length(1)
+        url, handler = handlers.pop()
+        handler(url, Mock(
+            status_code=200,
+            text='<html><head></head><body></body></html>',
+            headers={},
+            from_cache=True
+        ))
+
+        expect(handlers).to_length(1)
+        expect(reviewer.save_review.called).to_be_false()
+        expect(callback.called).to_be_false()
+
+        url, handler = handlers.pop()
+        handler(url, Mock(status_code=200, text='', from_cache=True))
+
+        expect(test_class['loaded']).to_equal(['http://www.google.com/a.png'])
+        expect(reviewer.pending_requests).to_equal(0)
+        reviewer.save_review.assert_called_once_with()
+        callback.assert_called_once_with(reviewer)
+        expect(reviewer._wait_for_async_requests.called).to_be_false()
+
+    def test_concurrent_review_runs_validators_when_their_facters_are_done(self):
+        test_class = {'validated': []}
+
+        class SlowFacter(Facter):
+            produces = ('page.slow',)
+
+            @classmethod
+            def get_fact_definitions(cls):
+                return {}
+
+            def get_facts(self):
+                self.async_get('http://www.google.com/a.png', self.handle)
+
+            def handle(self, url, response):
+                self.review.data['page.slow'] = url
+
+        class SlowValidator(Validator):
+            consumes = ('page.slow',)
+
+            def validate(self):
+                test_class['validated'].append(self.review.data['page.slow'])
+
+        class IndependentValidator(Validator):
+            consumes = ()
+
+            def validate(self):
+                test_class['validated'].append('independent')
+
+        page_url = 'http://www.google.com'
+        reviewer = self.get_reviewer(
+            page_url=page_url, validators=[SlowValidator, IndependentValidator]
+        )
+        reviewer.facters = [SlowFacter]
+        reviewer.concurrent = True
+        reviewer.save_review = Mock()
+
+        handlers = []
+        reviewer.async_get_func = lambda url, handler, method, **kw: handlers.append((url, handler))
+
+        reviewer.review()
+
+        url, handler = handlers.pop()
+        handler(url, Mock(
+            status_code=200,
+            text='<html><head></head><body></body></html>',
+            headers={},
+            from_cache=True
+        ))
+
+        expect(test_class['validated']).to_equal(['independent'])
+        expect(reviewer.running_facters).to_length(1)
+
+        url, handler = handlers.pop()
+        handler(url, Mock(status_code=200, text='', from_cache=True))
+
+        expect(test_class['validated']).to_equal([
+            'independent', 'http://www.google.com/a.png'
+        ])
+        expect(reviewer.running_facters).to_be_empty()
+        reviewer.save_review.assert_called_once_with()
+
+    def test_facters_run_even_if_no_validator_uses_them(self):
+        test_class = {'facts': []}
+
+        class UnusedFacter(Facter):
+            produces = ('page.unused',)
+
+            def get_facts(self):
+                test_class['facts'].append('unused')
+
+        class UsedFacter(UnusedFacter):
+            produces = ('page.used',)
+
+            def get_facts(self):
+                test_class['facts'].append('used')
+
+        class UsedValidator(Validator):
+            consumes = ('page.used',)
+
+        reviewer = self.get_reviewer(validators=[UsedValidator])
+        reviewer.facters = [UnusedFacter, UsedFacter]
+
+        reviewer.run_facters()
+
+        expect(test_class['facts']).to_equal(['unused', 'used'])
+
+    def test_plugin_callback_waits_for_its_own_requests(self):
+        reviewer = self.get_reviewer()
+        reviewer.pending_requests = 1
+
+        handlers = []
+        reviewer.async_get_func = lambda url, handler, method, **kw: handlers.append((url, handler))
+
+        validator = Validator(reviewer)
+        callback = Mock()
+
+        validator.async_get('http://www.google.com/a.png', Mock())
+        validator.when_requests_done(callback)
+
+        expect(callback.called).to_be_false()
+
+        url, handler = handlers.pop()
+        handler(url, Mock(status_code=200, text='', from_cache=True))
+
+        callback.assert_called_once_with()
+        expect(validator.pending_requests).to_equal(0)
+        expect(reviewer.pending_requests).to_equal(1)
+
     @patch.object(ReviewDAO, 'add_fact')
     def test_reviewer_add_fact(self, fact_dao):
         with patch.object(requests, 'post') as post_mock:
@@ -227,8 +533,66 @@ class TestReview(ApiTestCase):
         expect(response).not_to_be_null()
         expect(response).to_equal('test')
 
-    @patch.object(Page, 'add_page')
-    def test_enqueue(self, add_page_mock):
+    def test_unit_of_work_only_undoes_its_own_writes(self):
+        reviewer = self.get_reviewer(db=Mock())
+        reviewer.concurrent = True
+
+        with reviewer.unit_of_work():
+            pass
+
+        reviewer.db.begin_nested.return_value.commit.assert_called_once_with()
+
+        with expect.error_to_happen(ValueError):
+            with reviewer.unit_of_work():
+                raise ValueError('failed')
+
+        reviewer.db.begin_nested.return_value.rollback.assert_called_once_with()
+        expect(reviewer.db.rollback.called).to_be_false()
+
+    def test_add_pages_of_a_new_domain_keeps_the_savepoint(self):
+        reviewer = self.get_reviewer(db=self.db, cache=Mock())
+        reviewer.concurrent = True
+        reviewer.girl = Mock()
+        reviewer.publish = Mock()
+
+        with patch.object(self.db, 'commit') as commit_mock:
+            reviewer.add_pages([('http://www.new-domain.com/a', 1.0)])
+
+        expect(commit_mock.called).to_be_false()
+
+        domain = self.db.query(Domain).filter(Domain.name == 'www.new-domain.com').one()
+        limiter = self.db.query(Limiter).filter(Limiter.url == domain.url).one()
+        expect(limiter.value).to_equal(reviewer.config.DEFAULT_NUMBER_OF_CONCURRENT_CONNECTIONS)
+
+        page = Page.by_url_hash(Page.get_url_hash('http://www.new-domain.com/a'), self.db)
+        expect(page.domain_id).to_equal(domain.id)
+
+    def test_dropped_review_ignores_late_responses(self):
+        reviewer = self.get_reviewer()
+        reviewer.concurrent = True
+        reviewer.pending_requests = 1
+        done_callback = Mock()
+        reviewer.requests_done_callbacks = [done_callback]
+
+        reviewer.drop()
+
+        handler = Mock()
+        reviewer.handle_async_get(handler)('http://page.url', Mock(from_cache=False))
+
+        expect(reviewer.is_done).to_be_true()
+        expect(handler.called).to_be_false()
+        expect(done_callback.called).to_be_false()
+
+    def test_unit_of_work_is_the_session_when_not_concurrent(self):
+        reviewer = self.get_reviewer(db=Mock())
+
+        with reviewer.unit_of_work():
+            pass
+
+        expect(reviewer.db.begin_nested.called).to_be_false()
+
+    @patch.object(Page, 'check_page')
+    def test_enqueue(self, check_page_mock):
         reviewer = self.get_reviewer()
         reviewer._wait_timeout = 1
         reviewer._wait_for_async_requests = Mock()
@@ -238,20 +602,110 @@ class TestReview(ApiTestCase):
 
         reviewer.enqueue([('http://www.ga.com/', 359.0)])
 
-        add_page_mock.assert_has_calls(call(
-            None,
-            None,
-            'http://www.ga.com/',
-            359.0,
-            reviewer.async_get_func,
-            None,
+        expect(check_page_mock.call_count).to_equal(1)
+        url, fetch_method, config, callback = check_page_mock.call_args[0]
+        expect(url).to_equal('http://www.ga.com/')
+        expect(fetch_method).to_equal(reviewer._async_get)
+        expect(config).to_equal(reviewer.config)
+
+        reviewer._wait_for_async_requests.assert_called_once_with(1)
+
+        fetch_method(url, Mock())
+        expect(reviewer.pending_requests).to_equal(1)
+
+    @patch.object(Page, 'add_pages')
+    @patch.object(Page, 'check_page')
+    def test_enqueue_adds_checked_pages_together(self, check_page_mock, add_pages_mock):
+        reviewer = self.get_reviewer()
+        reviewer._wait_for_async_requests = Mock()
+        reviewer.girl = Mock()
+
+        reviewer.enqueue([('http://www.ga.com/a', 1.0), ('http://www.ga.com/b', 2.0)])
+
+        first_callback = check_page_mock.call_args_list[0][0][3]
+        second_callback = check_page_mock.call_args_list[1][0][3]
+
+        first_callback((True, 'http://www.ga.com/a', None))
+        expect(add_pages_mock.called).to_be_false()
+
+        second_callback((False, 'http://www.ga.com/b', {'reason': 'redirect'}))
+
+        add_pages_mock.assert_called_once_with(
+            reviewer.db,
+            reviewer.cache,
+            [('http://www.ga.com/a', 1.0)],
+            reviewer.publish,
             reviewer.config,
             reviewer.girl,
-            reviewer.violation_definitions,
-            reviewer.handle_page_added
-        ))
+            reviewer.default_violations_values,
+            reviewer.violation_definitions
+        )
 
-        reviewer._wait_for_async_requests.assert_called_once_with(1)
+    @patch.object(Page, 'get_existing_url_hashes')
+    @patch.object(Page, 'check_page')
+    def test_enqueue_only_adds_unknown_pages(self, check_page_mock, existing_mock):
+        cache = Mock()
+        cache.has_known_pages.return_value = True
+        cache.get_known_pages.return_value = [True, True, False]
+        cache.get_link_statuses.return_value = {}
+        existing_mock.return_value = set([Page.get_url_hash('http://www.ga.com/a')])
+
+        reviewer = self.get_reviewer(cache=cache)
+        reviewer._wait_for_async_requests = Mock()
+
+        reviewer.enqueue([
+            ('http://www.ga.com/a', 1.0),
+            ('http://www.ga.com/b', 1.0),
+            ('http://www.ga.com/c', 1.0),
+        ])
+
+        existing_mock.assert_called_once_with(None, [
+            Page.get_url_hash('http://www.ga.com/a'),
+            Page.get_url_hash('http://www.ga.com/b'),
+        ])
+        cache.increment_page_scores.assert_called_once_with(['http://www.ga.com/a'])
+        expect([item[0][0] for item in check_page_mock.call_args_list]).to_equal([
+            'http://www.ga.com/b', 'http://www.ga.com/c'
+        ])
+        expect(cache.add_known_pages.call_args[0][0]).to_length(3)
+
+    @patch.object(Page, 'add_pages')
+    @patch.object(Page, 'check_page')
+    def test_enqueue_reuses_loaded_responses(self, check_page_mock, add_pages_mock):
+        cache = Mock()
+        cache.has_known_pages.return_value = False
+        cache.get_link_statuses.return_value = {
+            'http://www.ga.com/c': {'status_code': 404, 'effective_url': 'http://www.ga.com/c'}
+        }
+
+        reviewer = self.get_reviewer(cache=cache)
+        reviewer._wait_for_async_requests = Mock()
+
+        reviewer.enqueue(
+            [
+                ('http://www.ga.com/a', 1.0),
+                ('http://www.ga.com/b', 1.0),
+                ('http://www.ga.com/c', 1.0),
+                ('http://www.ga.com/d', 1.0),
+            ],
+            {
+                'http://www.ga.com/a': Mock(status_code=200, effective_url='http://www.ga.com/a'),
+                'http://www.ga.com/b': None,
+            }
+        )
+
+        cache.get_link_statuses.assert_called_once_with(['http://www.ga.com/c', 'http://www.ga.com/d'])
+        expect(check_page_mock.call_count).to_equal(1)
+        expect(check_page_mock.call_args[0][0]).to_equal('http://www.ga.com/d')
+
+        callback = check_page_mock.call_args[0][3]
+        callback((True, 'http://www.ga.com/d', None))
+
+        expect(sorted(add_pages_mock.call_args[0][2])).to_equal([
+            ('http://www.ga.com/a', 1.0),
+            ('http://www.ga.com/b', 1.0),
+            ('http://www.ga.com/d', 1.0),
+        ])
 
     def test_enqueue_when_none(self):
         reviewer = self.get_reviewer()
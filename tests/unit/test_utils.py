@@ -6,7 +6,8 @@ from unittest import TestCase
 from preggy import expect
 
 from holmes.utils import (
-    get_domain_from_url, get_class, load_classes, get_status_code_title
+    get_domain_from_url, get_class, load_classes, get_status_code_title,
+    get_definitions_fingerprint
 )
 
 
@@ -124,3 +125,18 @@ class TestUtils(TestCase):
 
         title = get_status_code_title(120)
         expect(title).to_equal('Unknown')
+
+    def test_get_definitions_fingerprint(self):
+        facts = {'total.size': {'category': 'SEO', 'key': object()}}
+        violations = {'page.title.size': {'category': 'SEO'}}
+        defaults = {'page.title.size': {'value': 70, 'description': 'Title size'}}
+
+        fingerprint = get_definitions_fingerprint(facts, violations, defaults)
+
+        expect(fingerprint).to_length(40)
+
+        facts['total.size']['key'] = object()
+        expect(get_definitions_fingerprint(facts, violations, defaults)).to_equal(fingerprint)
+
+        defaults['page.title.size']['value'] = 80
+        expect(get_definitions_fingerprint(facts, violations, defaults)).not_to_equal(fingerprint)
@@ -1,7 +1,9 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import time
 from os.path import abspath, dirname, join
+from collections import deque
 
 from preggy import expect
 from mock import patch, Mock, call
@@ -11,6 +13,9 @@ from materialgirl import Materializer
 from colorama import Fore, Style
 from holmes.worker import HolmesWorker
 from holmes.config import Config
+from holmes.metrics import Metrics
+from holmes.models import Key, DomainsViolationsPrefs
+from holmes.utils import get_definitions_fingerprint
 from tests.unit.base import ApiTestCase
 from tests.fixtures import (
     DomainsViolationsPrefsFactory, DomainFactory, KeyFactory
@@ -41,6 +46,39 @@ class WorkerTestCase(ApiTestCase):
 
         expect(worker.girl).to_be_instance_of(Materializer)
 
+    @patch.object(DomainsViolationsPrefs, 'insert_default_violations_values_for_all_domains')
+    @patch.object(Key, 'insert_keys')
+    @patch.object(Key, 'load_keys')
+    def test_sync_definitions_only_loads_keys_when_unchanged(self, load_mock, insert_mock, prefs_mock):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.db = Mock()
+        worker.cache = Mock()
+        worker.fact_definitions = {'some.fact': {}}
+        worker.violation_definitions = {'some.violation': {}}
+        worker.default_violations_values = {}
+
+        fingerprint = get_definitions_fingerprint(
+            worker.fact_definitions, worker.violation_definitions, worker.default_violations_values
+        )
+        worker.cache.get_definitions_fingerprint.return_value = fingerprint
+        load_mock.return_value = True
+
+        worker.sync_definitions()
+
+        expect(load_mock.call_count).to_equal(2)
+        expect(insert_mock.called).to_be_false()
+        expect(prefs_mock.called).to_be_false()
+        expect(worker.cache.set_definitions_fingerprint.called).to_be_false()
+
+        # a key removed from the database is written again
+        load_mock.return_value = False
+
+        worker.sync_definitions()
+
+        expect(insert_mock.call_count).to_equal(2)
+        expect(prefs_mock.call_count).to_equal(1)
+        worker.cache.set_definitions_fingerprint.assert_called_once_with(fingerprint)
+
     def test_config_parser(self):
         worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
 
@@ -120,3 +158,446 @@ class WorkerTestCase(ApiTestCase):
         # Back to the wonderland
         worker.db = bkp_db
         worker.cache.db = bkp_db
+
+    def test_load_next_job_claims_a_batch(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.config = Config(WORKER_JOBS_BATCH_SIZE=2)
+        worker.jobs = deque()
+        worker.cache = Mock()
+        worker.cache.get_next_jobs.return_value = [
+            {'page': '1', 'url': 'http://g1.com'},
+            {'page': '2', 'url': 'http://g2.com'},
+        ]
+
+        job = worker._load_next_job()
+        expect(job['url']).to_equal('http://g1.com')
+        expect(job).to_include('claimed_at')
+        expect(worker._load_next_job()['url']).to_equal('http://g2.com')
+        expect(worker.cache.get_next_jobs.call_count).to_equal(1)
+
+        worker.cache.get_next_jobs.return_value = []
+        expect(worker._load_next_job()).to_be_null()
+
+    def test_handle_review_done_completes_job_and_starts_next(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.db = Mock()
+        worker._complete_job = Mock()
+        worker._start_concurrent_reviews = Mock()
+
+        reviewer = Mock()
+        job = {'url': 'http://g1.com', 'bucket_item': 'item'}
+        worker.reviews_in_flight = {reviewer: job}
+
+        worker.handle_review_done(reviewer)
+
+        expect(worker.reviews_in_flight).to_be_empty()
+        worker._complete_job.assert_called_once_with(job)
+        expect(worker._start_concurrent_reviews.called).to_be_true()
+
+    def test_concurrent_work_waits_on_the_pool_when_octopus_is_idle(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.otto = Mock(url_queue=[], running_urls=0)
+        worker._start_concurrent_reviews = Mock()
+
+        waiting = Mock(pending_requests=1, is_done=False)
+        waiting.pending_tasks = [(Mock(ready=Mock(return_value=False)), Mock(), None)]
+        finished = Mock(pending_requests=1, is_done=False)
+        finished.pending_tasks = [
+            (Mock(ready=Mock(return_value=False)), Mock(), None),
+            (Mock(ready=Mock(return_value=True)), Mock(), None),
+        ]
+
+        def finish(block=False):
+            worker.reviews_in_flight.clear()
+        finished.run_finished_tasks.side_effect = finish
+
+        worker.reviews_in_flight = {
+            waiting: {'url': 'http://g1.com'},
+            finished: {'url': 'http://g2.com'},
+        }
+
+        with patch('holmes.worker.time.sleep') as sleep_mock:
+            worker._do_concurrent_work()
+
+        expect(worker.otto.wait.called).to_be_false()
+        # any finished task of any review ends the wait
+        expect(sleep_mock.called).to_be_false()
+
+    def test_wait_for_tasks_gives_up_after_timeout(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+
+        reviewer = Mock(pending_tasks=[(Mock(ready=Mock(return_value=False)), Mock(), None)])
+        worker.reviews_in_flight = {reviewer: {'url': 'http://g1.com'}}
+
+        with patch('holmes.worker.time.sleep') as sleep_mock:
+            worker._wait_for_tasks(timeout=0)
+
+        expect(sleep_mock.called).to_be_false()
+        expect(worker._has_finished_tasks()).to_be_false()
+
+    @patch('holmes.worker.PeriodicCallback')
+    @patch('holmes.worker.TornadoOctopus')
+    def test_pool_tasks_are_run_from_the_octopus_loop(self, octopus_mock, callback_mock):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.cache = Mock()
+        worker.cache.get_domain_limiters.return_value = None
+        worker.pool = Mock()
+
+        worker.start_otto()
+
+        callback_mock.assert_called_once_with(
+            worker._run_finished_tasks, 50.0, io_loop=octopus_mock.return_value.ioloop
+        )
+        callback_mock.return_value.start.assert_called_once_with()
+
+    def test_drop_stalled_reviews_keeps_the_shared_session(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.metrics = Metrics()
+        worker.db = Mock()
+        worker.cache = Mock()
+        worker._ping_api = Mock()
+
+        stalled = Mock(pending_requests=0, is_done=False)
+        running = Mock(pending_requests=2, is_done=False)
+        worker.reviews_in_flight = {
+            stalled: {'url': 'http://g1.com', 'bucket_item': 'item', 'lease_token': 'token'},
+            running: {'url': 'http://g2.com', 'bucket_item': 'other', 'lease_token': 'token'},
+        }
+
+        worker._drop_stalled_reviews()
+
+        expect(worker.reviews_in_flight.keys()).to_equal([running])
+        expect(worker.db.rollback.called).to_be_false()
+        worker.cache.release_job_lease.assert_called_once_with('item', 'token')
+        stalled.drop.assert_called_once_with()
+        expect(worker.metrics.counters).to_include(('holmes_jobs_total', (('status', 'stalled'),)))
+
+    def test_handle_error_drops_reviews_in_flight(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.metrics = Metrics()
+        worker.otto = Mock()
+        worker.db = Mock()
+        worker.cache = Mock()
+        worker.sqlalchemy_db_maker = Mock()
+        worker.error_handlers = []
+        worker._ping_api = Mock()
+
+        # waits on a request that was dropped with the url queue
+        reviewer = Mock(pending_requests=1, is_done=False)
+        worker.reviews_in_flight = {reviewer: {'url': 'http://g1.com', 'bucket_item': 'item', 'lease_token': 'token'}}
+
+        with patch('holmes.worker.scoped_session'):
+            worker.handle_error(ValueError, ValueError('boom'), None)
+
+        expect(worker.reviews_in_flight).to_be_empty()
+        reviewer.drop.assert_called_once_with()
+        worker.cache.release_job_lease.assert_called_once_with('item', 'token')
+        expect(worker.metrics.counters).to_include(('holmes_jobs_total', (('status', 'failed'),)))
+
+    def test_start_job_renews_the_job_lease(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.metrics = Metrics()
+        worker.config = Config(WORKER_JOB_LEASE_IN_SECONDS=60)
+        worker._ping_api = Mock()
+        worker.cache = Mock()
+        job = {'url': 'http://g1.com/a', 'bucket_item': 'item', 'lease_token': 'token'}
+
+        worker.cache.extend_job_lease.return_value = True
+        expect(worker._start_job(job)).to_be_true()
+        worker.cache.extend_job_lease.assert_called_once_with('item', 60, 'token')
+        expect(worker.domain_name).to_equal('g1.com')
+
+        # heartbeats within a quarter of the lease are not sent
+        expect(worker._renew_job_lease(job)).to_be_true()
+        expect(worker.cache.extend_job_lease.call_count).to_equal(1)
+
+        # another worker claimed the job after its lease expired
+        worker.cache.extend_job_lease.return_value = False
+        expect(worker._start_job(job)).to_be_false()
+
+    def test_start_job_without_lease(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.config.WORKER_JOB_LEASE_IN_SECONDS = 0
+        worker.cache = Mock()
+        worker._ping_api = Mock()
+
+        expect(worker._start_job({'url': 'http://g1.com', 'bucket_item': 'item'})).to_be_true()
+        expect(worker.cache.extend_job_lease.called).to_be_false()
+
+    def test_complete_job_releases_lease_after_commit(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.metrics = Metrics()
+        worker.db = Mock()
+        worker.cache = Mock()
+        worker._ping_api = Mock()
+
+        worker._complete_job({'url': 'http://g1.com', 'bucket_item': 'item', 'lease_token': 'token'})
+
+        expect(worker.db.commit.called).to_be_true()
+        worker.cache.release_job_lease.assert_called_once_with('item', 'token')
+
+    def test_size_only_request_uses_content_length_of_head(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.otto = Mock()
+        worker.cache = Mock()
+        worker.cache.get_resource_metadata.return_value = None
+        worker.size_requests = {}
+        handler = Mock()
+
+        worker.async_get('http://g1.com/a.png', handler, size_only=True)
+
+        expect(worker.cache.get_request.called).to_be_false()
+        url, head_handler, method = worker.otto.enqueue.call_args[0]
+        expect(method).to_equal('HEAD')
+
+        response = Mock(status_code=200, headers={'Content-Length': '2048'}, text='')
+        head_handler(url, response)
+
+        handler.assert_called_once_with('http://g1.com/a.png', response)
+        expect(response.sizes).to_equal((2048, None))
+        expect(response.text).to_be_null()
+        expect(worker.cache.set_resource_metadata.call_args[0][:4]).to_equal(
+            ('http://g1.com/a.png', 200, response.effective_url, (2048, None))
+        )
+        expect(worker.size_requests).to_be_empty()
+
+    def test_handle_error_fails_pending_size_requests(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.reviews_in_flight = {}
+        worker.otto = Mock()
+        worker.db = Mock()
+        worker.cache = Mock()
+        worker.cache.get_resource_metadata.return_value = None
+        worker.sqlalchemy_db_maker = Mock()
+        worker.error_handlers = []
+        worker.size_requests = {}
+        handler = Mock()
+
+        worker.async_get('http://g1.com/a.png', handler, size_only=True)
+
+        with patch('holmes.worker.scoped_session'):
+            worker.handle_error(ValueError, ValueError('boom'), None)
+
+        expect(handler.call_count).to_equal(1)
+        url, response = handler.call_args[0]
+        expect(url).to_equal('http://g1.com/a.png')
+        expect(response.status_code).to_equal(599)
+        expect(response.sizes).to_equal((0, 0))
+        expect(worker.size_requests).to_be_empty()
+
+        other_handler = Mock()
+        worker.async_get('http://g1.com/a.png', other_handler, size_only=True)
+
+        url, head_handler, method = worker.otto.enqueue.call_args[0]
+        head_handler(url, Mock(status_code=200, headers={'Content-Length': '2048'}, text=''))
+
+        expect(other_handler.call_count).to_equal(1)
+
+    def test_size_only_request_streams_body_without_content_length(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.otto = Mock()
+        worker.cache = Mock()
+        worker.cache.get_resource_metadata.return_value = None
+        worker.size_requests = {}
+        handler = Mock()
+
+        worker.async_get('http://g1.com/a.png', handler, size_only=True)
+
+        url, head_handler, method = worker.otto.enqueue.call_args[0]
+        head_handler(url, Mock(status_code=405, headers={}, text=''))
+
+        expect(handler.called).to_be_false()
+        url, get_handler, method = worker.otto.enqueue.call_args[0]
+        expect(method).to_equal('GET')
+
+        streaming_callback = worker.otto.enqueue.call_args[1]['streaming_callback']
+        streaming_callback('a' * 1000)
+        streaming_callback('a' * 1000)
+
+        response = Mock(status_code=200, headers={}, text='')
+        get_handler(url, response)
+
+        handler.assert_called_once_with('http://g1.com/a.png', response)
+        expect(response.sizes.size).to_equal(2000)
+        expect(response.sizes.gzipped_size).to_be_lesser_than(2000)
+        expect(response.text).to_be_null()
+
+    def test_gzipped_size_only_request_streams_body(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.otto = Mock()
+        worker.cache = Mock()
+        worker.cache.get_resource_metadata.return_value = None
+        worker.size_requests = {}
+
+        worker.async_get('http://g1.com/a.css', Mock(), size_only=True, gzipped=True)
+
+        expect(worker.otto.enqueue.call_args[0][2]).to_equal('GET')
+        expect(worker.otto.enqueue.call_args[1]).to_include('streaming_callback')
+
+    def test_size_only_request_uses_fresh_resource_metadata(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.otto = Mock()
+        worker.cache = Mock()
+        worker.cache.get_resource_metadata.return_value = {
+            'status_code': 200,
+            'effective_url': 'http://g1.com/a.css',
+            'size': 2048,
+            'gzipped_size': 512,
+            'validators': {},
+            'fresh_until': time.time() + 60
+        }
+        worker.size_requests = {}
+        handler = Mock()
+
+        worker.async_get('http://g1.com/a.css', handler, size_only=True, gzipped=True)
+
+        expect(worker.otto.enqueue.called).to_be_false()
+        url, response = handler.call_args[0]
+        expect(response.status_code).to_equal(200)
+        expect(response.sizes).to_equal((2048, 512))
+        expect(response.from_cache).to_be_true()
+
+    def test_size_only_requests_for_the_same_url_are_coalesced(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.otto = Mock()
+        worker.cache = Mock()
+        worker.cache.get_resource_metadata.return_value = None
+        worker.size_requests = {}
+        first_handler = Mock()
+        second_handler = Mock()
+
+        worker.async_get('http://g1.com/a.css', first_handler, size_only=True, gzipped=True)
+        worker.async_get('http://g1.com/a.css', second_handler, size_only=True)
+
+        expect(worker.otto.enqueue.call_count).to_equal(1)
+
+        url, get_handler, method = worker.otto.enqueue.call_args[0]
+        response = Mock(status_code=200, headers={}, text='')
+        get_handler(url, response)
+
+        first_handler.assert_called_once_with('http://g1.com/a.css', response)
+        second_handler.assert_called_once_with('http://g1.com/a.css', response)
+
+    def test_stale_resource_metadata_is_revalidated(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.otto = Mock()
+        worker.cache = Mock()
+        worker.cache.get_resource_metadata.return_value = {
+            'status_code': 200,
+            'effective_url': 'http://g1.com/a.png',
+            'size': 2048,
+            'gzipped_size': None,
+            'validators': {'If-None-Match': '"abc"'},
+            'fresh_until': time.time() - 60
+        }
+        worker.size_requests = {}
+        handler = Mock()
+
+        worker.async_get('http://g1.com/a.png', handler, size_only=True)
+
+        url, head_handler, method = worker.otto.enqueue.call_args[0]
+        expect(worker.otto.enqueue.call_args[1]['headers']).to_equal({'If-None-Match': '"abc"'})
+
+        head_handler(url, Mock(status_code=304, headers={}, text=''))
+
+        url, response = handler.call_args[0]
+        expect(response.status_code).to_equal(200)
+        expect(response.sizes).to_equal((2048, None))
+        expect(worker.cache.set_resource_metadata.call_args[0][4]).to_equal({'If-None-Match': '"abc"'})
+
+    def test_check_links_uses_cached_statuses(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.otto = Mock()
+        worker.cache = Mock()
+        worker.cache.get_link_statuses.return_value = {
+            'http://g1.com/a': {'status_code': 404, 'effective_url': 'http://g1.com/a'}
+        }
+        worker.link_requests = {}
+        handler = Mock()
+
+        worker.check_links(['http://g1.com/a'], handler)
+
+        worker.cache.get_link_statuses.assert_called_once_with(['http://g1.com/a'])
+        expect(worker.otto.enqueue.called).to_be_false()
+
+        url, response = handler.call_args[0]
+        expect(url).to_equal('http://g1.com/a')
+        expect(response.status_code).to_equal(404)
+        expect(response.text).to_be_null()
+        expect(response.from_cache).to_be_true()
+
+    def test_check_links_heads_each_url_once(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.otto = Mock()
+        worker.cache = Mock()
+        worker.cache.get_link_statuses.return_value = {}
+        worker.link_requests = {}
+        first_handler = Mock()
+        second_handler = Mock()
+
+        worker.check_links(['http://g1.com/a'], first_handler)
+        worker.check_links(['http://g1.com/a'], second_handler)
+
+        expect(worker.otto.enqueue.call_count).to_equal(1)
+        url, head_handler, method = worker.otto.enqueue.call_args[0]
+        expect(method).to_equal('HEAD')
+
+        response = Mock(status_code=200, effective_url='http://g1.com/a', text='')
+        head_handler(url, response)
+
+        first_handler.assert_called_once_with('http://g1.com/a', response)
+        second_handler.assert_called_once_with('http://g1.com/a', response)
+        expect(response.text).to_be_null()
+        worker.cache.set_link_status.assert_called_once_with(
+            'http://g1.com/a', 200, 'http://g1.com/a',
+            worker.config.LINK_STATUS_EXPIRATION_IN_SECONDS
+        )
+        expect(worker.link_requests).to_be_empty()
+
+    def test_handle_error_fails_pending_link_checks(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.reviews_in_flight = {}
+        worker.otto = Mock()
+        worker.db = Mock()
+        worker.cache = Mock()
+        worker.cache.get_link_statuses.return_value = {}
+        worker.sqlalchemy_db_maker = Mock()
+        worker.error_handlers = []
+        worker.size_requests = {}
+        worker.link_requests = {}
+        handler = Mock()
+
+        worker.check_links(['http://g1.com/a'], handler)
+        worker.check_links(['http://g1.com/a'], handler)
+
+        with patch('holmes.worker.scoped_session'):
+            worker.handle_error(ValueError, ValueError('boom'), None)
+
+        expect(handler.call_count).to_equal(2)
+        expect(handler.call_args[0][1].status_code).to_equal(599)
+        expect(worker.link_requests).to_be_empty()
+
+    def test_check_links_falls_back_to_get_when_head_is_not_allowed(self):
+        worker = HolmesWorker(['-c', join(self.root_path, 'tests/unit/test_worker.conf')])
+        worker.otto = Mock()
+        worker.cache = Mock()
+        worker.cache.get_link_statuses.return_value = {}
+        worker.link_requests = {}
+        handler = Mock()
+
+        worker.check_links(['http://g1.com/a'], handler)
+
+        url, head_handler, method = worker.otto.enqueue.call_args[0]
+        head_handler(url, Mock(status_code=405))
+
+        expect(handler.called).to_be_false()
+        url, get_handler, method = worker.otto.enqueue.call_args[0]
+        expect(method).to_equal('GET')
+        expect(worker.otto.enqueue.call_args[1]).to_include('streaming_callback')
+
+        get_handler(url, Mock(status_code=599, effective_url=url))
+
+        expect(handler.called).to_be_true()
+        expect(worker.cache.set_link_status.call_args[0][3]).to_equal(
+            worker.config.LINK_STATUS_ERROR_EXPIRATION_IN_SECONDS
+        )
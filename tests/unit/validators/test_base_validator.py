@@ -90,7 +90,7 @@ class TestBaseValidator(ApiTestCase, unittest.TestCase):
         validator = Validator(reviewer)
         validator.enqueue('/')
 
-        reviewer.enqueue.assert_called_once_with('/')
+        reviewer.enqueue.assert_called_once_with('/', None)
 
     def test_will_call_reviewer_add_fact(self):
         page = PageFactory.create()
@@ -177,6 +177,20 @@ class TestBaseValidator(ApiTestCase, unittest.TestCase):
 
         expect(len(validator.url_buffer)).to_equal(2)
         expect(validator.flush.call_count).to_equal(1)
+        expect(validator.url_responses).to_equal({
+            'the-url': 'the-response',
+            'the-url-2': 'the-response-2'
+        })
+
+    def test_send_unchecked_url(self):
+        validator = Validator(Mock(config=Mock(MAX_ENQUEUE_BUFFER_LENGTH=1)))
+        validator.flush = Mock()
+
+        validator.send_unchecked_url('the-url', 0.0)
+
+        expect(validator.url_buffer).to_equal(set([('the-url', 0.0)]))
+        expect(validator.url_responses).to_equal({'the-url': None})
+        expect(validator.flush.call_count).to_equal(0)
 
     def test_flush_method(self):
         validator = Validator(None)
@@ -188,11 +202,14 @@ class TestBaseValidator(ApiTestCase, unittest.TestCase):
 
         validator = Validator(None)
         validator.url_buffer = [1, 2, 3]
+        validator.url_responses = {1: 'response'}
         validator.enqueue = Mock()
 
         validator.flush()
 
-        validator.enqueue.assert_called_once_with([1, 2, 3])
+        validator.enqueue.assert_called_once_with([1, 2, 3], {1: 'response'})
+        expect(validator.url_buffer).to_be_empty()
+        expect(validator.url_responses).to_be_empty()
 
     def test_not_implemented_methods(self):
         validator = Validator(None)
@@ -27,7 +27,7 @@ class TestSitemapValidator(ValidatorTestCase):
 
         validator = SitemapValidator(reviewer)
         validator.review.data['sitemap.files.size'] = {'http://g1.globo.com/sitemap.xml': 10}
-        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': Mock(status_code=404, text=None)}
+        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': {'status_code': 404, 'is_empty': True}}
         validator.add_violation = Mock()
 
         validator.validate()
@@ -48,7 +48,7 @@ class TestSitemapValidator(ValidatorTestCase):
 
         validator = SitemapValidator(reviewer)
         validator.review.data['sitemap.files.size'] = {'http://g1.globo.com/sitemap.xml': 10}
-        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': Mock(status_code=404, text=None)}
+        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': {'status_code': 404, 'is_empty': True}}
         validator.add_violation = Mock()
 
         validator.validate()
@@ -73,7 +73,7 @@ class TestSitemapValidator(ValidatorTestCase):
 
         validator = SitemapValidator(reviewer)
         validator.review.data['sitemap.files.size'] = {'http://g1.globo.com/sitemap.xml': 10}
-        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': Mock(status_code=200, text='')}
+        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': {'status_code': 200, 'is_empty': True}}
         validator.add_violation = Mock()
 
         validator.validate()
@@ -84,6 +84,40 @@ class TestSitemapValidator(ValidatorTestCase):
             points=100
         )
 
+    def test_uses_cached_data_when_sitemap_not_modified(self):
+        page = PageFactory.create(url='http://globo.com')
+
+        reviewer = Reviewer(
+            api_url='http://localhost:2368',
+            page_uuid=page.uuid,
+            page_url=page.url,
+            page_score=0.0,
+            config=Config(),
+            validators=[]
+        )
+
+        validator = SitemapValidator(reviewer)
+        validator.review.data['sitemap.files.size'] = {'http://g1.globo.com/sitemap.xml': 10}
+        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': {'status_code': 304, 'is_empty': False}}
+        validator.review.data['sitemap.files.urls'] = {'http://g1.globo.com/sitemap.xml': 10}
+        validator.review.data['sitemap.files.not_encoded'] = {'http://g1.globo.com/sitemap.xml': 2}
+        validator.review.data['sitemap.urls'] = {'http://g1.globo.com/sitemap.xml': set()}
+        validator.add_violation = Mock()
+        validator.send_unchecked_url = Mock()
+        validator.flush = Mock()
+
+        validator.validate()
+
+        expect(validator.send_unchecked_url.call_count).to_equal(0)
+        validator.add_violation.assert_called_once_with(
+            key='sitemap.links.not_encoded',
+            value={
+                'url': 'http://g1.globo.com/sitemap.xml',
+                'links': 2
+            },
+            points=10
+        )
+
     def test_add_violation_when_sitemap_is_too_large(self):
         page = PageFactory.create(url='http://globo.com')
 
@@ -98,7 +132,7 @@ class TestSitemapValidator(ValidatorTestCase):
 
         validator = SitemapValidator(reviewer)
         validator.review.data['sitemap.files.size'] = {'http://g1.globo.com/sitemap.xml': 10241}
-        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': Mock(status_code=200, text='data')}
+        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': {'status_code': 200, 'is_empty': False}}
         validator.review.data['sitemap.files.urls'] = {'http://g1.globo.com/sitemap.xml': 10}
         validator.review.data['sitemap.urls'] = {'http://g1.globo.com/sitemap.xml': []}
         validator.add_violation = Mock()
@@ -128,7 +162,7 @@ class TestSitemapValidator(ValidatorTestCase):
 
         validator = SitemapValidator(reviewer)
         validator.review.data['sitemap.files.size'] = {'http://g1.globo.com/sitemap.xml': 10}
-        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': Mock(status_code=200, text='data')}
+        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': {'status_code': 200, 'is_empty': False}}
         validator.review.data['sitemap.files.urls'] = {'http://g1.globo.com/sitemap.xml': 50001}
         validator.review.data['sitemap.urls'] = {'http://g1.globo.com/sitemap.xml': []}
         validator.add_violation = Mock()
@@ -155,10 +189,11 @@ class TestSitemapValidator(ValidatorTestCase):
 
         validator = SitemapValidator(reviewer)
         validator.review.data['sitemap.files.size'] = {'http://g1.globo.com/sitemap.xml': 10}
-        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': Mock(status_code=200, text='data')}
+        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': {'status_code': 200, 'is_empty': False}}
         validator.review.data['sitemap.files.urls'] = {'http://g1.globo.com/sitemap.xml': 20}
         validator.review.data['sitemap.urls'] = {'http://g1.globo.com/sitemap.xml': ['http://g1.globo.com/']}
         validator.add_violation = Mock()
+        validator.enqueue = Mock()
 
         validator.validate()
 
@@ -178,10 +213,11 @@ class TestSitemapValidator(ValidatorTestCase):
 
         validator = SitemapValidator(reviewer)
         validator.review.data['sitemap.files.size'] = {'http://g1.globo.com/sitemap.xml': 10}
-        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': Mock(status_code=200, text='data')}
+        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': {'status_code': 200, 'is_empty': False}}
         validator.review.data['sitemap.files.urls'] = {'http://g1.globo.com/sitemap.xml': 20}
         validator.review.data['sitemap.urls'] = {'http://g1.globo.com/sitemap.xml': ['http://g1.globo.com/1.html']}
         validator.add_violation = Mock()
+        validator.enqueue = Mock()
 
         validator.validate()
 
@@ -201,11 +237,11 @@ class TestSitemapValidator(ValidatorTestCase):
 
         validator = SitemapValidator(reviewer)
         validator.review.data['sitemap.files.size'] = {'http://g1.globo.com/sitemap.xml': 10}
-        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': Mock(status_code=200, text='data')}
+        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': {'status_code': 200, 'is_empty': False}}
         validator.review.data['sitemap.files.urls'] = {'http://g1.globo.com/sitemap.xml': 20}
         validator.review.data['sitemap.urls'] = {'http://g1.globo.com/sitemap.xml': ['http://g1.globo.com/ümlat.php', u'http://g1.globo.com/ümlat.php']}
         validator.add_violation = Mock()
-        # validator.send_url = Mock()
+        validator.enqueue = Mock()
 
         validator.validate()
 
@@ -228,10 +264,11 @@ class TestSitemapValidator(ValidatorTestCase):
 
         validator = SitemapValidator(reviewer)
         validator.review.data['sitemap.files.size'] = {'http://g1.globo.com/sitemap.xml': 10}
-        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': Mock(status_code=200, text='data')}
+        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': {'status_code': 200, 'is_empty': False}}
         validator.review.data['sitemap.files.urls'] = {'http://g1.globo.com/sitemap.xml': 20}
         validator.review.data['sitemap.urls'] = {'http://g1.globo.com/sitemap.xml': ['http://g1.globo.com/%C3%BCmlat.php&q=name']}
         validator.add_violation = Mock()
+        validator.enqueue = Mock()
 
         validator.validate()
 
@@ -255,7 +292,7 @@ class TestSitemapValidator(ValidatorTestCase):
 
         validator = SitemapValidator(reviewer)
         validator.review.data['sitemap.files.size'] = {'http://g1.globo.com/sitemap.xml': 10}
-        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': Mock(status_code=200, text='data', url='http://g1.globo.com/%C3%BCmlat.php&amp;q=name')}
+        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': {'status_code': 200, 'is_empty': False}}
         validator.review.data['sitemap.files.urls'] = {'http://g1.globo.com/sitemap.xml': 20}
         validator.review.data['sitemap.urls'] = {'http://g1.globo.com/sitemap.xml': ['http://g1.globo.com/%C3%BCmlat.php&amp;q=name']}
         validator.add_violation = Mock()
@@ -266,6 +303,33 @@ class TestSitemapValidator(ValidatorTestCase):
         expect(validator.add_violation.call_count).to_equal(0)
         expect(validator.flush.call_count).to_equal(1)
 
+    def test_sitemap_urls_are_enqueued_without_being_loaded(self):
+        page = PageFactory.create(url='http://globo.com')
+
+        reviewer = Reviewer(
+            api_url='http://localhost:2368',
+            page_uuid=page.uuid,
+            page_url=page.url,
+            page_score=20.0,
+            config=Config(),
+            validators=[]
+        )
+
+        validator = SitemapValidator(reviewer)
+        validator.review.data['sitemap.files.size'] = {'http://g1.globo.com/sitemap.xml': 10}
+        validator.review.data['sitemap.data'] = {'http://g1.globo.com/sitemap.xml': {'status_code': 200, 'is_empty': False}}
+        validator.review.data['sitemap.files.urls'] = {'http://g1.globo.com/sitemap.xml': 20}
+        validator.review.data['sitemap.urls'] = {'http://g1.globo.com/sitemap.xml': ['http://g1.globo.com/1.html']}
+        validator.add_violation = Mock()
+        validator.enqueue = Mock()
+
+        validator.validate()
+
+        validator.enqueue.assert_called_once_with(
+            set([('http://g1.globo.com/1.html', 1.0)]),
+            {'http://g1.globo.com/1.html': None}
+        )
+
     def test_can_get_violation_definitions(self):
         reviewer = Mock()
         validator = SitemapValidator(reviewer)